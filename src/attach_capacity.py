@@ -0,0 +1,63 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Report the persistent disks attached to each node against its attach limit."""
+
+import logging
+from collections import Counter
+from typing import Dict, List, Optional
+
+from httpx import HTTPError
+from lightkube import Client
+from lightkube.core.exceptions import ApiError
+from lightkube.resources.storage_v1 import CSINode, VolumeAttachment
+from ops.manifests import ManifestClientError
+
+log = logging.getLogger(__name__)
+
+
+def _zone(node_id: Optional[str]) -> str:
+    # the driver identifies nodes as projects/<project>/zones/<zone>/instances/<name>
+    parts = (node_id or "").split("/")
+    if "zones" in parts[:-1]:
+        return parts[parts.index("zones") + 1]
+    return "unknown"
+
+
+def attach_capacity(client: Client, driver: str) -> Dict[str, List[Dict]]:
+    """Aggregate the attached and allowed volumes of the driver per node and zone.
+
+    Nodes are ordered from the fewest available attachments to the most.
+
+    raises ManifestClientError if the cluster cannot be queried
+    """
+    try:
+        csi_nodes = list(client.list(CSINode))
+        attachments = list(client.list(VolumeAttachment))
+    except (ApiError, HTTPError) as ex:
+        msg = "Failed listing CSINodes and VolumeAttachments"
+        log.exception(msg)
+        raise ManifestClientError(msg, ex) from ex
+
+    attached = Counter(va.spec.nodeName for va in attachments if va.spec.attacher == driver)
+
+    nodes = []
+    for csi_node in csi_nodes:
+        name = csi_node.metadata.name if csi_node.metadata else None
+        entry = next((d for d in csi_node.spec.drivers or [] if d.name == driver), None)
+        if not (name and entry):
+            continue
+        allowed = entry.allocatable.count if entry.allocatable else None
+        node: Dict = dict(node=name, zone=_zone(entry.nodeID), attached=attached[name])
+        if allowed is not None:
+            node.update(allowed=allowed, available=allowed - attached[name])
+        nodes.append(node)
+    nodes.sort(key=lambda n: (n.get("available", float("inf")), n["node"]))
+
+    zones: Dict[str, Dict] = {}
+    for node in nodes:
+        zone = zones.setdefault(node["zone"], dict(zone=node["zone"], nodes=0, attached=0))
+        zone["nodes"] += 1
+        zone["attached"] += node["attached"]
+        if "allowed" in node:
+            zone["allowed"] = zone.get("allowed", 0) + node["allowed"]
+    return dict(nodes=nodes, zones=[zones[z] for z in sorted(zones)])
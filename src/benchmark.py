@@ -0,0 +1,262 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Benchmark the volumes of a StorageClass with fio."""
+
+import json
+import logging
+import re
+import time
+from itertools import product
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+from httpx import HTTPError
+from lightkube import Client
+from lightkube.codecs import from_dict
+from lightkube.core.exceptions import ApiError
+from lightkube.resources.batch_v1 import Job
+from lightkube.resources.core_v1 import Event, PersistentVolumeClaim, Pod
+from lightkube.types import CascadeType
+from pydantic import BaseModel, Extra, Field, ValidationError, validator
+
+log = logging.getLogger(__name__)
+MOUNT_PATH = "/data"
+POLL_INTERVAL = 5
+# seconds the volume or pod may stay pending before the benchmark gives up
+PENDING_GRACE = 60
+BLOCK_SIZE = re.compile(r"^\d+[kKmM]?$")
+VOLUME_SIZE = re.compile(r"^(\d+)(Mi|Gi|Ti)$")
+MIB_PER_UNIT = {"Mi": 1, "Gi": 1024, "Ti": 1024 * 1024}
+# share of the volume fio writes to, leaving room for the filesystem
+FILE_RATIO = 0.9
+
+
+class BenchmarkError(Exception):
+    """Raised when the benchmark cannot complete."""
+
+
+class BenchmarkParams(BaseModel, extra=Extra.forbid):
+    """Parameters of the benchmark-storage action."""
+
+    storage_class: str = Field(alias="storage-class")
+    namespace: str = "default"
+    size: str = "10Gi"
+    block_sizes: List[str] = Field(["4k", "1M"], alias="block-sizes")
+    queue_depths: List[int] = Field([1, 32], alias="queue-depths")
+    read_percent: int = Field(70, alias="read-percent", ge=0, le=100)
+    runtime: int = Field(60, gt=0)
+    timeout: int = Field(900, gt=0)
+    image: str
+
+    @validator("size")
+    def volume_size(cls, value: str):
+        """Validate the volume size."""
+        match = VOLUME_SIZE.match(value)
+        if not (match and int(match.group(1))):
+            raise ValueError(f"{value} isn't a volume size, eg. 512Mi or 10Gi")
+        return value
+
+    @validator("block_sizes", "queue_depths", pre=True)
+    def space_separated(cls, value):
+        """Split space separated lists."""
+        return value.split() if isinstance(value, str) else value
+
+    @validator("block_sizes", each_item=True)
+    def block_size(cls, value: str):
+        """Validate each block size."""
+        if not BLOCK_SIZE.match(value):
+            raise ValueError(f"{value} isn't a block size, eg. 4k or 1M")
+        return value
+
+    @property
+    def jobs(self) -> Dict[str, Dict[str, str]]:
+        """Fio jobs of each block size and queue depth, run one after another."""
+        return {
+            f"bs-{bs.lower()}-qd-{qd}": {"bs": bs, "iodepth": str(qd)}
+            for bs, qd in product(self.block_sizes, self.queue_depths)
+        }
+
+    @property
+    def file_size(self) -> str:
+        """Size of the file fio benchmarks on the volume."""
+        ((count, unit),) = VOLUME_SIZE.findall(self.size)
+        return f"{max(int(int(count) * MIB_PER_UNIT[unit] * FILE_RATIO), 1)}m"
+
+
+def parse_params(params: Dict) -> BenchmarkParams:
+    """Parse the action parameters.
+
+    raises BenchmarkError if the parameters aren't valid
+    """
+    try:
+        return BenchmarkParams(**params)
+    except ValidationError as e:
+        err = e.errors()[0]
+        raise BenchmarkError(f"{'.'.join(map(str, err['loc']))}: {err['msg']}") from e
+
+
+def fio_command(params: BenchmarkParams) -> List[str]:
+    """Fio command running each job against the mounted volume."""
+    command = [
+        "fio",
+        "--output-format=json",
+        f"--directory={MOUNT_PATH}",
+        "--filename=benchmark",
+        f"--size={params.file_size}",
+        "--ioengine=libaio",
+        "--direct=1",
+        "--rw=randrw",
+        f"--rwmixread={params.read_percent}",
+        "--time_based",
+        f"--runtime={params.runtime}",
+    ]
+    for name, options in params.jobs.items():
+        command += [f"--name={name}", "--stonewall"]
+        command += [f"--{option}={value}" for option, value in options.items()]
+    return command
+
+
+def _resources(name: str, params: BenchmarkParams):
+    labels = {"app.kubernetes.io/name": "benchmark-storage", "benchmark": name}
+    metadata = dict(name=name, namespace=params.namespace, labels=labels)
+    pvc = from_dict(
+        dict(
+            apiVersion="v1",
+            kind="PersistentVolumeClaim",
+            metadata=metadata,
+            spec=dict(
+                accessModes=["ReadWriteOnce"],
+                storageClassName=params.storage_class,
+                resources=dict(requests=dict(storage=params.size)),
+            ),
+        )
+    )
+    job = from_dict(
+        dict(
+            apiVersion="batch/v1",
+            kind="Job",
+            metadata=metadata,
+            spec=dict(
+                backoffLimit=0,
+                template=dict(
+                    metadata=dict(labels=labels),
+                    spec=dict(
+                        restartPolicy="Never",
+                        containers=[
+                            dict(
+                                name="fio",
+                                image=params.image,
+                                command=fio_command(params),
+                                volumeMounts=[dict(name="data", mountPath=MOUNT_PATH)],
+                            )
+                        ],
+                        volumes=[dict(name="data", persistentVolumeClaim=dict(claimName=name))],
+                    ),
+                ),
+            ),
+        )
+    )
+    return pvc, job
+
+
+def _pending_reason(client: Client, name: str, params: BenchmarkParams) -> Optional[str]:
+    """Why the benchmark volume isn't provisioned or its pod isn't scheduled, if so."""
+    pvc = client.get(PersistentVolumeClaim, name, namespace=params.namespace)
+    if pvc.status and pvc.status.phase == "Pending":
+        events = list(
+            client.list(
+                Event,
+                namespace=params.namespace,
+                fields={"involvedObject.name": name, "reason": "ProvisioningFailed"},
+            )
+        )
+        if events:
+            return f"its volume is Pending: {events[-1].message}"
+    for pod in client.list(Pod, namespace=params.namespace, labels={"benchmark": name}):
+        for condition in (pod.status and pod.status.conditions) or []:
+            if condition.type == "PodScheduled" and condition.reason == "Unschedulable":
+                return f"its pod is unschedulable: {condition.message}"
+    return None
+
+
+def _wait(client: Client, name: str, params: BenchmarkParams):
+    start = time.monotonic()
+    deadline, reason = start + params.timeout, None
+    while time.monotonic() < deadline:
+        job = client.get(Job, name, namespace=params.namespace)
+        status = job.status
+        if status and status.succeeded:
+            return
+        if status and status.failed:
+            raise BenchmarkError(f"Benchmark job {name} failed")
+        reason = _pending_reason(client, name, params)
+        if reason and time.monotonic() - start >= PENDING_GRACE:
+            raise BenchmarkError(f"Benchmark job {name} cannot start, {reason}")
+        time.sleep(POLL_INTERVAL)
+    msg = f"Benchmark job {name} didn't complete within {params.timeout}s"
+    raise BenchmarkError(f"{msg}, {reason}" if reason else msg)
+
+
+def _output(client: Client, name: str, params: BenchmarkParams) -> Dict:
+    pods = client.list(Pod, namespace=params.namespace, labels={"benchmark": name})
+    for pod in pods:
+        if not (pod.metadata and pod.metadata.name):
+            continue
+        output = "".join(client.log(pod.metadata.name, namespace=params.namespace))
+        # fio may print warnings ahead of its json report
+        try:
+            return json.loads(output[output.index("{") :])
+        except ValueError as e:
+            raise BenchmarkError(f"Cannot parse the fio output of {name}") from e
+    raise BenchmarkError(f"No pod of benchmark job {name} found")
+
+
+def _p99_ms(stats: Dict) -> Optional[float]:
+    percentile = stats.get("clat_ns", {}).get("percentile", {})
+    p99 = percentile.get("99.000000")
+    return round(p99 / 1e6, 3) if p99 is not None else None
+
+
+def summarize(report: Dict) -> Dict[str, Dict[str, float]]:
+    """Summarize the iops, throughput and p99 latency of each fio job."""
+    results = {}
+    for job in report.get("jobs", []):
+        summary = {}
+        for direction in ("read", "write"):
+            stats = job.get(direction, {})
+            if not stats.get("io_bytes"):
+                continue
+            summary[f"{direction}-iops"] = round(stats["iops"], 1)
+            summary[f"{direction}-mib-per-sec"] = round(stats["bw"] / 1024, 1)
+            if (p99 := _p99_ms(stats)) is not None:
+                summary[f"{direction}-p99-latency-ms"] = p99
+        results[job["jobname"]] = summary
+    return results
+
+
+def run_benchmark(client: Client, params: BenchmarkParams) -> Dict[str, Dict[str, float]]:
+    """Benchmark a volume of the storage class, removing the benchmark afterwards.
+
+    raises BenchmarkError if the benchmark doesn't complete
+    """
+    name = f"benchmark-storage-{uuid4().hex[:8]}"
+    pvc, job = _resources(name, params)
+    try:
+        for rsc in (pvc, job):
+            log.info(f"Creating {rsc.kind}/{name}")
+            client.create(rsc)
+        _wait(client, name, params)
+        return summarize(_output(client, name, params))
+    except (ApiError, HTTPError) as e:
+        raise BenchmarkError(f"Benchmark {name} failed: {e}") from e
+    finally:
+        for kind in (Job, PersistentVolumeClaim):
+            try:
+                client.delete(
+                    kind, name, namespace=params.namespace, cascade=CascadeType.FOREGROUND
+                )
+            except ApiError as e:
+                if e.status.code != 404:
+                    log.exception(f"Failed removing {kind.__name__}/{name}")
+            except HTTPError:
+                log.exception(f"Failed removing {kind.__name__}/{name}")
@@ -4,27 +4,46 @@
 """Dispatch logic for the gcp k8s storage charm."""
 
 import logging
+import time
+from datetime import timedelta
 from pathlib import Path
+from typing import List, Optional
 
+import yaml
 from ops.charm import CharmBase
 from ops.framework import StoredState
 from ops.interface_kube_control import KubeControlRequirer
 from ops.interface_tls_certificates import CertificatesRequires
 from ops.main import main
-from ops.manifests import Collector, ManifestClientError
+from ops.manifests import Collector, ManifestClientError, Manifests
 from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus, WaitingStatus
 
-from config import CharmConfig
+from attach_capacity import attach_capacity
+from benchmark import BenchmarkError, parse_params, run_benchmark
+from config import CharmConfig, parse_node_labels
+from data_cache import label_nodes
+from filestore_manifests import GCPFilestoreManifests
+from local_ssd_manifests import LocalSSDManifests
+from metrics import ReconcileMetrics
+from prepull import ImagePrePuller, manifest_images, node_plugin_version
+from provides_metrics import MetricsEndpointProvider
 from requires_integrator import GCPIntegratorRequires
-from storage_manifests import GCPStorageManifests
+from rollout import roll_node_plugins
+from snapshot_manifests import SnapshotControllerManifests
+from storage_latency import storage_latency
+from storage_manifests import NAMESPACE, PROVISIONER, GCPStorageManifests
 
 log = logging.getLogger(__name__)
+# rejections of the preflight listed in the unit status
+PREFLIGHT_STATUS_ENTRIES = 3
 
 
 class GcpK8sStorageCharm(CharmBase):
     """Dispatch logic for the operator charm."""
 
     CA_CERT_PATH = Path("/srv/kubernetes/ca.crt")
+    CACHE_PATH = Path("/var/cache/gcp-k8s-storage")
+    GCP_FEATURES = ("enable-block-storage-management", "enable-instance-inspection")
 
     stored = StoredState()
 
@@ -35,6 +54,7 @@ class GcpK8sStorageCharm(CharmBase):
         self.kube_control = KubeControlRequirer(self, schemas="0,1")
         self.certificates = CertificatesRequires(self)
         self.integrator = GCPIntegratorRequires(self)
+        self.metrics_endpoint = MetricsEndpointProvider(self, self._sidecar_metrics_endpoints)
         # Config Validator and datastore
         self.charm_config = CharmConfig(self)
 
@@ -42,9 +62,28 @@ class GcpK8sStorageCharm(CharmBase):
         self.stored.set_default(
             config_hash=None,  # hashed value of the config once valid
             deployed=False,  # True if the config has been applied after new hash
+            releases={},  # release of each manifest last applied
+            prepull_started=None,  # time the image pre-pull began, while its DaemonSet may exist
+            data_cache_labelled=False,  # True while nodes may be labelled for data cache
         )
+        self.metrics = ReconcileMetrics(self.CACHE_PATH / "metrics.json")
+
+        # manifests deployed only while their charm config option is enabled
+        self.optional_manifests = {
+            "snapshot-controller": SnapshotControllerManifests(
+                self, self.charm_config, self.kube_control, self.integrator
+            ),
+            "filestore": GCPFilestoreManifests(
+                self, self.charm_config, self.kube_control, self.integrator
+            ),
+            "local-ssd": LocalSSDManifests(
+                self, self.charm_config, self.kube_control, self.integrator
+            ),
+        }
+        enabled = [m for key, m in self.optional_manifests.items() if self.config.get(key)]
         self.collector = Collector(
             GCPStorageManifests(self, self.charm_config, self.kube_control, self.integrator),
+            *enabled,
         )
 
         self.framework.observe(self.on.kube_control_relation_created, self._kube_control)
@@ -64,12 +103,18 @@ class GcpK8sStorageCharm(CharmBase):
         self.framework.observe(self.on.list_resources_action, self._list_resources)
         self.framework.observe(self.on.scrub_resources_action, self._scrub_resources)
         self.framework.observe(self.on.sync_resources_action, self._sync_resources)
+        self.framework.observe(self.on.attach_capacity_action, self._attach_capacity)
+        self.framework.observe(self.on.benchmark_storage_action, self._benchmark_storage)
+        self.framework.observe(self.on.preflight_action, self._preflight)
+        self.framework.observe(self.on.storage_latency_action, self._storage_latency)
         self.framework.observe(self.on.update_status, self._update_status)
 
         self.framework.observe(self.on.install, self._install_or_upgrade)
+        self.framework.observe(self.on.upgrade_charm, self._clear_manifest_cache)
         self.framework.observe(self.on.upgrade_charm, self._install_or_upgrade)
         self.framework.observe(self.on.config_changed, self._merge_config)
         self.framework.observe(self.on.stop, self._cleanup)
+        self.framework.observe(self.framework.on.commit, self._save_metrics)
 
     def _list_versions(self, event):
         self.collector.list_versions(event)
@@ -93,22 +138,148 @@ class GcpK8sStorageCharm(CharmBase):
             msg = "Failed to apply missing resources. API Server unavailable."
             event.set_results({"result": msg})
 
+    def _sidecar_metrics_endpoints(self):
+        controller = self.collector.manifests["gce-pd-csi-driver"]
+        return controller.sidecar_metrics_endpoints()
+
+    def _save_metrics(self, _):
+        self.metrics.save(self.config.get("metrics-textfile-dir"))
+
+    def _attach_capacity(self, event):
+        controller = self.collector.manifests["gce-pd-csi-driver"]
+        try:
+            report = attach_capacity(controller.client, PROVISIONER)
+        except ManifestClientError as e:
+            event.fail(str(e))
+            return
+        nodes = report["nodes"][: event.params.get("limit", 10)]
+        event.set_results(
+            {
+                "nodes": yaml.safe_dump(nodes, sort_keys=False),
+                "zones": yaml.safe_dump(report["zones"], sort_keys=False),
+            }
+        )
+
+    def _storage_latency(self, event):
+        controller = self.collector.manifests["gce-pd-csi-driver"]
+        window = timedelta(minutes=event.params.get("window", 60))
+        try:
+            report = storage_latency(controller.client, PROVISIONER, window)
+        except ManifestClientError as e:
+            event.fail(str(e))
+            return
+        storage_class = event.params.get("storage-class")
+        event.set_results(
+            {
+                key: yaml.safe_dump(
+                    [s for s in summaries if storage_class in (None, "", s["storage-class"])],
+                    sort_keys=False,
+                )
+                for key, summaries in report.items()
+            }
+        )
+
+    def _benchmark_storage(self, event):
+        controller = self.collector.manifests["gce-pd-csi-driver"]
+        try:
+            params = parse_params(event.params)
+            event.log(f"Benchmarking storage class {params.storage_class}")
+            results = run_benchmark(controller.client, params)
+        except (BenchmarkError, ManifestClientError) as e:
+            event.fail(str(e))
+            return
+        event.set_results({"storage-class": params.storage_class, "jobs": results})
+
+    def _preflight_rejections(self):
+        # namespaces and CRDs of each manifest are created by the same installation
+        alongside = [rsc for c in self.collector.manifests.values() for rsc in c.resources]
+        rejected = []
+        for controller in self.collector.manifests.values():
+            rejected += controller.preflight(alongside)
+        return rejected
+
+    def _preflight(self, event):
+        try:
+            rejected = self._preflight_rejections()
+        except ManifestClientError as e:
+            event.fail(str(e))
+            return
+        if rejected:
+            event.set_results({"rejected": yaml.safe_dump(rejected)})
+            event.fail(f"Preflight rejected {len(rejected)} objects")
+            return
+        event.set_results({"result": "All objects passed the server-side dry-run"})
+
+    def _clear_manifest_cache(self, _):
+        # rendered manifests from the previous charm revision are no longer valid
+        for controller in self.collector.manifests.values():
+            controller.cache.clear()
+        for controller in self.optional_manifests.values():
+            controller.cache.clear()
+
     def _request_gcp_features(self, event):
-        self.integrator.enable_block_storage_management()
-        self.integrator.enable_instance_inspection()
+        self.integrator.request_features(self.GCP_FEATURES)
         self._merge_config(event=event)
 
-    def _update_status(self, _):
+    def _update_status(self, event):
+        if self.config.get("topology-aware-classes") and self.stored.config_hash:
+            # nodes joining or leaving zones change the StorageClass topologies
+            self._merge_config(event)
         if not self.stored.deployed:
             return
 
+        rollout = None
+        if self.unit.is_leader():
+            self._repair_drift()
+            try:
+                # nodes joining or leaving the selector change the cache nodes
+                self._label_data_cache_nodes()
+            except ManifestClientError:
+                log.exception("Failed labelling the data cache nodes")
+            self.metrics_endpoint.update_scrape_jobs()
+            rollout = self._roll_node_plugins()
+
         unready = self.collector.unready
         if unready:
             self.unit.status = WaitingStatus(", ".join(unready))
+        elif rollout:
+            self.unit.status = WaitingStatus(rollout)
         else:
             self.unit.status = ActiveStatus("Ready")
             self.unit.set_workload_version(self.collector.short_version)
-            self.app.status = ActiveStatus(self.collector.long_version)
+            if self.unit.is_leader():
+                self.app.status = ActiveStatus(self.collector.long_version)
+
+    def _repair_drift(self):
+        budget = self.config.get("drift-repair-budget", 0)
+        for controller in self.collector.manifests.values():
+            if budget <= 0:
+                return
+            try:
+                drifted = controller.drifted_resources()[:budget]
+                if drifted:
+                    log.info(f"Repairing drifted resources of {controller.name}")
+                    controller.apply_resources(*drifted)
+            except ManifestClientError:
+                log.exception("Failed repairing drifted resources")
+                return
+            budget -= len(drifted)
+
+    def _roll_node_plugins(self) -> Optional[str]:
+        try:
+            labels = parse_node_labels(str(self.config.get("node-canary-labels", "")))
+        except ValueError:
+            log.exception("Cannot select canary nodes from config")
+            return None
+        if not labels:
+            return None
+        controller = self.collector.manifests["gce-pd-csi-driver"]
+        max_unavailable = str(self.config.get("node-max-unavailable") or "1")
+        try:
+            return roll_node_plugins(controller.client, NAMESPACE, labels, max_unavailable)
+        except ManifestClientError:
+            log.exception("Failed rolling out the node plugins")
+            return None
 
     def _kube_control(self, event):
         self.kube_control.set_auth_request(self.unit.name, "system:masters")
@@ -200,23 +371,156 @@ class GcpK8sStorageCharm(CharmBase):
             self.stored.config_hash = new_hash
             self.stored.deployed = True
 
+    def _check_preflight(self, event):
+        self.unit.status = MaintenanceStatus("Preflight of GCP Storage")
+        try:
+            rejected = self._preflight_rejections()
+        except ManifestClientError as e:
+            self.unit.status = WaitingStatus("Waiting for kube-apiserver")
+            log.warning(f"Encountered retryable preflight error: {e}")
+            event.defer()
+            return False
+        if rejected:
+            shown = "; ".join(rejected[:PREFLIGHT_STATUS_ENTRIES])
+            more = "; ..." if len(rejected) > PREFLIGHT_STATUS_ENTRIES else ""
+            self.unit.status = BlockedStatus(
+                f"Preflight rejected {len(rejected)} objects: {shown}{more} "
+                "(run the preflight action for the full list)"
+            )
+            return False
+        return True
+
+    def _check_prepull(self, event):
+        controller = self.collector.manifests["gce-pd-csi-driver"]
+        previous = self.stored.releases.get(controller.name)
+        release = controller.current_release
+        registry = controller.config.get("image-registry")
+        prepuller = ImagePrePuller(controller.client, NAMESPACE, registry)
+        try:
+            upgrading = self.config.get("image-prepull") and previous and previous != release
+            if upgrading and not self.unit.is_leader():
+                # the leader pre-pulls, then applies the release before the others
+                version = node_plugin_version(controller.client, NAMESPACE)
+                if version != f"{controller.name}-{release}":
+                    msg = f"Waiting for the leader to pre-pull {release} images"
+                    self.unit.status = WaitingStatus(msg)
+                    event.defer()
+                    return False
+            elif upgrading:
+                if self.stored.prepull_started is None:
+                    self.stored.prepull_started = time.time()
+                images = manifest_images(controller.resources)
+                ratio = float(self.config.get("image-prepull-ratio", 1.0))
+                pulled, desired, done = prepuller.pull(release, images, ratio)
+                timeout = timedelta(minutes=int(self.config.get("image-prepull-timeout", 30)))
+                expired = time.time() - self.stored.prepull_started >= timeout.total_seconds()
+                if not done and not expired:
+                    msg = f"Pre-pulling {release} images: {pulled}/{desired} nodes"
+                    self.unit.status = WaitingStatus(msg)
+                    event.defer()
+                    return False
+                if not done:
+                    log.warning(
+                        f"Pre-pulling {release} images timed out at {pulled}/{desired} nodes, "
+                        "applying the release anyway"
+                    )
+            if self.stored.prepull_started is not None:
+                prepuller.remove()
+                self.stored.prepull_started = None
+        except ManifestClientError as e:
+            self.unit.status = WaitingStatus("Waiting for kube-apiserver")
+            log.warning(f"Encountered retryable pre-pull error: {e}")
+            event.defer()
+            return False
+        return True
+
     def _install_or_upgrade(self, event, config_hash=None):
         if self.stored.config_hash == config_hash:
             log.info("Skipping until the config is evaluated.")
             return True
 
+        if not self._check_preflight(event):
+            return False
+
+        if not self._check_prepull(event):
+            return False
+
         self.unit.status = MaintenanceStatus("Deploying GCP Storage")
         self.unit.set_workload_version("")
-        for controller in self.collector.manifests.values():
+        for controller in self._apply_order():
+            self.metrics.inc("reconciles_total", controller.name)
             try:
                 controller.apply_manifests()
+                self._remove_upgrade_leftovers(controller)
             except ManifestClientError as e:
                 self.unit.status = WaitingStatus("Waiting for kube-apiserver")
                 log.warning(f"Encountered retryable installation error: {e}")
                 event.defer()
                 return False
+        if not self._remove_disabled_manifests(event):
+            return False
+        self.metrics_endpoint.update_scrape_jobs()
+        if self.unit.is_leader():
+            try:
+                self._label_data_cache_nodes()
+            except ManifestClientError as e:
+                self.unit.status = WaitingStatus("Waiting for kube-apiserver")
+                log.warning(f"Encountered retryable node labelling error: {e}")
+                event.defer()
+                return False
+            self._roll_node_plugins()
+        return True
+
+    def _apply_order(self) -> List[Manifests]:
+        # Collector orders the manifests by name, but the snapshot CRDs must be
+        # applied ahead of the driver's VolumeSnapshotClasses
+        manifests = list(self.collector.manifests.values())
+        return sorted(manifests, key=lambda m: not isinstance(m, SnapshotControllerManifests))
+
+    def _remove_disabled_manifests(self, event):
+        for key, controller in self.optional_manifests.items():
+            if self.config.get(key) or controller.name not in self.stored.releases:
+                continue
+            try:
+                log.info(f"Removing disabled {controller.name}")
+                controller.delete_manifests(ignore_not_found=True)
+            except ManifestClientError as e:
+                self.unit.status = WaitingStatus("Waiting for kube-apiserver")
+                log.warning(f"Encountered retryable removal error: {e}")
+                event.defer()
+                return False
+            del self.stored.releases[controller.name]
         return True
 
+    def _label_data_cache_nodes(self):
+        # the leader labels the selected nodes with their local SSDs
+        if not (self.config.get("data-cache") or self.stored.data_cache_labelled):
+            return
+        selector, ssd_count = {}, int(self.config.get("data-cache-local-ssds") or 1)
+        if self.config.get("data-cache"):
+            try:
+                selector = parse_node_labels(
+                    str(self.config.get("data-cache-node-selector", "")),
+                    "data-cache-node-selector",
+                )
+            except ValueError:
+                log.exception("Cannot select data cache nodes from config")
+                return
+        controller = self.collector.manifests["gce-pd-csi-driver"]
+        labelled = label_nodes(controller.client, selector, ssd_count)
+        log.info(f"Labelled {len(labelled)} nodes for the data cache")
+        self.stored.data_cache_labelled = bool(selector)
+
+    def _remove_upgrade_leftovers(self, controller):
+        previous = self.stored.releases.get(controller.name)
+        current = controller.current_release
+        if previous and previous != current:
+            leftovers = controller.upgrade_leftovers(previous)
+            if leftovers:
+                log.info(f"Removing {controller.name} objects left over from {previous}")
+                controller.delete_resources(*leftovers, ignore_not_found=True)
+        self.stored.releases[controller.name] = current
+
     def _cleanup(self, event):
         if self.stored.config_hash:
             self.unit.status = MaintenanceStatus("Cleaning up GCP Storage")
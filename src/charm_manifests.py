@@ -0,0 +1,301 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Behaviour shared by each set of manifests managed by the charm."""
+
+import logging
+import pickle
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from hashlib import md5
+from typing import Any, Dict, Iterable, KeysView, List, Optional
+
+from httpx import HTTPError
+from lightkube.codecs import AnyResource, from_dict
+from lightkube.core.exceptions import ApiError, LoadResourceError
+from lightkube.generic_resource import create_resources_from_crd
+from lightkube.resources.apiextensions_v1 import CustomResourceDefinition
+from ops.manifests import HashableResource, ManifestClientError, Manifests
+
+from drift import AppliedIndex
+from manifest_cache import ManifestCache
+from upgrade_plans import UpgradePlans
+
+log = logging.getLogger(__file__)
+
+# concurrent dry-run requests submitted by the preflight
+PREFLIGHT_WORKERS = 8
+# api responses rejecting an object as invalid, any other error may be transient
+REJECTION_CODES = (400, 403, 409, 422)
+WEBHOOK_DENIAL = "denied the request"
+# fields of each kind the api server refuses to update, with the defaults it assigns
+IMMUTABLE_FIELDS: Dict[str, Dict] = {
+    "StorageClass": {
+        "provisioner": None,
+        "parameters": {},
+        "reclaimPolicy": "Delete",
+        "volumeBindingMode": "Immediate",
+        "allowedTopologies": [],
+    },
+    "VolumeAttributesClass": {
+        "driverName": None,
+        "parameters": {},
+    },
+}
+# kinds whose objects stay in use by volumes, so they are renamed rather than replaced
+RENAMED_KINDS = {"VolumeAttributesClass": "volume-attributes-classes"}
+
+
+class CharmManifests(Manifests):
+    """Manifests of a csi driver rendered and applied by this charm.
+
+    Rendered resources are cached by release and config, applied resources
+    are fingerprinted to detect drift, and objects dropped between releases
+    are looked up in the precomputed upgrade plans.
+    """
+
+    # charm config option selecting the release of these manifests
+    RELEASE_CONFIG = ""
+
+    def __init__(
+        self, name, charm, base_path, manipulations, charm_config, kube_control, integrator
+    ):
+        super().__init__(name, charm.model, base_path, manipulations)
+        self.integrator = integrator
+        self.charm_config = charm_config
+        self.kube_control = kube_control
+        self.metrics = charm.metrics
+        self.cache = ManifestCache(charm.CACHE_PATH / "manifests")
+        self.applied = AppliedIndex(charm.CACHE_PATH / "applied" / f"{self.name}.json")
+        self.upgrade_plans = UpgradePlans(self.base_path / "upgrade-plans.yaml")
+        self._rendered: Dict[str, KeysView[HashableResource]] = {}
+
+    @property
+    def config(self) -> Dict:
+        """Returns current config available from charm config and joined relations."""
+        config: Dict = {}
+
+        if self.kube_control.is_ready:
+            config["image-registry"] = self.kube_control.get_registry_location()
+
+        if self.integrator.is_ready:
+            config["cloud_sa"] = self.integrator.credentials.decode()
+
+        config.update(**self.charm_config.available_data)
+
+        for key, value in dict(**config).items():
+            if value == "" or value is None:
+                del config[key]
+
+        config["release"] = config.pop(self.RELEASE_CONFIG, None)
+        return config
+
+    def hash(self) -> int:
+        """Calculate a hash of the current configuration."""
+        return int(md5(pickle.dumps(self.config)).hexdigest(), 16)
+
+    @cached_property
+    def latest_release(self) -> str:
+        """Lookup the newest bundled release, empty when none are bundled."""
+        return next(iter(self.releases), "")
+
+    @property
+    def cache_key(self) -> str:
+        """Key of the rendered resources by release and config digest."""
+        digest = md5(pickle.dumps((self.model.app.name, self.config))).hexdigest()
+        return f"{self.name}-{self.current_release}-{digest}"
+
+    @property
+    def resources(self) -> KeysView[HashableResource]:
+        """All unique component resources, rendered once per release and config."""
+        if not self.current_release:
+            # without a bundled release there is nothing to render
+            return OrderedDict().keys()
+        key = self.cache_key
+        if key in self._rendered:
+            return self._rendered[key]
+
+        items = self.cache.get(key)
+        if items is None:
+            rendered = super().resources
+            self.cache.put(key, [obj.resource.to_dict() for obj in rendered])
+        else:
+            rendered = OrderedDict(
+                (HashableResource(self._resource_from_cache(item)), None) for item in items
+            ).keys()
+        self._rendered[key] = rendered
+        return rendered
+
+    @staticmethod
+    def _resource_from_cache(item: Dict) -> AnyResource:
+        rsc = from_dict(item)
+        if isinstance(rsc, CustomResourceDefinition):
+            create_resources_from_crd(rsc)
+        return rsc
+
+    def evaluate(self) -> Optional[str]:
+        """Determine if manifest_config can be applied to manifests."""
+        if not self.current_release:
+            return f"{self.name} manifests have no bundled releases"
+        if not self.config.get("cloud_sa"):
+            return "Storage manifests waiting for definition of cloud_sa"
+        return None
+
+    def apply_resources(self, *resources: HashableResource):
+        """Apply set of resources to the cluster, recording what was applied.
+
+        @param *resources: set of resources to apply
+        """
+        start, count = time.monotonic(), 0
+        try:
+            for rsc in resources:
+                log.info(f"Applying {rsc}")
+                msg = f"Failed Applying {rsc}"
+                try:
+                    applied = self._apply(rsc)
+                except (ApiError, HTTPError) as ex:
+                    log.exception(msg)
+                    self.metrics.inc("api_errors_total", self.name)
+                    raise ManifestClientError(msg, ex) from ex
+                self.applied.record(rsc, applied)
+                count += 1
+        finally:
+            self.applied.save()
+            self.metrics.observe_apply(self.name, count, time.monotonic() - start)
+        log.info(f"Applied {len(resources)} Resources")
+
+    apply_resource = apply_resources
+
+    def _apply(self, rsc: HashableResource) -> AnyResource:
+        """Apply a resource, replacing it when its immutable fields changed."""
+        try:
+            return self.client.apply(rsc.resource, force=True)
+        except ApiError as ex:
+            if (
+                ex.status.code != 422
+                or rsc.kind in RENAMED_KINDS
+                or not self._immutable_changed(rsc)
+            ):
+                raise
+        log.info(f"Replacing {rsc} to change its immutable fields")
+        kind: Any = type(rsc.resource)
+        self.client.delete(kind, rsc.name or "", namespace=rsc.namespace)
+        return self.client.apply(rsc.resource, force=True)
+
+    def _immutable_changed(self, rsc: HashableResource) -> bool:
+        """Determine if the installed object differs from rsc in fields it cannot update."""
+        fields = IMMUTABLE_FIELDS.get(rsc.kind)
+        if not fields:
+            return False
+        kind: Any = type(rsc.resource)
+        try:
+            installed = self.client.get(kind, rsc.name or "", namespace=rsc.namespace)
+        except ApiError as ex:
+            if ex.status.code == 404:
+                return False
+            raise
+        return any(
+            (getattr(installed, field) or default) != (getattr(rsc.resource, field) or default)
+            for field, default in fields.items()
+        )
+
+    def preflight(self, alongside: Iterable[HashableResource] = ()) -> List[str]:
+        """Submit each resource as a server-side dry-run, listing every rejection.
+
+        Objects in a namespace or of a custom resource created by these same
+        manifests, or by those applied alongside them, cannot be validated
+        until it exists, so they pass when the api server reports it missing.
+        Objects changing immutable fields pass as they are replaced when applied,
+        unless their kind must be renamed instead.
+        Only responses judging an object invalid or denied by an admission
+        webhook count as rejections.
+
+        raises ManifestClientError on any other api error, which may be transient
+        """
+        resources = list(self.resources)
+        created = [*resources, *alongside]
+        namespaces = {rsc.name for rsc in created if rsc.kind == "Namespace"}
+        custom_kinds = {
+            (crd.spec.group, crd.spec.names.kind)
+            for rsc in created
+            if isinstance(crd := rsc.resource, CustomResourceDefinition)
+        }
+        client = self.client
+
+        def pending(rsc: HashableResource) -> bool:
+            group = (rsc.resource.apiVersion or "").rpartition("/")[0]
+            return rsc.namespace in namespaces or (group, rsc.kind) in custom_kinds
+
+        def dry_run(rsc: HashableResource) -> Optional[str]:
+            try:
+                client.apply(rsc.resource, force=True, dry_run=True)
+            except ApiError as ex:
+                code, message = ex.status.code, ex.status.message or ""
+                if code == 404 and pending(rsc):
+                    return None
+                if code == 422 and self._immutable_changed(rsc):
+                    if option := RENAMED_KINDS.get(rsc.kind):
+                        return f"{rsc}: cannot change in place, add it to {option} with a new name"
+                    # replaced rather than updated once applied
+                    return None
+                if code in REJECTION_CODES or WEBHOOK_DENIAL in message:
+                    return f"{rsc}: {message}"
+                raise
+            return None
+
+        try:
+            with ThreadPoolExecutor(PREFLIGHT_WORKERS) as pool:
+                results = list(pool.map(dry_run, resources))
+        except (ApiError, HTTPError) as ex:
+            msg = f"Failed preflight of {self.name}"
+            log.exception(msg)
+            self.metrics.inc("api_errors_total", self.name)
+            raise ManifestClientError(msg, ex) from ex
+        rejected = [result for result in results if result]
+        for result in rejected:
+            log.error(f"Preflight rejected {result}")
+        return rejected
+
+    def delete_manifests(self, **kwargs):
+        """Delete all installed manifests, keeping CRDs so user data survives."""
+        installed_resources = [
+            rsc for rsc in self.labelled_resources() if rsc.kind != "CustomResourceDefinition"
+        ]
+        self.delete_resources(*installed_resources, **kwargs)
+
+    def drifted_resources(self) -> List[HashableResource]:
+        """List resources missing or changed in the cluster since last applied."""
+        try:
+            installed = self.labelled_resources()
+        except (ApiError, HTTPError) as ex:
+            msg = "Failed listing installed resources"
+            log.exception(msg)
+            self.metrics.inc("api_errors_total", self.name)
+            raise ManifestClientError(msg, ex) from ex
+        drifted = self.applied.drifted(self.resources, installed)
+        self.applied.save()
+        return drifted
+
+    def upgrade_leftovers(self, previous: str) -> List[HashableResource]:
+        """List the objects of the previous release removed by the current release."""
+        try:
+            removed = self.upgrade_plans.removed(previous, self.current_release)
+        except ValueError:
+            log.exception(f"Cannot plan upgrade from {previous}")
+            return []
+
+        leftovers = []
+        expected = self.resources
+        for ref in removed:
+            metadata = dict(name=ref["name"], namespace=ref.get("namespace"))
+            try:
+                rsc = from_dict(
+                    dict(apiVersion=ref["apiVersion"], kind=ref["kind"], metadata=metadata)
+                )
+            except LoadResourceError:
+                log.warning(f"Skipping leftover {ref['kind']}/{ref['name']} of an unknown api")
+                continue
+            if (obj := HashableResource(rsc)) not in expected:
+                leftovers.append(obj)
+        return leftovers
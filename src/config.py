@@ -3,10 +3,367 @@
 """Config Management for the gcp k8s storage charm."""
 
 import logging
-from typing import Optional
+import re
+from typing import Dict, List, Optional
+
+import yaml
+from pydantic import (
+    BaseModel,
+    Extra,
+    Field,
+    ValidationError,
+    parse_obj_as,
+    root_validator,
+    validator,
+)
 
 log = logging.getLogger(__name__)
 
+# https://cloud.google.com/compute/docs/disks#disk-types
+DISK_TYPES = (
+    "pd-standard",
+    "pd-balanced",
+    "pd-ssd",
+    "pd-extreme",
+    "hyperdisk-balanced",
+    "hyperdisk-extreme",
+    "hyperdisk-ml",
+    "hyperdisk-throughput",
+)
+IOPS_DISK_TYPES = ("pd-extreme", "hyperdisk-balanced", "hyperdisk-extreme")
+THROUGHPUT_DISK_TYPES = ("hyperdisk-balanced", "hyperdisk-ml", "hyperdisk-throughput")
+DNS_LABEL = re.compile(r"^[a-z0-9]([-a-z0-9]*[a-z0-9])?$")
+QUANTITY = re.compile(r"^\d+(Mi|Gi)$")
+DURATION = re.compile(r"^(\d+(\.\d+)?(ns|us|ms|s|m|h))+$")
+RESOURCE_QUANTITY = re.compile(r"^\d+(\.\d+)?(m|k|Ki|M|Mi|G|Gi|T|Ti)?$")
+SIDECARS = ("csi-provisioner", "csi-attacher", "csi-resizer", "csi-snapshotter")
+FILESTORE_TIERS = ("standard", "premium", "enterprise", "zonal", "regional")
+INT_OR_PERCENT = re.compile(r"^\d+%?$")
+LABEL_KEY = re.compile(
+    r"^([a-z0-9]([-a-z0-9.]*[a-z0-9])?/)?[A-Za-z0-9]([-A-Za-z0-9_.]*[A-Za-z0-9])?$"
+)
+LABEL_VALUE = re.compile(r"^([A-Za-z0-9]([-A-Za-z0-9_.]*[A-Za-z0-9])?)?$")
+
+
+def _describe(error: ValidationError) -> str:
+    """Condense a pydantic validation error into a single line."""
+    first = error.errors()[0]
+    loc = ".".join(str(_) for _ in first["loc"] if _ != "__root__")
+    return f"{loc}: {first['msg']}"
+
+
+class StorageClassConfig(BaseModel, extra=Extra.forbid):
+    """A StorageClass declared by the storage-classes config."""
+
+    name: str
+    type: str
+    provisioned_iops_on_create: Optional[int] = Field(None, alias="provisioned-iops-on-create")
+    provisioned_throughput_on_create: Optional[str] = Field(
+        None, alias="provisioned-throughput-on-create"
+    )
+    replication_type: str = Field("none", alias="replication-type")
+    reclaim_policy: str = Field("Delete", alias="reclaim-policy")
+    data_cache_mode: Optional[str] = Field(None, alias="data-cache-mode")
+    data_cache_size: Optional[str] = Field(None, alias="data-cache-size")
+    default: bool = False
+
+    @validator("name")
+    def valid_name(cls, v: str):
+        """Validate the name can be used within a StorageClass name."""
+        if not DNS_LABEL.match(v):
+            raise ValueError(f"'{v}' is not a valid DNS label")
+        if v == "default":
+            raise ValueError("'default' is reserved for the charm's default class")
+        return v
+
+    @validator("type")
+    def valid_type(cls, v: str):
+        """Validate the disk type is known to the driver."""
+        if v not in DISK_TYPES:
+            raise ValueError(f"'{v}' is not one of {', '.join(DISK_TYPES)}")
+        return v
+
+    @validator("provisioned_iops_on_create")
+    def valid_iops(cls, v: Optional[int], values):
+        """Validate provisioned iops are only used on disk types supporting it."""
+        if v is not None and values.get("type") not in IOPS_DISK_TYPES:
+            raise ValueError(f"only supported by {', '.join(IOPS_DISK_TYPES)}")
+        return v
+
+    @validator("provisioned_throughput_on_create")
+    def valid_throughput(cls, v: Optional[str], values):
+        """Validate provisioned throughput are only used on disk types supporting it."""
+        if v is None:
+            return v
+        if values.get("type") not in THROUGHPUT_DISK_TYPES:
+            raise ValueError(f"only supported by {', '.join(THROUGHPUT_DISK_TYPES)}")
+        if not QUANTITY.match(v):
+            raise ValueError(f"'{v}' should be a quantity such as '250Mi'")
+        return v
+
+    @validator("replication_type")
+    def valid_replication(cls, v: str):
+        """Validate the replication type is known to the driver."""
+        if v not in ("none", "regional-pd"):
+            raise ValueError("should be either 'none' or 'regional-pd'")
+        return v
+
+    @validator("reclaim_policy")
+    def valid_reclaim_policy(cls, v: str):
+        """Validate the reclaim policy is known to kubernetes."""
+        if v not in ("Delete", "Retain"):
+            raise ValueError("should be either 'Delete' or 'Retain'")
+        return v
+
+    @validator("data_cache_mode")
+    def valid_data_cache_mode(cls, v: Optional[str]):
+        """Validate the data cache mode is known to the driver."""
+        if v is not None and v not in ("writethrough", "writeback"):
+            raise ValueError("should be either 'writethrough' or 'writeback'")
+        return v
+
+    @validator("data_cache_size")
+    def valid_data_cache_size(cls, v: Optional[str]):
+        """Validate the data cache size is a quantity."""
+        if v is not None and not QUANTITY.match(v):
+            raise ValueError(f"'{v}' should be a quantity such as '50Gi'")
+        return v
+
+    @root_validator(skip_on_failure=True)
+    def valid_data_cache(cls, values):
+        """Validate the data cache defines both its mode and size."""
+        if (values.get("data_cache_mode") is None) != (values.get("data_cache_size") is None):
+            raise ValueError("should define both data-cache-mode and data-cache-size")
+        return values
+
+
+class SnapshotClassConfig(BaseModel, extra=Extra.forbid):
+    """A VolumeSnapshotClass declared by the snapshot-classes config."""
+
+    name: str
+    snapshot_type: str = Field("snapshots", alias="snapshot-type")
+    storage_locations: Optional[str] = Field(None, alias="storage-locations")
+    deletion_policy: str = Field("Delete", alias="deletion-policy")
+    default: bool = False
+
+    @validator("name")
+    def valid_name(cls, v: str):
+        """Validate the name can be used within a VolumeSnapshotClass name."""
+        if not DNS_LABEL.match(v):
+            raise ValueError(f"'{v}' is not a valid DNS label")
+        return v
+
+    @validator("snapshot_type")
+    def valid_snapshot_type(cls, v: str):
+        """Validate the snapshot type is known to the driver."""
+        if v not in ("snapshots", "images"):
+            raise ValueError("should be either 'snapshots' or 'images'")
+        return v
+
+    @validator("deletion_policy")
+    def valid_deletion_policy(cls, v: str):
+        """Validate the deletion policy is known to kubernetes."""
+        if v not in ("Delete", "Retain"):
+            raise ValueError("should be either 'Delete' or 'Retain'")
+        return v
+
+
+class VolumeAttributesClassConfig(BaseModel, extra=Extra.forbid):
+    """A VolumeAttributesClass declared by the volume-attributes-classes config."""
+
+    name: str
+    iops: Optional[int] = Field(None, gt=0)
+    throughput: Optional[str] = None
+
+    @validator("name")
+    def valid_name(cls, v: str):
+        """Validate the name can be used within a VolumeAttributesClass name."""
+        if not DNS_LABEL.match(v):
+            raise ValueError(f"'{v}' is not a valid DNS label")
+        return v
+
+    @validator("throughput")
+    def valid_throughput(cls, v: Optional[str]):
+        """Validate the throughput is a quantity."""
+        if v is not None and not QUANTITY.match(v):
+            raise ValueError(f"'{v}' should be a quantity such as '250Mi'")
+        return v
+
+    @root_validator(skip_on_failure=True)
+    def has_attributes(cls, values):
+        """Validate the class changes at least one attribute."""
+        if values.get("iops") is None and values.get("throughput") is None:
+            raise ValueError("should define iops, throughput or both")
+        return values
+
+
+class SidecarResources(BaseModel, extra=Extra.forbid):
+    """Resource requests and limits of a csi sidecar container."""
+
+    requests: Dict[str, str] = {}
+    limits: Dict[str, str] = {}
+
+    @validator("requests", "limits")
+    def valid_quantities(cls, v: Dict[str, str]):
+        """Validate each resource is a kubernetes quantity."""
+        for resource, quantity in v.items():
+            if not RESOURCE_QUANTITY.match(quantity):
+                raise ValueError(f"{resource}='{quantity}' isn't a valid quantity")
+        return v
+
+
+class SidecarTuning(BaseModel, extra=Extra.forbid):
+    """Throughput tuning of a csi sidecar container."""
+
+    worker_threads: Optional[int] = Field(None, alias="worker-threads", ge=1)
+    kube_api_qps: Optional[float] = Field(None, alias="kube-api-qps", gt=0)
+    kube_api_burst: Optional[int] = Field(None, alias="kube-api-burst", ge=1)
+    timeout: Optional[str] = None
+    leader_election_lease_duration: Optional[str] = Field(
+        None, alias="leader-election-lease-duration"
+    )
+    leader_election_renew_deadline: Optional[str] = Field(
+        None, alias="leader-election-renew-deadline"
+    )
+    leader_election_retry_period: Optional[str] = Field(None, alias="leader-election-retry-period")
+    resources: Optional[SidecarResources] = None
+
+    @validator(
+        "timeout",
+        "leader_election_lease_duration",
+        "leader_election_renew_deadline",
+        "leader_election_retry_period",
+    )
+    def valid_duration(cls, v: Optional[str]):
+        """Validate durations are parsable by the sidecars."""
+        if v is not None and not DURATION.match(v):
+            raise ValueError(f"'{v}' should be a duration such as '300s'")
+        return v
+
+    def merge(self, other: "SidecarTuning") -> "SidecarTuning":
+        """Create a new tuning where the values of other take precedence."""
+        return self.copy(update={k: getattr(other, k) for k in other.__fields_set__})
+
+
+def parse_snapshot_classes(raw: Optional[str]) -> List[SnapshotClassConfig]:
+    """Parse the snapshot-classes config into a list of SnapshotClassConfig.
+
+    raises ValueError if the config isn't valid
+    """
+    try:
+        loaded = yaml.safe_load(raw or "") or []
+    except yaml.YAMLError as e:
+        raise ValueError(f"snapshot-classes isn't valid YAML: {e}") from e
+    try:
+        classes = parse_obj_as(List[SnapshotClassConfig], loaded)
+    except ValidationError as e:
+        raise ValueError(f"snapshot-classes {_describe(e)}") from e
+
+    names = [vsc.name for vsc in classes]
+    if len(names) != len(set(names)):
+        raise ValueError("snapshot-classes names must be unique")
+    if sum(vsc.default for vsc in classes) > 1:
+        raise ValueError("snapshot-classes may only define one default class")
+    return classes
+
+
+def parse_volume_attributes_classes(raw: Optional[str]) -> List[VolumeAttributesClassConfig]:
+    """Parse the volume-attributes-classes config into a list of VolumeAttributesClassConfig.
+
+    raises ValueError if the config isn't valid
+    """
+    try:
+        loaded = yaml.safe_load(raw or "") or []
+    except yaml.YAMLError as e:
+        raise ValueError(f"volume-attributes-classes isn't valid YAML: {e}") from e
+    try:
+        classes = parse_obj_as(List[VolumeAttributesClassConfig], loaded)
+    except ValidationError as e:
+        raise ValueError(f"volume-attributes-classes {_describe(e)}") from e
+
+    names = [vac.name for vac in classes]
+    if len(names) != len(set(names)):
+        raise ValueError("volume-attributes-classes names must be unique")
+    return classes
+
+
+def parse_filestore_tiers(raw: Optional[str]) -> List[str]:
+    """Parse the filestore-tiers config into a list of unique tiers.
+
+    raises ValueError if the config isn't valid
+    """
+    tiers = list(dict.fromkeys((raw or "").replace(",", " ").split()))
+    unknown = [tier for tier in tiers if tier not in FILESTORE_TIERS]
+    if unknown:
+        raise ValueError(
+            f"filestore-tiers {', '.join(unknown)} not one of {', '.join(FILESTORE_TIERS)}"
+        )
+    return tiers
+
+
+def parse_node_labels(raw: Optional[str], option: str = "node-canary-labels") -> Dict[str, str]:
+    """Parse a node labels config option into a node label selector.
+
+    raises ValueError if the config isn't valid
+    """
+    labels = {}
+    for item in (raw or "").replace(",", " ").split():
+        key, sep, value = item.partition("=")
+        if not (sep and LABEL_KEY.match(key) and LABEL_VALUE.match(value)):
+            raise ValueError(f"{option} '{item}' should be a label such as 'key=value'")
+        labels[key] = value
+    return labels
+
+
+def parse_sidecar_tuning(raw: Optional[str]) -> Dict[str, SidecarTuning]:
+    """Parse the csi-sidecar-tuning config into the tuning of each sidecar.
+
+    Settings under the key `all` apply to each sidecar unless the sidecar
+    overrides it with its own setting.
+
+    raises ValueError if the config isn't valid
+    """
+    try:
+        loaded = yaml.safe_load(raw or "") or {}
+    except yaml.YAMLError as e:
+        raise ValueError(f"csi-sidecar-tuning isn't valid YAML: {e}") from e
+    if not isinstance(loaded, dict):
+        raise ValueError("csi-sidecar-tuning should be a mapping of sidecar names")
+    unknown = set(loaded) - {"all", *SIDECARS}
+    if unknown:
+        raise ValueError(f"csi-sidecar-tuning has unknown sidecars {', '.join(sorted(unknown))}")
+    try:
+        tuning = parse_obj_as(
+            Dict[str, SidecarTuning], {key: {} for key in ("all", *SIDECARS)} | loaded
+        )
+    except ValidationError as e:
+        raise ValueError(f"csi-sidecar-tuning {_describe(e)}") from e
+
+    common = tuning.pop("all")
+    return {name: common.merge(tuning[name]) for name in SIDECARS}
+
+
+def parse_storage_classes(raw: Optional[str]) -> List[StorageClassConfig]:
+    """Parse the storage-classes config into a list of StorageClassConfig.
+
+    raises ValueError if the config isn't valid
+    """
+    try:
+        loaded = yaml.safe_load(raw or "") or []
+    except yaml.YAMLError as e:
+        raise ValueError(f"storage-classes isn't valid YAML: {e}") from e
+    try:
+        classes = parse_obj_as(List[StorageClassConfig], loaded)
+    except ValidationError as e:
+        raise ValueError(f"storage-classes {_describe(e)}") from e
+
+    names = [sc.name for sc in classes]
+    if len(names) != len(set(names)):
+        raise ValueError("storage-classes names must be unique")
+    if sum(sc.default for sc in classes) > 1:
+        raise ValueError("storage-classes may only define one default class")
+    return classes
+
 
 class CharmConfig:
     """Representation of the charm configuration."""
@@ -27,4 +384,53 @@ class CharmConfig:
 
     def evaluate(self) -> Optional[str]:
         """Determine if configuration is valid."""
+        replicas = self.config.get("controller-replicas")
+        if replicas is not None and replicas < 1:
+            return "controller-replicas should be at least 1"
+        discovery_dir = self.config.get("local-ssd-discovery-dir")
+        if discovery_dir and not discovery_dir.startswith("/"):
+            return "local-ssd-discovery-dir should be an absolute path"
+        ratio = self.config.get("image-prepull-ratio")
+        if ratio is not None and not 0 < ratio <= 1:
+            return "image-prepull-ratio should be greater than 0 and at most 1"
+        timeout = self.config.get("image-prepull-timeout")
+        if timeout is not None and timeout < 1:
+            return "image-prepull-timeout should be at least 1"
+        rolling = {}
+        for key in ("node-max-unavailable", "node-max-surge"):
+            value = self.config.get(key)
+            if value and not INT_OR_PERCENT.match(value):
+                return f"{key} should be a number or percentage such as '10%'"
+            rolling[key] = int(value.rstrip("%")) if value else None
+        if rolling["node-max-unavailable"] == 0 and not rolling["node-max-surge"]:
+            return "node-max-unavailable and node-max-surge cannot both be zero"
+        if rolling["node-max-surge"] and self.config.get("node-canary-labels"):
+            return "node-max-surge cannot be set with node-canary-labels"
+        try:
+            classes = parse_storage_classes(self.config.get("storage-classes"))
+            parse_snapshot_classes(self.config.get("snapshot-classes"))
+            parse_sidecar_tuning(self.config.get("csi-sidecar-tuning"))
+            parse_filestore_tiers(self.config.get("filestore-tiers"))
+            parse_volume_attributes_classes(self.config.get("volume-attributes-classes"))
+            parse_node_labels(self.config.get("node-canary-labels"))
+        except ValueError as e:
+            return str(e)
+        return self._evaluate_data_cache(classes)
+
+    def _evaluate_data_cache(self, classes: List[StorageClassConfig]) -> Optional[str]:
+        try:
+            cache_nodes = parse_node_labels(
+                self.config.get("data-cache-node-selector"), "data-cache-node-selector"
+            )
+        except ValueError as e:
+            return str(e)
+        if not self.config.get("data-cache"):
+            cached = [sc.name for sc in classes if sc.data_cache_mode]
+            if cached:
+                return f"storage-classes {', '.join(cached)} require data-cache to be enabled"
+            return None
+        if not cache_nodes:
+            return "data-cache requires data-cache-node-selector to select the nodes"
+        if self.config.get("data-cache-local-ssds", 1) < 1:
+            return "data-cache-local-ssds should be at least 1"
         return None
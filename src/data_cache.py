@@ -0,0 +1,102 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""PD Data Cache support, caching persistent disk reads on local SSDs."""
+
+import logging
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from httpx import HTTPError
+from lightkube import Client, operators
+from lightkube.core.exceptions import ApiError
+from lightkube.models.core_v1 import EnvVar, EnvVarSource, ObjectFieldSelector
+from lightkube.resources.core_v1 import Node
+from ops.manifests import ManifestClientError, Patch
+
+log = logging.getLogger(__name__)
+
+# nodes carrying this label with their count of local SSDs host the cache
+DATA_CACHE_LABEL = "cloud.google.com/gke-data-cache-disk"
+DATA_CACHE_FLAG = "--enable-data-cache"
+DATA_CACHE_DRIVER = (1, 15, 0)
+DRIVER_CONTAINER = "gce-pd-driver"
+DRIVER_IMAGE = re.compile(r"gcp-compute-persistent-disk-csi-driver:v(\d+)\.(\d+)\.(\d+)")
+NODE_NAME_ARG = "--node-name=$(KUBE_NODE_NAME)"
+
+
+def _driver_version(release_path: Path) -> Optional[Tuple[int, ...]]:
+    for yml in release_path.glob("*.yaml"):
+        if match := DRIVER_IMAGE.search(yml.read_text()):
+            return tuple(int(part) for part in match.groups())
+    return None
+
+
+def release_supports_data_cache(release_path: Path) -> bool:
+    """Determine if the driver image of a release supports the data cache."""
+    version = _driver_version(release_path)
+    return version is not None and version >= DATA_CACHE_DRIVER
+
+
+class EnableDataCache(Patch):
+    """Enable the data cache of the linux driver containers from the data-cache config."""
+
+    def __call__(self, obj):
+        """Add the data cache flag to the driver container, unless the release has it."""
+        if obj.kind not in ("Deployment", "DaemonSet"):
+            return
+        pod = obj.spec.template.spec
+        if (pod.nodeSelector or {}).get("kubernetes.io/os") != "linux":
+            return
+
+        if not self.manifests.config.get("data-cache"):
+            return
+        for container in pod.containers:
+            if container.name != DRIVER_CONTAINER:
+                continue
+            log.info(f"Enabling the data cache of {obj.metadata.name}")
+            args = container.args or []
+            if DATA_CACHE_FLAG not in args:
+                args.append(DATA_CACHE_FLAG)
+            if obj.kind == "DaemonSet":
+                # the node plugin looks up its node labels to set up the cache
+                if not any(arg.startswith("--node-name=") for arg in args):
+                    args.append(NODE_NAME_ARG)
+                if not any(env.name == "KUBE_NODE_NAME" for env in container.env or []):
+                    node_name = EnvVarSource(
+                        fieldRef=ObjectFieldSelector(fieldPath="spec.nodeName")
+                    )
+                    container.env = (container.env or []) + [
+                        EnvVar(name="KUBE_NODE_NAME", valueFrom=node_name)
+                    ]
+            container.args = args
+
+
+def label_nodes(client: Client, selector: Dict[str, str], ssd_count: int) -> List[str]:
+    """Label the nodes matching selector with their local SSDs for the data cache.
+
+    Nodes no longer matching lose the label, as do all nodes without a selector.
+    returns the names of the labelled nodes
+    raises ManifestClientError if the nodes cannot be labelled
+    """
+    try:
+        selected = list(client.list(Node, labels={**selector})) if selector else []
+        labelled = list(client.list(Node, labels={DATA_CACHE_LABEL: operators.exists()}))
+        names = sorted(
+            node.metadata.name for node in selected if node.metadata and node.metadata.name
+        )
+        nodes = {
+            node.metadata.name: node.metadata.labels or {}
+            for node in labelled + selected
+            if node.metadata and node.metadata.name
+        }
+        for name, labels in nodes.items():
+            value = str(ssd_count) if name in names else None
+            if labels.get(DATA_CACHE_LABEL) != value:
+                patch = {"metadata": {"labels": {DATA_CACHE_LABEL: value}}}
+                client.patch(Node, name, patch)
+    except (ApiError, HTTPError) as ex:
+        msg = "Failed labelling nodes for the data cache"
+        log.exception(msg)
+        raise ManifestClientError(msg, ex) from ex
+    return names
@@ -0,0 +1,108 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Detect drift of installed resources from those last applied by the charm."""
+
+import json
+import logging
+from hashlib import md5
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, TypedDict
+
+from lightkube.codecs import AnyResource
+from lightkube.models.meta_v1 import ObjectMeta
+from ops.manifests import HashableResource
+
+log = logging.getLogger(__name__)
+
+# fields maintained by the api-server rather than describing the desired state
+IGNORED_FIELDS = ("apiVersion", "kind", "metadata", "status")
+
+
+class Fingerprint(TypedDict):
+    """Identifies the state of an installed resource."""
+
+    generation: Optional[int]
+    resourceVersion: Optional[str]
+    content: str
+
+
+def fingerprint(rsc: AnyResource) -> Fingerprint:
+    """Fingerprint an installed resource by its metadata and a hash of its spec."""
+    content = {k: v for k, v in rsc.to_dict().items() if k not in IGNORED_FIELDS}
+    metadata = rsc.metadata or ObjectMeta()
+    return Fingerprint(
+        generation=metadata.generation,
+        resourceVersion=metadata.resourceVersion,
+        content=md5(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest(),
+    )
+
+
+def _unchanged(last: Fingerprint, now: Fingerprint) -> bool:
+    if last["resourceVersion"] == now["resourceVersion"]:
+        return True
+    if last["generation"] is not None and now["generation"] is not None:
+        # only changes to the spec bump the generation, status updates do not
+        return last["generation"] == now["generation"]
+    return last["content"] == now["content"]
+
+
+class AppliedIndex:
+    """Index of the fingerprints of resources last applied to the cluster."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._index: Optional[Dict[str, Fingerprint]] = None
+
+    @property
+    def index(self) -> Dict[str, Fingerprint]:
+        """Lazily load the index from disk."""
+        if self._index is None:
+            try:
+                self._index = json.loads(self.path.read_text())
+            except FileNotFoundError:
+                self._index = {}
+            except (OSError, ValueError):
+                log.exception(f"Discarding unreadable applied index {self.path}")
+                self._index = {}
+        return self._index
+
+    def record(self, obj: HashableResource, applied: AnyResource):
+        """Record the fingerprint of a resource as returned by the api-server."""
+        self.index[str(obj)] = fingerprint(applied)
+
+    def save(self):
+        """Persist the index to disk."""
+        try:
+            self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            self.path.write_text(json.dumps(self.index))
+        except (OSError, TypeError):
+            log.exception(f"Failed saving applied index {self.path}")
+
+    def drifted(
+        self, expected: Iterable[HashableResource], installed: Iterable[HashableResource]
+    ) -> List[HashableResource]:
+        """List expected resources which are missing or changed since last applied.
+
+        Resources without a recorded fingerprint are adopted with their
+        installed state rather than being reported.
+        """
+        live = {str(obj): obj for obj in installed}
+        index, self._index = self.index, {}
+        drifted = []
+        for obj in expected:
+            key = str(obj)
+            last = index.get(key)
+            if key not in live:
+                log.info(f"Drift detected, {key} is missing")
+                drifted.append(obj)
+            else:
+                now = fingerprint(live[key].resource)
+                if last and not _unchanged(last, now):
+                    log.info(f"Drift detected, {key} was changed")
+                    drifted.append(obj)
+                else:
+                    last = now
+            if last:
+                # drifted resources keep their last applied fingerprint until repaired
+                self._index[key] = last
+        return drifted
@@ -0,0 +1,98 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Implementation of gcp specific details of the filestore csi driver manifests."""
+
+import logging
+from typing import Dict, List, Optional
+
+from lightkube.codecs import AnyResource, from_dict
+from ops.manifests import Addition, ConfigRegistry, CreateNamespace, ManifestLabel
+
+from charm_manifests import CharmManifests
+from config import parse_filestore_tiers
+
+log = logging.getLogger(__file__)
+NAMESPACE = "gcp-filestore-csi-driver"
+SECRET_NAME = "gcp-filestore-csi-driver-sa"
+SECRET_FILE = "gcp_filestore_csi_driver_sa.json"
+STORAGE_CLASS_NAME = "csi-filestore-{tier}"
+PROVISIONER = "filestore.csi.storage.gke.io"
+
+
+class CreateFilestoreSecret(Addition):
+    """Create the secret holding the cloud service account of the filestore driver."""
+
+    def __call__(self) -> Optional[AnyResource]:
+        """Craft the secrets object for the deployment."""
+        cloud_sa = self.manifests.config.get("cloud_sa")
+        if cloud_sa is None:
+            log.error("secret data item is None")
+            return None
+
+        log.info("Encode secret data for filestore.")
+        return from_dict(
+            dict(
+                apiVersion="v1",
+                kind="Secret",
+                type="Opaque",
+                metadata=dict(name=SECRET_NAME, namespace=NAMESPACE),
+                data={SECRET_FILE: cloud_sa},
+            )
+        )
+
+
+class CreateFilestoreStorageClasses(Addition):
+    """Create a storage class for each configured filestore service tier."""
+
+    def __call__(self) -> List[AnyResource]:
+        """Craft each filestore storage class object."""
+        try:
+            tiers = parse_filestore_tiers(self.manifests.config.get("filestore-tiers"))
+        except ValueError:
+            log.exception("Cannot create filestore storage classes from config")
+            return []
+
+        resources = []
+        for tier in tiers:
+            name = STORAGE_CLASS_NAME.format(tier=tier)
+            log.info(f"Creating storage class {name}")
+            parameters: Dict[str, str] = {"tier": tier}
+            if network := self.manifests.config.get("filestore-network"):
+                parameters["network"] = network
+            resources.append(
+                from_dict(
+                    dict(
+                        apiVersion="storage.k8s.io/v1",
+                        kind="StorageClass",
+                        metadata=dict(name=name),
+                        provisioner=PROVISIONER,
+                        parameters=parameters,
+                        allowVolumeExpansion=True,
+                        volumeBindingMode="WaitForFirstConsumer",
+                    )
+                )
+            )
+        return resources
+
+
+class GCPFilestoreManifests(CharmManifests):
+    """Deployment Specific details for the gcp-filestore-csi-driver."""
+
+    RELEASE_CONFIG = "filestore-release"
+
+    def __init__(self, charm, charm_config, kube_control, integrator):
+        super().__init__(
+            "gcp-filestore-csi-driver",
+            charm,
+            "upstream/filestore",
+            [
+                CreateNamespace(self, NAMESPACE),
+                CreateFilestoreSecret(self),
+                ManifestLabel(self),
+                ConfigRegistry(self),
+                CreateFilestoreStorageClasses(self),
+            ],
+            charm_config,
+            kube_control,
+            integrator,
+        )
@@ -0,0 +1,183 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Implementation of the local static provisioner manifests for local SSDs."""
+
+import logging
+from typing import List, Optional
+
+import yaml
+from lightkube.codecs import AnyResource, from_dict
+from ops.manifests import Addition, ConfigRegistry, CreateNamespace, ManifestLabel, Patch
+from ops.manifests.manipulations import Subtraction
+
+from charm_manifests import CharmManifests
+
+log = logging.getLogger(__file__)
+NAMESPACE = "local-ssd-provisioner"
+PROVISIONER_NAME = "local-static-provisioner"
+CONFIG_MAP_NAME = "local-static-provisioner-config"
+STORAGE_CLASS_NAME = "local-ssd"
+# the upstream example discovers disks under the same directory the charm defaults to
+UPSTREAM_DISCOVERY_DIR = DEFAULT_DISCOVERY_DIR = "/mnt/disks"
+JOB_IMAGE_ENV = "JOB_CONTAINER_IMAGE"
+
+
+class CreateDiscoveryConfig(Addition):
+    """Create the ConfigMap telling the provisioner where to discover disks."""
+
+    def __call__(self) -> Optional[AnyResource]:
+        """Craft the discovery config map object."""
+        discovery_dir = self.manifests.config.get("local-ssd-discovery-dir", DEFAULT_DISCOVERY_DIR)
+        storage_class_map = {
+            STORAGE_CLASS_NAME: dict(
+                hostDir=discovery_dir,
+                mountDir=discovery_dir,
+                blockCleanerCommand=["/scripts/shred.sh", "2"],
+                volumeMode="Filesystem",
+                fsType="ext4",
+                namePattern="*",
+            )
+        }
+        return from_dict(
+            dict(
+                apiVersion="v1",
+                kind="ConfigMap",
+                metadata=dict(name=CONFIG_MAP_NAME, namespace=NAMESPACE),
+                data=dict(storageClassMap=yaml.safe_dump(storage_class_map)),
+            )
+        )
+
+
+class CreateLocalStorageClass(Addition):
+    """Create the storage class of the discovered local SSDs."""
+
+    def __call__(self) -> Optional[AnyResource]:
+        """Craft the local-ssd storage class object."""
+        log.info(f"Creating storage class {STORAGE_CLASS_NAME}")
+        return from_dict(
+            dict(
+                apiVersion="storage.k8s.io/v1",
+                kind="StorageClass",
+                metadata=dict(name=STORAGE_CLASS_NAME),
+                provisioner="kubernetes.io/no-provisioner",
+                reclaimPolicy="Delete",
+                volumeBindingMode="WaitForFirstConsumer",
+            )
+        )
+
+
+def _discovery_mounts(pod, host_dir: str) -> List:
+    # the provisioner mounts of the hostPath volumes of host_dir, whatever their name
+    volumes = {v.name for v in pod.volumes or [] if v.hostPath and v.hostPath.path == host_dir}
+    return [
+        mount
+        for container in pod.containers
+        for mount in container.volumeMounts or []
+        if mount.name in volumes
+    ]
+
+
+class SetDiscoveryDir(Patch):
+    """Mount the configured discovery directory into the provisioner."""
+
+    def __call__(self, obj):
+        """Update the discovery volume and its mount in the provisioner daemonset."""
+        if not (obj.kind == "DaemonSet" and obj.metadata.name == PROVISIONER_NAME):
+            return
+
+        discovery_dir = self.manifests.config.get("local-ssd-discovery-dir", DEFAULT_DISCOVERY_DIR)
+        pod = obj.spec.template.spec
+        mounts = _discovery_mounts(pod, UPSTREAM_DISCOVERY_DIR)
+        if not mounts:
+            log.error(f"{PROVISIONER_NAME} doesn't mount {UPSTREAM_DISCOVERY_DIR} from the host")
+            return
+        log.info(f"Discovering local SSDs under {discovery_dir}")
+        for volume in pod.volumes:
+            if volume.hostPath and volume.hostPath.path == UPSTREAM_DISCOVERY_DIR:
+                volume.hostPath.path = discovery_dir
+        for mount in mounts:
+            mount.mountPath = discovery_dir
+
+
+class SkipUpstreamConfig(Subtraction):
+    """Drop the example discovery config and StorageClasses of the upstream manifests."""
+
+    def __call__(self, obj: AnyResource) -> bool:
+        """Subtract the objects rendered by the charm from its config instead."""
+        return obj.kind in ("ConfigMap", "StorageClass")
+
+
+class SetNamespace(Patch):
+    """Deploy the upstream objects into the provisioner namespace."""
+
+    def __call__(self, obj):
+        """Update the namespace of namespaced objects and of service account subjects."""
+        if obj.metadata and obj.metadata.namespace:
+            obj.metadata.namespace = NAMESPACE
+        for subject in getattr(obj, "subjects", None) or []:
+            if subject.kind == "ServiceAccount":
+                subject.namespace = NAMESPACE
+
+
+class SetJobImage(Patch):
+    """Run the disk cleaning jobs with the provisioner's own image."""
+
+    def __call__(self, obj):
+        """Update the job image env var, which image-registry doesn't rewrite."""
+        if not (obj.kind == "DaemonSet" and obj.metadata.name == PROVISIONER_NAME):
+            return
+
+        for container in obj.spec.template.spec.containers:
+            for env in container.env or []:
+                if env.name == JOB_IMAGE_ENV and env.value != container.image:
+                    log.info(f"Cleaning disks with {container.image}")
+                    env.value = container.image
+
+
+class LocalSSDManifests(CharmManifests):
+    """Deployment Specific details for the local static provisioner."""
+
+    def __init__(self, charm, charm_config, kube_control, integrator):
+        super().__init__(
+            "local-ssd-provisioner",
+            charm,
+            "upstream/local_ssd",
+            [
+                CreateNamespace(self, NAMESPACE),
+                ManifestLabel(self),
+                ConfigRegistry(self),
+                SetJobImage(self),
+                SetNamespace(self),
+                SkipUpstreamConfig(self),
+                CreateDiscoveryConfig(self),
+                CreateLocalStorageClass(self),
+                SetDiscoveryDir(self),
+            ],
+            charm_config,
+            kube_control,
+            integrator,
+        )
+
+    def evaluate(self) -> Optional[str]:
+        """Determine if manifest_config can be applied to manifests."""
+        # local disks need no cloud credentials
+        if not self.current_release:
+            return f"{self.name} manifests have no bundled releases"
+        discovery_dir = self.config.get("local-ssd-discovery-dir", DEFAULT_DISCOVERY_DIR)
+        provisioner = next(
+            (
+                obj.resource
+                for obj in self.resources
+                if obj.kind == "DaemonSet" and obj.name == PROVISIONER_NAME
+            ),
+            None,
+        )
+        pod = provisioner.spec.template.spec if provisioner else None
+        if not (
+            pod
+            and any(m.mountPath == discovery_dir for m in _discovery_mounts(pod, discovery_dir))
+        ):
+            return (
+                f"{self.name} release {self.current_release} doesn't mount local-ssd-discovery-dir"
+            )
+        return None
@@ -0,0 +1,73 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Disk cache of rendered kubernetes manifests."""
+
+import json
+import logging
+import os
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+# rendered releases are ~100KiB, keep a handful of them around
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024
+
+
+class ManifestCache:
+    """Size bounded LRU cache of rendered manifests stored on disk.
+
+    Each entry is a json file holding the list of rendered objects, the file's
+    mtime records its last use so the least recently used entries are evicted
+    first once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+
+    def _entry(self, key: str) -> Path:
+        return self.path / f"{key}.json"
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """Retrieve the rendered objects of a key, if cached."""
+        entry = self._entry(key)
+        try:
+            items = json.loads(entry.read_text())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            log.exception(f"Discarding unreadable manifest cache entry {entry.name}")
+            entry.unlink(missing_ok=True)
+            return None
+        os.utime(entry)
+        log.info(f"Using cached manifests {entry.name}")
+        return items
+
+    def put(self, key: str, items: List[Dict]):
+        """Store the rendered objects of a key, evicting the least recently used entries."""
+        try:
+            self.path.mkdir(mode=0o700, parents=True, exist_ok=True)
+            # the rendered objects contain secrets, only the owner may read them
+            with NamedTemporaryFile("w", dir=self.path, suffix=".tmp", delete=False) as tmp:
+                json.dump(items, tmp)
+            Path(tmp.name).replace(self._entry(key))
+        except OSError:
+            log.exception(f"Failed caching manifests {key}")
+            return
+        self._evict()
+
+    def clear(self):
+        """Remove every cached entry."""
+        for entry in self.path.glob("*.json"):
+            entry.unlink(missing_ok=True)
+
+    def _evict(self):
+        entries = sorted(self.path.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+        total = 0
+        for idx, entry in enumerate(entries):
+            total += entry.stat().st_size
+            if idx and total > self.max_bytes:
+                log.info(f"Evicting cached manifests {entry.name}")
+                entry.unlink(missing_ok=True)
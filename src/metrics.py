@@ -0,0 +1,97 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Counters of the charm's reconciles exported in the prometheus textfile format."""
+
+import json
+import logging
+from collections import defaultdict
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Dict, Optional
+
+log = logging.getLogger(__name__)
+
+PREFIX = "gcp_k8s_storage"
+# name, type and help of each exported metric
+METRICS = {
+    "reconciles_total": ("counter", "Manifest reconciles performed by the charm."),
+    "objects_applied_total": ("counter", "Kubernetes objects applied by the charm."),
+    "api_errors_total": ("counter", "Kubernetes API errors encountered by the charm."),
+    "apply_duration_seconds_total": ("counter", "Time spent applying kubernetes objects."),
+    "last_apply_duration_seconds": ("gauge", "Duration of the most recent apply."),
+}
+
+
+class ReconcileMetrics:
+    """Counters labelled by manifest, persisted between hooks.
+
+    The counters are kept in a json state file, and rendered into the
+    textfile collector directory of the node exporter when it exists.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._values: Optional[Dict[str, Dict[str, float]]] = None
+
+    @property
+    def values(self) -> Dict[str, Dict[str, float]]:
+        """Lazily load the counters from disk."""
+        if self._values is None:
+            self._values = defaultdict(dict)
+            try:
+                self._values.update(json.loads(self.path.read_text()))
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError):
+                log.exception(f"Discarding unreadable metrics {self.path}")
+        return self._values
+
+    def inc(self, metric: str, manifest: str, amount: float = 1):
+        """Increase a counter of a manifest."""
+        self.values[metric][manifest] = self.values[metric].get(manifest, 0) + amount
+
+    def set(self, metric: str, manifest: str, value: float):
+        """Set a gauge of a manifest."""
+        self.values[metric][manifest] = value
+
+    def observe_apply(self, manifest: str, objects: int, duration: float):
+        """Record a completed apply of a manifest's objects."""
+        self.inc("objects_applied_total", manifest, objects)
+        self.inc("apply_duration_seconds_total", manifest, duration)
+        self.set("last_apply_duration_seconds", manifest, duration)
+
+    def render(self) -> str:
+        """Render the metrics in the prometheus text exposition format."""
+        lines = []
+        for metric, (kind, description) in METRICS.items():
+            samples = self.values.get(metric)
+            if not samples:
+                continue
+            name = f"{PREFIX}_{metric}"
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+            lines += [
+                f'{name}{{manifest="{manifest}"}} {value:g}'
+                for manifest, value in sorted(samples.items())
+            ]
+        return "\n".join(lines) + "\n"
+
+    def save(self, textfile_dir: Optional[Path] = None):
+        """Persist the counters, and export them to the textfile directory if it exists."""
+        if self._values is None:
+            return
+        try:
+            self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            self.path.write_text(json.dumps(self._values))
+        except OSError:
+            log.exception(f"Failed saving metrics {self.path}")
+
+        if not (textfile_dir and Path(textfile_dir).is_dir()):
+            return
+        # write atomically so the node exporter never reads a partial file
+        try:
+            with NamedTemporaryFile("w", dir=textfile_dir, suffix=".tmp", delete=False) as tmp:
+                tmp.write(self.render())
+            Path(tmp.name).chmod(0o644)
+            Path(tmp.name).replace(Path(textfile_dir) / f"{PREFIX}.prom")
+        except OSError:
+            log.exception(f"Failed exporting metrics to {textfile_dir}")
@@ -0,0 +1,163 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Pre-pull the images of a release onto the nodes before it is applied."""
+
+import logging
+import math
+from typing import Iterable, List, Optional, Tuple
+
+from httpx import HTTPError
+from lightkube import Client
+from lightkube.core.exceptions import ApiError
+from lightkube.resources.apps_v1 import DaemonSet
+from lightkube.resources.core_v1 import Pod
+from ops.manifests import HashableResource, ManifestClientError
+from ops.manifests.literals import MANIFEST_VERSION_LABEL
+
+from rollout import NODE_PLUGIN_PREFIX
+
+log = logging.getLogger(__name__)
+
+PREPULL_NAME = "csi-gce-pd-image-prepull"
+PREPULL_LABEL = "app.kubernetes.io/name"
+PAUSE_IMAGE = "registry.k8s.io/pause:3.10"
+WORKLOAD_KINDS = ("DaemonSet", "Deployment", "StatefulSet")
+
+
+def manifest_images(resources: Iterable[HashableResource]) -> List[str]:
+    """List the images of the linux workloads within the rendered resources."""
+    images = []
+    for rsc in resources:
+        if rsc.kind not in WORKLOAD_KINDS:
+            continue
+        pod = rsc.resource.spec.template.spec
+        if (pod.nodeSelector or {}).get("kubernetes.io/os", "linux") != "linux":
+            continue
+        for container in (pod.initContainers or []) + pod.containers:
+            if container.image and container.image not in images:
+                images.append(container.image)
+    return images
+
+
+def _pulled(pod: Pod, images: List[str]) -> bool:
+    # an init container has an imageID once its image is present on the node
+    statuses = (pod.status and pod.status.initContainerStatuses) or []
+    return sum(bool(status.imageID) for status in statuses) >= len(images)
+
+
+def node_plugin_version(client: Client, namespace: str) -> Optional[str]:
+    """Manifest version label of the applied linux node plugin DaemonSet.
+
+    raises ManifestClientError if the cluster cannot be queried
+    """
+    try:
+        ds = client.get(DaemonSet, NODE_PLUGIN_PREFIX, namespace=namespace)
+    except (ApiError, HTTPError) as ex:
+        if isinstance(ex, ApiError) and ex.status.code == 404:
+            return None
+        msg = f"Failed reading the {NODE_PLUGIN_PREFIX} DaemonSet"
+        log.exception(msg)
+        raise ManifestClientError(msg, ex) from ex
+    return ((ds.metadata and ds.metadata.labels) or {}).get(MANIFEST_VERSION_LABEL)
+
+
+class ImagePrePuller:
+    """Short-lived DaemonSet pulling the images of a release onto each linux node.
+
+    Each image runs in turn as an init container printing its usage, then the
+    pod idles on a pinned pause container until the DaemonSet is removed.
+    Only the image pulls matter.
+    """
+
+    def __init__(self, client: Client, namespace: str, registry: Optional[str] = None):
+        self.client = client
+        self.namespace = namespace
+        self.registry = registry
+
+    @property
+    def pause_image(self) -> str:
+        """Pause image, moved to the image-registry like the manifest images."""
+        if not self.registry:
+            return PAUSE_IMAGE
+        _, image = PAUSE_IMAGE.split("/", 1)
+        return f"{self.registry}/{image}"
+
+    def _daemonset(self, release: str, images: List[str]) -> DaemonSet:
+        labels = {PREPULL_LABEL: PREPULL_NAME}
+        requests = dict(cpu="1m", memory="8Mi")
+        init_containers = [
+            dict(
+                name=f"image-{i}",
+                image=image,
+                imagePullPolicy="IfNotPresent",
+                args=["--help"],
+                resources=dict(requests=requests),
+            )
+            for i, image in enumerate(images)
+        ]
+        pause = dict(
+            name="pause",
+            image=self.pause_image,
+            imagePullPolicy="IfNotPresent",
+            resources=dict(requests=requests),
+        )
+        return DaemonSet.from_dict(
+            dict(
+                apiVersion="apps/v1",
+                kind="DaemonSet",
+                metadata=dict(
+                    name=PREPULL_NAME,
+                    namespace=self.namespace,
+                    labels=labels,
+                    annotations={"gcp-k8s-storage/release": release},
+                ),
+                spec=dict(
+                    selector=dict(matchLabels=labels),
+                    template=dict(
+                        metadata=dict(labels=labels),
+                        spec=dict(
+                            initContainers=init_containers,
+                            containers=[pause],
+                            nodeSelector={"kubernetes.io/os": "linux"},
+                            terminationGracePeriodSeconds=0,
+                            tolerations=[dict(operator="Exists")],
+                        ),
+                    ),
+                ),
+            )
+        )
+
+    def pull(self, release: str, images: List[str], ratio: float) -> Tuple[int, int, bool]:
+        """Deploy the pre-pull DaemonSet and report its progress.
+
+        returns the nodes with every image, the nodes pulling and whether
+        at least ratio of the nodes have every image
+        raises ManifestClientError if the cluster cannot be queried
+        """
+        try:
+            ds = self.client.apply(self._daemonset(release, images), force=True)
+            pods = self.client.list(
+                Pod, namespace=self.namespace, labels={PREPULL_LABEL: PREPULL_NAME}
+            )
+            pulled = sum(_pulled(pod, images) for pod in pods)
+        except (ApiError, HTTPError) as ex:
+            msg = f"Failed pre-pulling images of {release}"
+            log.exception(msg)
+            raise ManifestClientError(msg, ex) from ex
+        desired = ds.status.desiredNumberScheduled if ds.status else 0
+        done = desired > 0 and pulled >= math.ceil(desired * ratio)
+        return pulled, desired, done
+
+    def remove(self):
+        """Remove the pre-pull DaemonSet if present.
+
+        raises ManifestClientError if the cluster cannot be queried
+        """
+        try:
+            self.client.delete(DaemonSet, PREPULL_NAME, namespace=self.namespace)
+        except (ApiError, HTTPError) as ex:
+            if isinstance(ex, ApiError) and ex.status.code == 404:
+                return
+            msg = "Failed removing the image pre-pull DaemonSet"
+            log.exception(msg)
+            raise ManifestClientError(msg, ex) from ex
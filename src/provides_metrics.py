@@ -0,0 +1,77 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Implementation of the provides side of the prometheus_scrape interface.
+
+Only the static scrape jobs of the databag are published, so there is no
+need for the full prometheus_scrape charm library.
+"""
+
+import json
+import logging
+from typing import Callable, Dict, List
+
+from ops.framework import Object
+from ops.manifests import ManifestClientError
+
+log = logging.getLogger(__name__)
+
+
+class MetricsEndpointProvider(Object):
+    """Provides side of the metrics-endpoint relation.
+
+    Publishes a scrape job for the metrics endpoints of each csi sidecar.
+    """
+
+    def __init__(
+        self,
+        charm,
+        endpoints: Callable[[], Dict[str, List[str]]],
+        endpoint="metrics-endpoint",
+    ):
+        super().__init__(charm, f"relation-{endpoint}")
+        self.endpoint = endpoint
+        self._endpoints = endpoints
+        events = charm.on[endpoint]
+        self.framework.observe(events.relation_joined, self.update_scrape_jobs)
+        self.framework.observe(events.relation_changed, self.update_scrape_jobs)
+
+    @property
+    def relations(self):
+        """Return the relations to prometheus."""
+        return self.model.relations[self.endpoint]
+
+    @property
+    def scrape_metadata(self) -> Dict[str, str]:
+        """Topology of the charm used by prometheus to label the jobs."""
+        return {
+            "model": self.model.name,
+            "model_uuid": self.model.uuid,
+            "application": self.model.app.name,
+            "charm_name": self.model.app.name,
+        }
+
+    def scrape_jobs(self) -> List[Dict]:
+        """Scrape jobs of each sidecar with metrics endpoints."""
+        return [
+            {
+                "job_name": name,
+                "metrics_path": "/metrics",
+                "static_configs": [{"targets": targets, "labels": {"sidecar": name}}],
+            }
+            for name, targets in sorted(self._endpoints().items())
+            if targets
+        ]
+
+    def update_scrape_jobs(self, _=None):
+        """Publish the current scrape jobs to each related prometheus."""
+        if not (self.relations and self.model.unit.is_leader()):
+            return
+        try:
+            jobs = self.scrape_jobs()
+        except ManifestClientError:
+            log.exception("Cannot determine the sidecar metrics endpoints")
+            return
+        for relation in self.relations:
+            data = relation.data[self.model.app]
+            data["scrape_metadata"] = json.dumps(self.scrape_metadata)
+            data["scrape_jobs"] = json.dumps(jobs)
@@ -7,12 +7,13 @@ is still using the Reactive Charm framework self.
 """
 
 import base64
+import hashlib
 import json
 import logging
 import os
 import random
 import string
-from typing import Mapping, Optional
+from typing import Iterable, Mapping, Optional
 from urllib.parse import urljoin
 from urllib.request import Request, urlopen
 
@@ -66,6 +67,7 @@ class GCPIntegratorRequires(Object):
         self.stored.set_default(
             instance=None,  # stores the instance name
             zone=None,  # stores the zone of this instance
+            requested=None,  # relation id and digest of the last feature request
         )
 
     def _joined(self, event):
@@ -153,10 +155,21 @@ class GCPIntegratorRequires(Object):
             return None
         return base64.b64encode(self._data.credentials.get_secret_value().encode())
 
-    def enable_instance_inspection(self):
-        """Request the ability to manage block storage."""
-        self._request({"enable-instance-inspection": True})
-
-    def enable_block_storage_management(self):
-        """Request the ability to manage block storage."""
-        self._request({"enable-block-storage-management": True})
+    def request_features(self, features: Iterable[str]):
+        """Request each feature from the integrator at once.
+
+        The request, and its nonce, is only published when the set of features
+        differs from the last request over this relation, so the integrator
+        doesn't redo completed work.
+        """
+        if not self.relation:
+            return
+        keyvals = dict.fromkeys(sorted(set(features)), True)
+        digest = hashlib.sha256(json.dumps(keyvals).encode()).hexdigest()
+        requested = f"{self.relation.id}:{digest}"
+        published = self.relation.data[self.model.unit].get("requested")
+        if published and self.stored.requested == requested:
+            log.info(f"{self.endpoint} features already requested.")
+            return
+        self._request(keyvals)
+        self.stored.requested = requested
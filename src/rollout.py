@@ -0,0 +1,178 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Controlled rollout of the node plugin DaemonSets on driver upgrades."""
+
+import logging
+import math
+import time
+from typing import Dict, List, Optional
+
+from httpx import HTTPError
+from lightkube import Client
+from lightkube.core.exceptions import ApiError
+from lightkube.models.apps_v1 import DaemonSetUpdateStrategy, RollingUpdateDaemonSet
+from lightkube.resources.apps_v1 import ControllerRevision
+from lightkube.resources.core_v1 import Node, Pod
+from ops.manifests import ManifestClientError, Patch
+
+log = logging.getLogger(__file__)
+
+NODE_PLUGIN_PREFIX = "csi-gce-pd-node"
+NODE_PLUGINS = ("csi-gce-pd-node", "csi-gce-pd-node-win")
+REVISION_LABEL = "controller-revision-hash"
+# seconds the leader keeps stepping a rollout within a hook, and between steps
+ROLLOUT_DEADLINE = 240
+ROLLOUT_POLL = 5
+
+
+def _int_or_percent(value: str):
+    return value if value.endswith("%") else int(value)
+
+
+class NodePluginRolloutStrategy(Patch):
+    """Set the update strategy of the node plugin daemonsets from config."""
+
+    def __call__(self, obj):
+        """Update the strategy, leaving the charm to replace pods in canary mode."""
+        if not (obj.kind == "DaemonSet" and obj.metadata.name.startswith(NODE_PLUGIN_PREFIX)):
+            return
+
+        config = self.manifests.config
+        if config.get("node-canary-labels"):
+            log.info(f"Replacing {obj.metadata.name} pods from the charm on upgrade")
+            obj.spec.updateStrategy = DaemonSetUpdateStrategy(type="OnDelete")
+            return
+
+        unavailable = config.get("node-max-unavailable")
+        surge = config.get("node-max-surge")
+        if unavailable is None and surge is None:
+            return
+        rolling = RollingUpdateDaemonSet(
+            maxUnavailable=_int_or_percent(unavailable) if unavailable is not None else None,
+            maxSurge=_int_or_percent(surge) if surge is not None else None,
+        )
+        log.info(f"Rolling {obj.metadata.name} with {rolling}")
+        obj.spec.updateStrategy = DaemonSetUpdateStrategy(
+            type="RollingUpdate", rollingUpdate=rolling
+        )
+
+
+def _ready(pod: Pod) -> bool:
+    conditions = (pod.status and pod.status.conditions) or []
+    return any(c.type == "Ready" and c.status == "True" for c in conditions)
+
+
+def _owned_by(obj, name: str) -> bool:
+    owners = (obj.metadata and obj.metadata.ownerReferences) or []
+    return any(o.kind == "DaemonSet" and o.name == name for o in owners)
+
+
+def _revision(pod) -> Optional[str]:
+    return ((pod.metadata and pod.metadata.labels) or {}).get(REVISION_LABEL)
+
+
+class NodePluginRollout:
+    """Replace the pods of an OnDelete node plugin daemonset, canary nodes first.
+
+    Each step deletes outdated pods on the canary nodes, then once those are
+    updated and ready, deletes batches of at most max-unavailable outdated
+    pods on the remaining nodes while the pods already replaced are ready.
+    Surging pods isn't supported, as each node runs one pod at a time.
+    """
+
+    def __init__(self, client: Client, namespace: str, canary_labels: Dict[str, str]):
+        self.client = client
+        self.namespace = namespace
+        self.canary_labels: Dict = dict(canary_labels)
+
+    def _current_revision(self, name: str) -> Optional[str]:
+        revisions = [
+            cr
+            for cr in self.client.list(ControllerRevision, namespace=self.namespace)
+            if _owned_by(cr, name)
+        ]
+        if not revisions:
+            return None
+        return _revision(max(revisions, key=lambda cr: cr.revision or 0))
+
+    def step(self, name: str, max_unavailable: str) -> Optional[str]:
+        """Replace the next batch of outdated pods of a daemonset.
+
+        returns the rollout progress, or None once every pod is updated
+        raises ManifestClientError if the cluster cannot be queried
+        """
+        try:
+            return self._step(name, max_unavailable)
+        except (ApiError, HTTPError) as ex:
+            msg = f"Failed rolling out {name}"
+            log.exception(msg)
+            raise ManifestClientError(msg, ex) from ex
+
+    def _step(self, name: str, max_unavailable: str) -> Optional[str]:
+        revision = self._current_revision(name)
+        pods = [
+            pod for pod in self.client.list(Pod, namespace=self.namespace) if _owned_by(pod, name)
+        ]
+        if not revision or not pods:
+            return None
+        outdated = [pod for pod in pods if _revision(pod) != revision]
+        if not outdated:
+            return None
+
+        canary_nodes = {
+            node.metadata.name
+            for node in self.client.list(Node, labels=self.canary_labels)
+            if node.metadata
+        }
+        if not canary_nodes:
+            log.warning(f"No nodes labelled {self.canary_labels} to canary {name}")
+        canaries = [pod for pod in pods if pod.spec and pod.spec.nodeName in canary_nodes]
+        updated = len(pods) - len(outdated)
+
+        if outdated_canaries := [pod for pod in canaries if pod in outdated]:
+            self._delete(outdated_canaries)
+            return f"{name} canary: replacing {len(outdated_canaries)} pods"
+        if not all(_ready(pod) for pod in canaries):
+            ready = sum(map(_ready, canaries))
+            return f"{name} canary: {ready}/{len(canaries)} pods ready"
+
+        if max_unavailable.endswith("%"):
+            batch = math.ceil(len(pods) * int(max_unavailable[:-1]) / 100)
+        else:
+            batch = int(max_unavailable)
+        unavailable = sum(not _ready(pod) for pod in pods if pod not in outdated)
+        if (budget := max(batch, 1) - unavailable) > 0:
+            self._delete(outdated[:budget])
+        return f"{name} rollout: {updated}/{len(pods)} pods updated"
+
+    def _delete(self, pods: List[Pod]):
+        for pod in pods:
+            assert pod.metadata and pod.metadata.name
+            log.info(f"Replacing outdated pod {pod.metadata.name}")
+            self.client.delete(Pod, pod.metadata.name, namespace=self.namespace)
+
+
+def roll_node_plugins(
+    client: Client,
+    namespace: str,
+    canary_labels: Dict[str, str],
+    max_unavailable: str,
+    deadline: float = ROLLOUT_DEADLINE,
+) -> Optional[str]:
+    """Step the rollout of each node plugin daemonset in turn until the deadline.
+
+    Each batch follows the previous one within the hook once its pods are
+    ready, rather than waiting for the next update-status.
+
+    returns the progress of the first daemonset with outdated pods, or None
+    raises ManifestClientError if the cluster cannot be queried
+    """
+    rollout = NodePluginRollout(client, namespace, canary_labels)
+    until = time.monotonic() + deadline
+    while True:
+        progress = next(
+            (p for name in NODE_PLUGINS if (p := rollout.step(name, max_unavailable))), None
+        )
+        if not progress or time.monotonic() + ROLLOUT_POLL > until:
+            return progress
+        time.sleep(ROLLOUT_POLL)
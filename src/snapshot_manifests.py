@@ -0,0 +1,96 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Implementation of the external-snapshotter manifests."""
+
+import logging
+from functools import cached_property
+from typing import Dict, List, Optional
+
+from httpx import HTTPError
+from lightkube import Client
+from lightkube.codecs import AnyResource
+from lightkube.core.exceptions import ApiError
+from lightkube.resources.apiextensions_v1 import CustomResourceDefinition
+from ops.manifests import ConfigRegistry, ManifestClientError, ManifestLabel
+from ops.manifests.literals import APP_LABEL
+from ops.manifests.manipulations import Subtraction
+
+from charm_manifests import CharmManifests
+from snapshots import SNAPSHOT_GROUP
+
+log = logging.getLogger(__file__)
+
+
+def foreign_crds(client: Client, app: str) -> List[str]:
+    """Names of the snapshot CRDs installed in the cluster by anything but app.
+
+    raises ManifestClientError if the CRDs cannot be listed
+    """
+    try:
+        crds = list(client.list(CustomResourceDefinition))
+    except (ApiError, HTTPError) as ex:
+        msg = "Failed listing CustomResourceDefinitions"
+        log.exception(msg)
+        raise ManifestClientError(msg, ex) from ex
+    return sorted(
+        crd.metadata.name
+        for crd in crds
+        if crd.metadata
+        and crd.metadata.name
+        and crd.spec.group == SNAPSHOT_GROUP
+        and (crd.metadata.labels or {}).get(APP_LABEL) != app
+    )
+
+
+class SkipForeignCRDs(Subtraction):
+    """Leave the snapshot CRDs already installed by another tool to that tool."""
+
+    def __call__(self, obj: AnyResource) -> bool:
+        """Subtract CRDs the charm didn't install."""
+        name = obj.metadata.name if obj.metadata else None
+        if obj.kind == "CustomResourceDefinition" and name in self.manifests.config.get(
+            "foreign-crds", []
+        ):
+            log.info(f"Skipping {name}, already installed")
+            return True
+        return False
+
+
+class SnapshotControllerManifests(CharmManifests):
+    """Deployment Specific details for the external-snapshotter."""
+
+    def __init__(self, charm, charm_config, kube_control, integrator):
+        super().__init__(
+            "snapshot-controller",
+            charm,
+            "upstream/snapshot_controller",
+            [
+                ManifestLabel(self),
+                ConfigRegistry(self),
+                SkipForeignCRDs(self),
+            ],
+            charm_config,
+            kube_control,
+            integrator,
+        )
+
+    @property
+    def config(self) -> Dict:
+        """Returns current config available from charm config and joined relations."""
+        config = super().config
+        config["foreign-crds"] = self.foreign_crds
+        return config
+
+    def evaluate(self) -> Optional[str]:
+        """Determine if manifest_config can be applied to manifests."""
+        # the snapshot controller needs no cloud credentials
+        return None
+
+    @cached_property
+    def foreign_crds(self) -> List[str]:
+        """Snapshot CRDs installed in the cluster by anything but this charm."""
+        try:
+            return foreign_crds(self.client, self.model.app.name)
+        except ManifestClientError:
+            log.exception("Cannot list the installed snapshot CRDs")
+            return []
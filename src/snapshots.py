@@ -0,0 +1,85 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Volume snapshot classes of the gce-pd-csi-driver manifests."""
+
+import logging
+from typing import TYPE_CHECKING, Dict, List
+
+from httpx import HTTPError
+from lightkube import Client
+from lightkube.codecs import AnyResource, from_dict
+from lightkube.core.exceptions import ApiError
+from lightkube.generic_resource import create_global_resource
+from lightkube.resources.apiextensions_v1 import CustomResourceDefinition
+from ops.manifests import Addition, ManifestClientError
+
+from config import parse_snapshot_classes
+
+if TYPE_CHECKING:
+    from storage_manifests import GCPStorageManifests
+
+log = logging.getLogger(__file__)
+
+SNAPSHOT_GROUP = "snapshot.storage.k8s.io"
+SNAPSHOT_CLASS_CRD = f"volumesnapshotclasses.{SNAPSHOT_GROUP}"
+SNAPSHOT_CLASS_NAME = "csi-gce-pd-snapshot-{name}"
+DEFAULT_SNAPSHOT_CLASS_ANNOTATION = "snapshot.storage.kubernetes.io/is-default-class"
+
+# allows lightkube to load VolumeSnapshotClasses before the CRDs are installed
+create_global_resource(SNAPSHOT_GROUP, "v1", "VolumeSnapshotClass", "volumesnapshotclasses")
+
+
+def snapshot_class_crd(client: Client) -> bool:
+    """Determine if the VolumeSnapshotClass CRD is installed in the cluster.
+
+    raises ManifestClientError if the cluster cannot be queried
+    """
+    try:
+        client.get(CustomResourceDefinition, SNAPSHOT_CLASS_CRD)
+    except (ApiError, HTTPError) as ex:
+        if isinstance(ex, ApiError) and ex.status.code == 404:
+            return False
+        msg = f"Failed reading the {SNAPSHOT_CLASS_CRD} CustomResourceDefinition"
+        log.exception(msg)
+        raise ManifestClientError(msg, ex) from ex
+    return True
+
+
+class CreateSnapshotClasses(Addition):
+    """Create the volume snapshot classes from the snapshot-classes config."""
+
+    def __init__(self, manifests: "GCPStorageManifests", driver: str):
+        super().__init__(manifests)
+        self.driver = driver
+
+    def __call__(self) -> List[AnyResource]:
+        """Craft each configured volume snapshot class object."""
+        try:
+            classes = parse_snapshot_classes(self.manifests.config.get("snapshot-classes"))
+        except ValueError:
+            log.exception("Cannot create snapshot classes from config")
+            return []
+
+        resources = []
+        for vsc in classes:
+            name = SNAPSHOT_CLASS_NAME.format(name=vsc.name)
+            log.info(f"Creating volume snapshot class {name}")
+            metadata: Dict = dict(name=name)
+            if vsc.default:
+                metadata["annotations"] = {DEFAULT_SNAPSHOT_CLASS_ANNOTATION: "true"}
+            parameters = {"snapshot-type": vsc.snapshot_type}
+            if vsc.storage_locations:
+                parameters["storage-locations"] = vsc.storage_locations
+            resources.append(
+                from_dict(
+                    dict(
+                        apiVersion=f"{SNAPSHOT_GROUP}/v1",
+                        kind="VolumeSnapshotClass",
+                        metadata=metadata,
+                        driver=self.driver,
+                        deletionPolicy=vsc.deletion_policy,
+                        parameters=parameters,
+                    )
+                )
+            )
+        return resources
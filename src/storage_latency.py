@@ -0,0 +1,139 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Report the provisioning and attach latency of the driver's volumes."""
+
+import logging
+import math
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from httpx import HTTPError
+from lightkube import Client
+from lightkube.core.exceptions import ApiError
+from lightkube.resources.core_v1 import Event, PersistentVolume, PersistentVolumeClaim
+from lightkube.resources.storage_v1 import StorageClass, VolumeAttachment
+from ops.manifests import ManifestClientError
+
+log = logging.getLogger(__name__)
+
+PERCENTILES = (50, 90, 99)
+# upper bounds in seconds of the histogram buckets
+BUCKETS = (1, 2, 5, 10, 30, 60, 120, 300, 600)
+ATTACHED_VOLUME = re.compile(r'AttachVolume\.Attach succeeded for volume "([^"]+)"')
+
+Samples = Dict[Tuple[str, str], List[float]]
+
+
+def _zone(volume_handle: Optional[str]) -> str:
+    # the driver identifies disks as projects/<project>/(zones|regions)/<location>/disks/<name>
+    parts = (volume_handle or "").split("/")
+    for scope in ("zones", "regions"):
+        if scope in parts[:-1]:
+            return parts[parts.index(scope) + 1]
+    return "unknown"
+
+
+def _event_time(event: Event) -> Optional[datetime]:
+    return event.firstTimestamp or event.eventTime or event.lastTimestamp
+
+
+def _percentile(durations: List[float], percentile: int) -> float:
+    # nearest-rank percentile of sorted durations
+    rank = max(math.ceil(percentile / 100 * len(durations)), 1)
+    return round(durations[rank - 1], 3)
+
+
+def _summarize(samples: Samples) -> List[Dict]:
+    summaries = []
+    for (storage_class, zone), durations in sorted(samples.items()):
+        durations.sort()
+        summary: Dict = {"storage-class": storage_class, "zone": zone, "count": len(durations)}
+        summary.update({f"p{p}": _percentile(durations, p) for p in PERCENTILES})
+        summary["max"] = round(durations[-1], 3)
+        histogram = {f"le-{bound}s": sum(d <= bound for d in durations) for bound in BUCKETS}
+        histogram["le-inf"] = len(durations)
+        summary["histogram"] = histogram
+        summaries.append(summary)
+    return summaries
+
+
+def _list(client: Client, resource, **kwargs) -> List:
+    try:
+        return list(client.list(resource, **kwargs))
+    except (ApiError, HTTPError) as ex:
+        msg = f"Failed listing {resource.__name__}"
+        log.exception(msg)
+        raise ManifestClientError(msg, ex) from ex
+
+
+def _event_times(events: List[Event]) -> Tuple[Dict, Dict[str, List[datetime]]]:
+    # first time each claim was provisioned, and each time a volume attached
+    provisioned: Dict[Tuple[Optional[str], Optional[str]], datetime] = {}
+    attached: Dict[str, List[datetime]] = defaultdict(list)
+    for event in events:
+        obj, when = event.involvedObject, _event_time(event)
+        if not when:
+            continue
+        if event.reason == "ProvisioningSucceeded" and obj.kind == "PersistentVolumeClaim":
+            key = (obj.namespace, obj.name)
+            provisioned[key] = min(when, provisioned.get(key, when))
+        elif event.reason == "SuccessfulAttachVolume" and obj.kind == "Pod":
+            if match := ATTACHED_VOLUME.search(event.message or ""):
+                attached[match.group(1)].append(when)
+    return provisioned, attached
+
+
+def storage_latency(
+    client: Client, driver: str, window: timedelta, now: Optional[datetime] = None
+) -> Dict[str, List[Dict]]:
+    """Aggregate the provisioning and attach durations per StorageClass and zone.
+
+    Provisioning spans from the creation of a PersistentVolumeClaim to the
+    driver provisioning its volume, attach spans from the creation of a
+    VolumeAttachment to the volume attaching to the pod's node. Only volumes
+    requested within the window are included, and since both are measured
+    from Events, only as far back as the api-server retains Events.
+
+    raises ManifestClientError if the cluster cannot be queried
+    """
+    since = (now or datetime.now(timezone.utc)) - window
+    classes = {
+        sc.metadata.name
+        for sc in _list(client, StorageClass)
+        if sc.metadata and sc.provisioner == driver
+    }
+    claims = _list(client, PersistentVolumeClaim, namespace="*")
+    volumes = {pv.metadata.name: pv for pv in _list(client, PersistentVolume) if pv.metadata}
+    attachments = [va for va in _list(client, VolumeAttachment) if va.spec.attacher == driver]
+    # the api-server filters Events by reason, instead of returning all of them
+    events = [
+        event
+        for reason in ("ProvisioningSucceeded", "SuccessfulAttachVolume")
+        for event in _list(client, Event, namespace="*", fields={"reason": reason}, chunk_size=500)
+    ]
+    provisioned, attached = _event_times(events)
+
+    provisioning: Samples = defaultdict(list)
+    for pvc in claims:
+        created = pvc.metadata.creationTimestamp if pvc.metadata else None
+        storage_class = (pvc.spec and pvc.spec.storageClassName) or ""
+        if not (created and created >= since and storage_class in classes):
+            continue
+        if bound := provisioned.get((pvc.metadata.namespace, pvc.metadata.name)):
+            pv = volumes.get(pvc.spec.volumeName)
+            zone = _zone(pv.spec.csi.volumeHandle if pv and pv.spec.csi else None)
+            provisioning[(storage_class, zone)].append((bound - created).total_seconds())
+
+    attach: Samples = defaultdict(list)
+    for va in attachments:
+        created = va.metadata.creationTimestamp if va.metadata else None
+        pv = volumes.get(va.spec.source.persistentVolumeName)
+        if not (created and created >= since and pv and pv.spec.csi):
+            continue
+        if done := [when for when in attached[pv.metadata.name] if when >= created]:
+            key = (pv.spec.storageClassName or "", _zone(pv.spec.csi.volumeHandle))
+            attach[key].append((min(done) - created).total_seconds())
+
+    return dict(provisioning=_summarize(provisioning), attach=_summarize(attach))
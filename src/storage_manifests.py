@@ -3,23 +3,46 @@
 """Implementation of gcp specific details of the kubernetes manifests."""
 
 import logging
-import pickle
-from hashlib import md5
-from typing import Dict, Optional
+from collections import defaultdict
+from functools import cached_property
+from itertools import combinations
+from typing import Dict, List, Optional
 
+from httpx import HTTPError
 from lightkube.codecs import AnyResource, from_dict
+from lightkube.core.exceptions import ApiError
+from lightkube.models.core_v1 import ContainerPort, ResourceRequirements
+from lightkube.resources.core_v1 import Pod
 from ops.manifests import (
     Addition,
     ConfigRegistry,
     CreateNamespace,
+    ManifestClientError,
     ManifestLabel,
     Manifests,
+    Patch,
 )
 
+from charm_manifests import CharmManifests
+from config import parse_sidecar_tuning, parse_storage_classes
+from data_cache import EnableDataCache, release_supports_data_cache
+from rollout import NodePluginRolloutStrategy
+from snapshots import CreateSnapshotClasses, snapshot_class_crd
+from volume_attributes import (
+    CreateVolumeAttributesClasses,
+    cluster_vac_api,
+    release_supports_vac,
+)
+from zones import node_zones
+
 log = logging.getLogger(__file__)
 NAMESPACE = "gce-pd-csi-driver"
 SECRET_NAME = "cloud-sa"
 STORAGE_CLASS_NAME = "csi-gce-pd-{type}"
+PROVISIONER = "pd.csi.storage.gke.io"
+DEFAULT_CLASS_ANNOTATION = "storageclass.kubernetes.io/is-default-class"
+CONTROLLER_NAME = "csi-gce-pd-controller"
+ZONE_TOPOLOGY_KEY = "topology.gke.io/zone"
 
 
 class CreateSecret(Addition):
@@ -50,8 +73,58 @@ class CreateSecret(Addition):
         )
 
 
+def _allowed_topologies(zones: List[str], replication_type: str) -> Optional[List[Dict]]:
+    """Pin volumes to the zones of the nodes.
+
+    zonal volumes may use any of the zones, while regional volumes
+    use any pair of zones within the same region.
+    """
+    if replication_type != "regional-pd":
+        groups = [zones] if zones else []
+    else:
+        regions = defaultdict(list)
+        for zone in zones:
+            regions[zone.rsplit("-", 1)[0]].append(zone)
+        groups = [list(pair) for rz in regions.values() for pair in combinations(sorted(rz), 2)]
+    if not groups:
+        return None
+    return [
+        dict(matchLabelExpressions=[dict(key=ZONE_TOPOLOGY_KEY, values=values)])
+        for values in groups
+    ]
+
+
+def _storage_class(
+    name: str,
+    parameters: Optional[Dict[str, str]] = None,
+    reclaim_policy: Optional[str] = None,
+    default: bool = False,
+    allowed_topologies: Optional[List[Dict]] = None,
+) -> AnyResource:
+    """Craft a storage class object provisioned by the pd csi driver."""
+    storage_name = STORAGE_CLASS_NAME.format(type=name)
+    log.info(f"Creating storage class {storage_name}")
+    metadata: Dict = dict(name=storage_name)
+    if default:
+        metadata["annotations"] = {DEFAULT_CLASS_ANNOTATION: "true"}
+    sc: Dict = dict(
+        apiVersion="storage.k8s.io/v1",
+        kind="StorageClass",
+        metadata=metadata,
+        provisioner=PROVISIONER,
+        volumeBindingMode="WaitForFirstConsumer",
+    )
+    if parameters:
+        sc["parameters"] = parameters
+    if reclaim_policy:
+        sc["reclaimPolicy"] = reclaim_policy
+    if allowed_topologies:
+        sc["allowedTopologies"] = allowed_topologies
+    return from_dict(sc)
+
+
 class CreateStorageClass(Addition):
-    """Create vmware storage class."""
+    """Create gcp storage class."""
 
     def __init__(self, manifests: "Manifests", sc_type: str):
         super().__init__(manifests)
@@ -59,70 +132,253 @@ class CreateStorageClass(Addition):
 
     def __call__(self) -> Optional[AnyResource]:
         """Craft the storage class object."""
-        storage_name = STORAGE_CLASS_NAME.format(type=self.type)
-        log.info(f"Creating storage class {storage_name}")
-        return from_dict(
-            dict(
-                apiVersion="storage.k8s.io/v1",
-                kind="StorageClass",
-                metadata=dict(
-                    name=storage_name,
-                ),
-                provisioner="pd.csi.storage.gke.io",
-                volumeBindingMode="WaitForFirstConsumer",
+        zones = self.manifests.config.get("zones", [])
+        return _storage_class(self.type, allowed_topologies=_allowed_topologies(zones, "none"))
+
+
+class CreateRegionalStorageClass(Addition):
+    """Create the regional-pd storage class replicated across pairs of node zones."""
+
+    def __call__(self) -> Optional[AnyResource]:
+        """Craft the regional storage class object if the nodes span a region."""
+        zones = self.manifests.config.get("zones", [])
+        topologies = _allowed_topologies(zones, "regional-pd")
+        if not topologies:
+            return None
+        parameters = {"type": "pd-balanced", "replication-type": "regional-pd"}
+        return _storage_class("regional", parameters, allowed_topologies=topologies)
+
+
+class CreateStorageClasses(Addition):
+    """Create the performance tiered storage classes from the storage-classes config."""
+
+    def __call__(self) -> List[AnyResource]:
+        """Craft each configured storage class object."""
+        try:
+            classes = parse_storage_classes(self.manifests.config.get("storage-classes"))
+        except ValueError:
+            log.exception("Cannot create storage classes from config")
+            return []
+
+        zones = self.manifests.config.get("zones", [])
+        resources = []
+        for sc in classes:
+            parameters = {"type": sc.type, "replication-type": sc.replication_type}
+            if sc.provisioned_iops_on_create is not None:
+                parameters["provisioned-iops-on-create"] = str(sc.provisioned_iops_on_create)
+            if sc.provisioned_throughput_on_create is not None:
+                parameters["provisioned-throughput-on-create"] = (
+                    sc.provisioned_throughput_on_create
+                )
+            if sc.data_cache_mode and sc.data_cache_size:
+                parameters["data-cache-mode"] = sc.data_cache_mode
+                parameters["data-cache-size"] = sc.data_cache_size
+            topologies = _allowed_topologies(zones, sc.replication_type)
+            resources.append(
+                _storage_class(sc.name, parameters, sc.reclaim_policy, sc.default, topologies)
             )
-        )
+        return resources
+
+
+class TuneControllerSidecars(Patch):
+    """Tune the replicas and sidecar throughput of the controller deployment."""
+
+    # sidecar arguments for each tuning field, the resizer names its workers differently
+    SIDECAR_ARGS = {
+        "worker_threads": "--worker-threads",
+        "kube_api_qps": "--kube-api-qps",
+        "kube_api_burst": "--kube-api-burst",
+        "timeout": "--timeout",
+        "leader_election_lease_duration": "--leader-election-lease-duration",
+        "leader_election_renew_deadline": "--leader-election-renew-deadline",
+        "leader_election_retry_period": "--leader-election-retry-period",
+    }
+    RESIZER_ARGS = {**SIDECAR_ARGS, "worker_threads": "--workers"}
+
+    def __call__(self, obj):
+        """Update the controller deployment replicas, container args and resources."""
+        if not (obj.kind == "Deployment" and obj.metadata.name == CONTROLLER_NAME):
+            return
+
+        replicas = self.manifests.config.get("controller-replicas")
+        if replicas:
+            log.info(f"Setting {CONTROLLER_NAME} replicas to {replicas}")
+            obj.spec.replicas = replicas
+
+        try:
+            tuning = parse_sidecar_tuning(self.manifests.config.get("csi-sidecar-tuning"))
+        except ValueError:
+            log.exception("Cannot tune csi sidecars from config")
+            return
 
+        for container in obj.spec.template.spec.containers:
+            sidecar = tuning.get(container.name)
+            if not sidecar:
+                continue
+            flags = self.RESIZER_ARGS if container.name == "csi-resizer" else self.SIDECAR_ARGS
+            for field, flag in flags.items():
+                value = getattr(sidecar, field)
+                if value is None:
+                    continue
+                args = [a for a in container.args or [] if a.split("=", 1)[0] != flag]
+                container.args = args + [f"{flag}={value}"]
+                log.info(f"Tuning {container.name} with {flag}={value}")
+            if sidecar.resources:
+                container.resources = ResourceRequirements(
+                    requests=sidecar.resources.requests or None,
+                    limits=sidecar.resources.limits or None,
+                )
 
-class GCPStorageManifests(Manifests):
+
+def _metrics_port(args: Optional[List[str]]) -> Optional[int]:
+    for arg in args or []:
+        flag, _, address = arg.partition("=")
+        if flag in ("--http-endpoint", "--metrics-address"):
+            return int(address.rsplit(":", 1)[-1])
+    return None
+
+
+class ExposeSidecarMetrics(Patch):
+    """Serve the metrics of each controller sidecar on a container port."""
+
+    # ports of the sidecars matching those of recent releases
+    PORTS = {
+        "csi-provisioner": 22011,
+        "csi-attacher": 22012,
+        "csi-resizer": 22013,
+        "csi-snapshotter": 22014,
+    }
+
+    def __call__(self, obj):
+        """Add a metrics endpoint and port to sidecars of the controller lacking them."""
+        if not (obj.kind == "Deployment" and obj.metadata.name == CONTROLLER_NAME):
+            return
+
+        for container in obj.spec.template.spec.containers:
+            if container.name not in self.PORTS:
+                continue
+            port = _metrics_port(container.args)
+            if port is None:
+                port = self.PORTS[container.name]
+                log.info(f"Serving {container.name} metrics on port {port}")
+                container.args = (container.args or []) + [f"--http-endpoint=:{port}"]
+            if not any(p.containerPort == port for p in container.ports or []):
+                container.ports = (container.ports or []) + [
+                    ContainerPort(containerPort=port, protocol="TCP")
+                ]
+
+
+class GCPStorageManifests(CharmManifests):
     """Deployment Specific details for the gce-pd-csi-driver."""
 
+    RELEASE_CONFIG = "storage-release"
+
     def __init__(self, charm, charm_config, kube_control, integrator):
         super().__init__(
             "gce-pd-csi-driver",
-            charm.model,
+            charm,
             "upstream/cloud_storage",
             [
                 CreateNamespace(self, NAMESPACE),
                 CreateSecret(self),
                 ManifestLabel(self),
                 ConfigRegistry(self),
+                TuneControllerSidecars(self),
+                ExposeSidecarMetrics(self),
+                NodePluginRolloutStrategy(self),
+                EnableDataCache(self),
                 CreateStorageClass(self, "default"),  # creates gce-pd-csi-driver
+                CreateStorageClasses(self),
+                CreateRegionalStorageClass(self),
+                CreateSnapshotClasses(self, PROVISIONER),
+                CreateVolumeAttributesClasses(self, PROVISIONER),
             ],
+            charm_config,
+            kube_control,
+            integrator,
         )
-        self.integrator = integrator
-        self.charm_config = charm_config
-        self.kube_control = kube_control
 
     @property
     def config(self) -> Dict:
         """Returns current config available from charm config and joined relations."""
-        config: Dict = {}
-
-        if self.kube_control.is_ready:
-            config["image-registry"] = self.kube_control.get_registry_location()
-
-        if self.integrator.is_ready:
-            config["cloud_sa"] = self.integrator.credentials.decode()
-
-        config.update(**self.charm_config.available_data)
-
-        for key, value in dict(**config).items():
-            if value == "" or value is None:
-                del config[key]
-
-        config["release"] = config.pop("storage-release", None)
+        config = super().config
+        if config.get("topology-aware-classes"):
+            config["zones"] = self.node_zones or []
+        if config.get("volume-attributes-classes"):
+            release = config["release"] or self.default_release or self.latest_release
+            if release_supports_vac(self.manifest_path / release) and self.cluster_vac_api:
+                config["volume-attributes-class-api"] = self.cluster_vac_api
         return config
 
-    def hash(self) -> int:
-        """Calculate a hash of the current configuration."""
-        return int(md5(pickle.dumps(self.config)).hexdigest(), 16)
-
     def evaluate(self) -> Optional[str]:
         """Determine if manifest_config can be applied to manifests."""
-        props = CreateSecret.CONFIG_TO_SECRET.keys()
-        for prop in props:
-            value = self.config.get(prop)
-            if not value:
-                return f"Storage manifests waiting for definition of {prop}"
+        if evaluation := super().evaluate():
+            return evaluation
+        if self.config.get("topology-aware-classes") and self.node_zones is None:
+            return "Waiting for the zones of the cluster's nodes"
+        if (
+            self.config.get("snapshot-classes")
+            and not self.config.get("snapshot-controller")
+            and self.snapshot_class_crd is False
+        ):
+            return "snapshot-classes require snapshot-controller or the snapshot CRDs installed"
+        release = self.current_release
+        if self.config.get("data-cache") and not release_supports_data_cache(
+            self.manifest_path / release
+        ):
+            return f"storage-release {release} doesn't support data-cache"
         return None
+
+    @cached_property
+    def node_zones(self) -> Optional[List[str]]:
+        """Zones of the cluster's nodes, or None if they cannot be listed."""
+        try:
+            return node_zones(self.client)
+        except ManifestClientError:
+            log.exception("Cannot list the zones of the cluster's nodes")
+            return None
+
+    @cached_property
+    def snapshot_class_crd(self) -> Optional[bool]:
+        """Whether the VolumeSnapshotClass CRD is installed, or None if unknown."""
+        try:
+            return snapshot_class_crd(self.client)
+        except ManifestClientError:
+            log.exception("Cannot probe the cluster for the VolumeSnapshotClass CRD")
+            return None
+
+    @cached_property
+    def cluster_vac_api(self) -> Optional[str]:
+        """VolumeAttributesClass api version served by the cluster, if any."""
+        try:
+            return cluster_vac_api(self.client)
+        except ManifestClientError:
+            log.exception("Cannot probe the cluster for VolumeAttributesClass support")
+            return None
+
+    def sidecar_metrics_endpoints(self) -> Dict[str, List[str]]:
+        """Metrics endpoints of each controller sidecar across the controller pods."""
+        controller = next(
+            obj.resource
+            for obj in self.resources
+            if obj.kind == "Deployment" and obj.name == CONTROLLER_NAME
+        )
+        ports = {
+            container.name: port
+            for container in controller.spec.template.spec.containers
+            if container.name in ExposeSidecarMetrics.PORTS
+            and (port := _metrics_port(container.args))
+        }
+        try:
+            pods = list(
+                self.client.list(
+                    Pod, namespace=NAMESPACE, labels=controller.spec.selector.matchLabels
+                )
+            )
+        except (ApiError, HTTPError) as ex:
+            msg = "Failed listing controller pods"
+            log.exception(msg)
+            self.metrics.inc("api_errors_total", self.name)
+            raise ManifestClientError(msg, ex) from ex
+        addresses = sorted(pod.status.podIP for pod in pods if pod.status and pod.status.podIP)
+        return {name: [f"{ip}:{port}" for ip in addresses] for name, port in ports.items()}
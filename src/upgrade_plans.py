@@ -0,0 +1,64 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Upgrade plans between releases precomputed by upstream/update.py."""
+
+import logging
+from functools import cached_property
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import yaml
+
+log = logging.getLogger(__name__)
+
+ObjectKey = Tuple[str, str, str]
+
+
+def _key(ref: Dict) -> ObjectKey:
+    return ref["kind"], ref.get("namespace") or "", ref["name"]
+
+
+class UpgradePlans:
+    """Plans of the objects added, removed and changed between adjacent releases."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    @cached_property
+    def plans(self) -> List[Dict]:
+        """Load the plans ordered from the oldest to the newest release."""
+        if not self.path.exists():
+            return []
+        return yaml.safe_load(self.path.read_text()) or []
+
+    @cached_property
+    def releases(self) -> List[str]:
+        """List the releases covered by the plans, oldest first."""
+        if not self.plans:
+            return []
+        return [plan["from"] for plan in self.plans] + [self.plans[-1]["to"]]
+
+    def removed(self, previous: str, current: str) -> List[Dict]:
+        """Objects of the previous release which are absent from the current release.
+
+        Adjacent plans are chained together for upgrades across several
+        releases, or walked in reverse for downgrades.
+
+        raises ValueError if either release isn't covered by the plans
+        """
+        for release in (previous, current):
+            if release not in self.releases:
+                raise ValueError(f"No upgrade plan covers release {release}")
+
+        start, end = self.releases.index(previous), self.releases.index(current)
+        if start <= end:
+            steps = [(p["removed"], p["added"]) for p in self.plans[start:end]]
+        else:
+            steps = [(p["added"], p["removed"]) for p in reversed(self.plans[end:start])]
+
+        removed: Dict[ObjectKey, Dict] = {}
+        for gone, returned in steps:
+            removed.update((_key(ref), ref) for ref in gone)
+            for ref in returned:
+                removed.pop(_key(ref), None)
+        return list(removed.values())
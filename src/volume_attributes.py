@@ -0,0 +1,106 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""VolumeAttributesClass support for the gce-pd-csi-driver manifests."""
+
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Type
+
+from httpx import HTTPError
+from lightkube import Client
+from lightkube.codecs import AnyResource, from_dict
+from lightkube.core.exceptions import ApiError
+from lightkube.core.resource import GlobalResource
+from lightkube.generic_resource import create_global_resource
+from lightkube.resources.storage_v1 import VolumeAttributesClass
+from ops.manifests import Addition
+
+from config import parse_volume_attributes_classes
+
+if TYPE_CHECKING:
+    from storage_manifests import GCPStorageManifests
+
+log = logging.getLogger(__file__)
+
+VAC_GROUP = "storage.k8s.io"
+VAC_CLASS_NAME = "csi-gce-pd-{name}"
+# releases whose sidecars modify volumes enable this feature gate
+VAC_FEATURE_GATE = "VolumeAttributesClass=true"
+# newest first, the beta api is served by kubernetes 1.31 to 1.33 when enabled
+VAC_RESOURCES: Dict[str, Type[GlobalResource]] = {
+    "v1": VolumeAttributesClass,
+    "v1beta1": create_global_resource(
+        VAC_GROUP, "v1beta1", "VolumeAttributesClass", "volumeattributesclasses"
+    ),
+}
+
+
+def release_supports_vac(release_path: Path) -> bool:
+    """Determine if the sidecars of a release enable VolumeAttributesClasses."""
+    return any(VAC_FEATURE_GATE in yml.read_text() for yml in release_path.glob("*.yaml"))
+
+
+def cluster_vac_api(client: Client) -> Optional[str]:
+    """Find the newest VolumeAttributesClass api version served by the cluster."""
+    for version, resource in VAC_RESOURCES.items():
+        try:
+            next(iter(client.list(resource, chunk_size=1)), None)
+        except ApiError as ex:
+            if ex.status.code == 404:
+                continue
+            log.exception("Failed probing for VolumeAttributesClass support")
+            return None
+        except HTTPError:
+            log.exception("Failed probing for VolumeAttributesClass support")
+            return None
+        return f"{VAC_GROUP}/{version}"
+    return None
+
+
+class CreateVolumeAttributesClasses(Addition):
+    """Create the volume attributes classes from the volume-attributes-classes config."""
+
+    def __init__(self, manifests: "GCPStorageManifests", driver: str):
+        super().__init__(manifests)
+        self.driver = driver
+
+    def __call__(self) -> List[AnyResource]:
+        """Craft each configured volume attributes class object if supported."""
+        try:
+            classes = parse_volume_attributes_classes(
+                self.manifests.config.get("volume-attributes-classes")
+            )
+        except ValueError:
+            log.exception("Cannot create volume attributes classes from config")
+            return []
+        if not classes:
+            return []
+
+        api_version = self.manifests.config.get("volume-attributes-class-api")
+        if not api_version:
+            log.warning(
+                "Skipping volume attributes classes unsupported by the release or the cluster"
+            )
+            return []
+
+        resources = []
+        for vac in classes:
+            name = VAC_CLASS_NAME.format(name=vac.name)
+            log.info(f"Creating volume attributes class {name}")
+            parameters: Dict[str, str] = {}
+            if vac.iops is not None:
+                parameters["iops"] = str(vac.iops)
+            if vac.throughput is not None:
+                parameters["throughput"] = vac.throughput
+            resources.append(
+                from_dict(
+                    dict(
+                        apiVersion=api_version,
+                        kind="VolumeAttributesClass",
+                        metadata=dict(name=name),
+                        driverName=self.driver,
+                        parameters=parameters,
+                    )
+                )
+            )
+        return resources
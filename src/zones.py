@@ -0,0 +1,36 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+"""Discover the zones of the cluster's nodes."""
+
+import logging
+from typing import List
+
+from httpx import HTTPError
+from lightkube import Client
+from lightkube.core.exceptions import ApiError
+from lightkube.resources.core_v1 import Node
+from ops.manifests import ManifestClientError
+
+log = logging.getLogger(__name__)
+
+# the well-known zone label, then the label set by the driver's node plugin
+ZONE_LABELS = ("topology.kubernetes.io/zone", "topology.gke.io/zone")
+
+
+def node_zones(client: Client) -> List[str]:
+    """Sorted zones in which the cluster's nodes run, from their labels.
+
+    raises ManifestClientError if the nodes cannot be listed
+    """
+    try:
+        nodes = list(client.list(Node))
+    except (ApiError, HTTPError) as ex:
+        msg = "Failed listing nodes"
+        log.exception(msg)
+        raise ManifestClientError(msg, ex) from ex
+    zones = set()
+    for node in nodes:
+        labels = (node.metadata and node.metadata.labels) or {}
+        if zone := next((labels[key] for key in ZONE_LABELS if labels.get(key)), None):
+            zones.add(zone)
+    return sorted(zones)
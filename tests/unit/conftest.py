@@ -4,8 +4,47 @@ import unittest.mock as mock
 
 import pytest
 
+from config import CharmConfig
+from storage_manifests import GCPStorageManifests
+
 
 @pytest.fixture(autouse=True)
 def lk_client():
     with mock.patch("ops.manifests.manifest.Client", autospec=True) as mock_lightkube:
-        yield mock_lightkube.return_value
+        client = mock_lightkube.return_value
+        # the api server responds with the applied object
+        client.apply.side_effect = lambda rsc, *_, **__: rsc
+        yield client
+
+
+@pytest.fixture
+def charm(tmp_path):
+    charm = mock.MagicMock()
+    charm.model.app.name = "gcp-k8s-storage"
+    charm.CACHE_PATH = tmp_path
+    charm.config = {}
+    yield charm
+
+
+@pytest.fixture
+def charm_config(charm):
+    yield CharmConfig(charm)
+
+
+@pytest.fixture
+def kube_control():
+    kube_control = mock.MagicMock()
+    kube_control.get_registry_location.return_value = "rocks.canonical.com/cdk"
+    yield kube_control
+
+
+@pytest.fixture
+def integrator():
+    integrator = mock.MagicMock()
+    integrator.credentials = b"abc"
+    yield integrator
+
+
+@pytest.fixture
+def manifests(charm, charm_config, kube_control, integrator):
+    yield GCPStorageManifests(charm, charm_config, kube_control, integrator)
@@ -0,0 +1,77 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+import unittest.mock as mock
+
+import pytest
+from lightkube.core.exceptions import ApiError
+from lightkube.models.meta_v1 import ObjectMeta
+from lightkube.models.storage_v1 import (
+    CSINodeDriver,
+    CSINodeSpec,
+    VolumeAttachmentSource,
+    VolumeAttachmentSpec,
+    VolumeNodeResources,
+)
+from lightkube.resources.storage_v1 import CSINode, VolumeAttachment
+from ops.manifests import ManifestClientError
+
+from attach_capacity import attach_capacity
+
+DRIVER = "pd.csi.storage.gke.io"
+
+
+def csi_node(name, zone, count, driver=DRIVER):
+    node_id = f"projects/my-project/zones/{zone}/instances/{name}"
+    entry = CSINodeDriver(
+        name=driver,
+        nodeID=node_id,
+        allocatable=VolumeNodeResources(count=count) if count else None,
+    )
+    return CSINode(metadata=ObjectMeta(name=name), spec=CSINodeSpec(drivers=[entry]))
+
+
+def attachment(node, attacher=DRIVER):
+    return VolumeAttachment(
+        spec=VolumeAttachmentSpec(
+            attacher=attacher,
+            nodeName=node,
+            source=VolumeAttachmentSource(persistentVolumeName="pv"),
+        )
+    )
+
+
+@pytest.fixture
+def client():
+    client = mock.MagicMock()
+    nodes = [
+        csi_node("node-a", "us-east1-b", 15),
+        csi_node("node-b", "us-east1-b", 127),
+        csi_node("node-c", "us-east1-c", 15),
+        csi_node("node-d", "us-east1-c", None),
+        csi_node("node-e", "us-east1-c", 15, driver="other.csi.k8s.io"),
+    ]
+    attachments = [attachment("node-a")] * 14 + [attachment("node-c")] * 3
+    attachments += [attachment("node-b", attacher="other.csi.k8s.io")]
+    client.list.side_effect = lambda kind: {CSINode: nodes, VolumeAttachment: attachments}[kind]
+    yield client
+
+
+def test_attach_capacity(client):
+    report = attach_capacity(client, DRIVER)
+    assert report["nodes"] == [
+        dict(node="node-a", zone="us-east1-b", attached=14, allowed=15, available=1),
+        dict(node="node-c", zone="us-east1-c", attached=3, allowed=15, available=12),
+        dict(node="node-b", zone="us-east1-b", attached=0, allowed=127, available=127),
+        dict(node="node-d", zone="us-east1-c", attached=0),
+    ]
+    assert report["zones"] == [
+        dict(zone="us-east1-b", nodes=2, attached=14, allowed=142),
+        dict(zone="us-east1-c", nodes=2, attached=3, allowed=15),
+    ]
+    assert client.list.call_count == 2
+
+
+def test_attach_capacity_api_error(client):
+    client.list.side_effect = ApiError(response=mock.MagicMock())
+    with pytest.raises(ManifestClientError):
+        attach_capacity(client, DRIVER)
@@ -0,0 +1,158 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+import json
+import unittest.mock as mock
+
+import pytest
+from lightkube.models.batch_v1 import JobStatus
+from lightkube.models.core_v1 import PersistentVolumeClaimStatus, PodCondition, PodStatus
+from lightkube.models.meta_v1 import ObjectMeta
+from lightkube.resources.batch_v1 import Job
+from lightkube.resources.core_v1 import Event, PersistentVolumeClaim, Pod
+
+from benchmark import BenchmarkError, fio_command, parse_params, run_benchmark, summarize
+
+
+def fio_job(name, read_iops, write_iops):
+    def stats(iops):
+        return {
+            "io_bytes": 1024 if iops else 0,
+            "iops": iops,
+            "bw": iops * 4,
+            "clat_ns": {"percentile": {"99.000000": 2_500_000}},
+        }
+
+    return {"jobname": name, "read": stats(read_iops), "write": stats(write_iops)}
+
+
+REPORT = {"jobs": [fio_job("bs-4k-qd-32", 3000.04, 1000.0), fio_job("bs-1m-qd-1", 512.0, 0)]}
+IMAGE = "registry.example.com/fio:3.36"
+REQUIRED = {"storage-class": "csi-gce-pd-ssd", "image": IMAGE}
+
+
+def params(**kwargs):
+    return parse_params({**REQUIRED, **kwargs})
+
+
+@pytest.fixture
+def client():
+    client = mock.MagicMock()
+    client.jobs = [Job(status=JobStatus(succeeded=1))]
+    client.pvc = PersistentVolumeClaim(status=PersistentVolumeClaimStatus(phase="Bound"))
+    client.pods = [Pod(metadata=ObjectMeta(name="benchmark-pod"))]
+    client.events = []
+
+    def get(kind, *_, **__):
+        if kind is Job:
+            return client.jobs.pop(0) if len(client.jobs) > 1 else client.jobs[0]
+        return client.pvc
+
+    client.get.side_effect = get
+    client.list.side_effect = lambda kind, **_: client.events if kind is Event else client.pods
+    client.log.return_value = iter(["fio: warning\n", json.dumps(REPORT)])
+    yield client
+
+
+@pytest.fixture(autouse=True)
+def no_sleep():
+    with mock.patch("benchmark.time.sleep") as sleep:
+        yield sleep
+
+
+def test_parse_params():
+    parsed = params(**{"block-sizes": "4k 1M", "queue-depths": "32 1"})
+    assert list(parsed.jobs) == ["bs-4k-qd-32", "bs-4k-qd-1", "bs-1m-qd-32", "bs-1m-qd-1"]
+    command = fio_command(parsed)
+    assert "--rwmixread=70" in command
+    assert "--size=9216m" in command
+    assert command[-4:] == ["--name=bs-1m-qd-1", "--stonewall", "--bs=1M", "--iodepth=1"]
+
+
+@pytest.mark.parametrize("size, file_size", [("512Mi", "460m"), ("1Ti", "943718m")])
+def test_file_size(size, file_size):
+    assert params(size=size).file_size == file_size
+
+
+@pytest.mark.parametrize(
+    "params, message",
+    [
+        ({"image": IMAGE}, "storage-class: field required"),
+        ({"storage-class": "ssd"}, "image: field required"),
+        ({**REQUIRED, "block-sizes": "4q"}, "block-sizes.0: 4q isn't a block size"),
+        ({**REQUIRED, "read-percent": 101}, "read-percent: ensure this value"),
+        ({**REQUIRED, "size": "10G"}, "size: 10G isn't a volume size"),
+        ({**REQUIRED, "size": "0Gi"}, "size: 0Gi isn't a volume size"),
+    ],
+)
+def test_invalid_params(params, message):
+    with pytest.raises(BenchmarkError) as e:
+        parse_params(params)
+    assert str(e.value).startswith(message)
+
+
+def test_summarize():
+    assert summarize(REPORT) == {
+        "bs-4k-qd-32": {
+            "read-iops": 3000.0,
+            "read-mib-per-sec": 11.7,
+            "read-p99-latency-ms": 2.5,
+            "write-iops": 1000.0,
+            "write-mib-per-sec": 3.9,
+            "write-p99-latency-ms": 2.5,
+        },
+        "bs-1m-qd-1": {
+            "read-iops": 512.0,
+            "read-mib-per-sec": 2.0,
+            "read-p99-latency-ms": 2.5,
+        },
+    }
+
+
+def test_run_benchmark(client):
+    assert run_benchmark(client, params(namespace="bench")) == summarize(REPORT)
+
+    pvc, job = (call.args[0] for call in client.create.call_args_list)
+    assert pvc.spec.storageClassName == "csi-gce-pd-ssd"
+    assert job.spec.template.spec.containers[0].image == IMAGE
+    assert job.spec.template.spec.volumes[0].persistentVolumeClaim.claimName == pvc.metadata.name
+    deleted = [(call.args[0], call.args[1]) for call in client.delete.call_args_list]
+    assert deleted == [(Job, job.metadata.name), (PersistentVolumeClaim, pvc.metadata.name)]
+
+
+def test_run_benchmark_failed(client):
+    client.jobs = [Job(status=JobStatus(active=1)), Job(status=JobStatus(failed=1))]
+    with pytest.raises(BenchmarkError, match="failed"):
+        run_benchmark(client, params())
+    assert client.delete.call_count == 2
+
+
+def test_run_benchmark_timeout(client):
+    client.jobs = [Job(status=JobStatus(active=1))]
+    with mock.patch("benchmark.time.monotonic", side_effect=[0, 0, 0, 2]):
+        with pytest.raises(BenchmarkError, match="didn't complete within 1s$"):
+            run_benchmark(client, params(timeout=1))
+    assert client.delete.call_count == 2
+
+
+def test_run_benchmark_unprovisioned(client):
+    client.jobs = [Job(status=JobStatus(active=1))]
+    client.pvc.status.phase = "Pending"
+    client.events = [Event(metadata=ObjectMeta(), involvedObject={}, message="quota exceeded")]
+    with mock.patch("benchmark.time.monotonic", side_effect=[0, 0, 10, 10, 70]):
+        with pytest.raises(BenchmarkError) as e:
+            run_benchmark(client, params())
+    assert str(e.value).endswith("cannot start, its volume is Pending: quota exceeded")
+    _, kwargs = next(c for c in client.list.call_args_list if c.args[0] is Event)
+    assert kwargs["fields"]["reason"] == "ProvisioningFailed"
+    assert client.delete.call_count == 2
+
+
+def test_run_benchmark_unschedulable(client):
+    client.jobs = [Job(status=JobStatus(active=1))]
+    unschedulable = PodCondition(
+        type="PodScheduled", status="False", reason="Unschedulable", message="0/3 nodes"
+    )
+    client.pods[0].status = PodStatus(conditions=[unschedulable])
+    with mock.patch("benchmark.time.monotonic", side_effect=[0, 0, 10, 10, 20, 20]):
+        with pytest.raises(BenchmarkError, match="didn't complete within 15s, its pod is"):
+            run_benchmark(client, params(timeout=15))
@@ -11,6 +11,10 @@ from pathlib import Path
 import ops
 import pytest
 import yaml
+from lightkube.codecs import from_dict
+from lightkube.core.exceptions import ApiError
+from lightkube.models.apps_v1 import DeploymentStatus
+from ops.manifests import HashableResource
 from ops.testing import Harness
 
 from charm import GcpK8sStorageCharm
@@ -35,6 +39,13 @@ def mock_ca_cert(tmpdir):
         yield ca_cert
 
 
+@pytest.fixture(autouse=True)
+def mock_cache_path(tmpdir):
+    cache_path = Path(tmpdir) / "cache"
+    with mock.patch.object(GcpK8sStorageCharm, "CACHE_PATH", cache_path):
+        yield cache_path
+
+
 @pytest.fixture()
 def integrator():
     with mock.patch("charm.GCPIntegratorRequires") as mocked:
@@ -140,3 +151,230 @@ def test_waits_for_kube_control(mock_create_kubeconfig, harness, caplog):
     }
 
     caplog.clear()
+
+
+def test_preflight_status_lists_first_rejections(harness):
+    harness.begin()
+    rejected = [f"StorageClass/csi-gce-pd-{i}: denied" for i in range(5)]
+    event = mock.MagicMock()
+    with mock.patch.object(GcpK8sStorageCharm, "_preflight_rejections", return_value=rejected):
+        assert not harness.charm._check_preflight(event)
+    assert harness.charm.unit.status == ops.BlockedStatus(
+        "Preflight rejected 5 objects: StorageClass/csi-gce-pd-0: denied; "
+        "StorageClass/csi-gce-pd-1: denied; StorageClass/csi-gce-pd-2: denied; ... "
+        "(run the preflight action for the full list)"
+    )
+    event.defer.assert_not_called()
+
+
+@pytest.mark.parametrize("leader", [True, False])
+def test_update_status_repairs_drift_on_leader(harness, leader):
+    harness.set_leader(leader)
+    harness.begin()
+    harness.charm.stored.deployed = True
+    with mock.patch.object(GcpK8sStorageCharm, "_repair_drift") as repair_drift:
+        harness.charm.on.update_status.emit()
+    assert repair_drift.called is leader
+
+
+@pytest.mark.parametrize("topology_aware", [True, False])
+def test_update_status_refreshes_zones(harness, topology_aware):
+    harness.update_config({"topology-aware-classes": topology_aware})
+    harness.begin()
+    harness.charm.stored.config_hash = 1
+    with mock.patch.object(GcpK8sStorageCharm, "_merge_config") as merge_config:
+        harness.charm.on.update_status.emit()
+    assert merge_config.called is topology_aware
+
+
+def test_repair_drift_budget(harness, lk_client):
+    harness.update_config({"drift-repair-budget": 2})
+    harness.begin()
+    lk_client.list.return_value = []  # every resource is missing
+    harness.charm._repair_drift()
+    assert lk_client.apply.call_count == 2
+
+
+def test_repair_drift_ignores_status(harness, lk_client):
+    harness.begin()
+    controller = harness.charm.collector.manifests["gce-pd-csi-driver"]
+    controller.apply_manifests()
+    lk_client.apply.reset_mock()
+
+    installed = [
+        HashableResource(from_dict(obj.resource.to_dict())) for obj in controller.resources
+    ]
+    for obj in installed:
+        obj.resource.metadata.resourceVersion = "2"
+    lk_client.list.side_effect = lambda kind, namespace=None, **_: [
+        obj.resource
+        for obj in installed
+        if type(obj.resource) is kind and obj.namespace == namespace
+    ]
+    deployment = next(obj.resource for obj in installed if obj.kind == "Deployment")
+    deployment.status = DeploymentStatus(readyReplicas=1)
+    harness.charm._repair_drift()
+    lk_client.apply.assert_not_called()
+
+    deployment.metadata.resourceVersion, deployment.spec.replicas = "3", 5
+    harness.charm._repair_drift()
+    (applied,) = [c.args[0] for c in lk_client.apply.call_args_list]
+    assert applied.metadata.name == deployment.metadata.name
+
+
+@pytest.mark.usefixtures("lk_client")
+def test_prepull_defers_then_applies(harness):
+    harness.set_leader(True)
+    harness.update_config({"image-prepull": True})
+    harness.begin()
+    charm = harness.charm
+    controller = charm.collector.manifests["gce-pd-csi-driver"]
+    release = controller.current_release
+    charm.stored.releases[controller.name] = "v0.0.1"
+    event = mock.MagicMock()
+    with (
+        mock.patch.object(GcpK8sStorageCharm, "_check_preflight", return_value=True),
+        mock.patch("charm.ImagePrePuller") as prepuller_cls,
+        mock.patch.object(type(controller), "apply_manifests") as apply_manifests,
+    ):
+        prepuller = prepuller_cls.return_value
+        prepuller.pull.side_effect = [(1, 3, False), (3, 3, True)]
+
+        assert not charm._install_or_upgrade(event, config_hash=1)
+        assert charm.unit.status == ops.WaitingStatus(f"Pre-pulling {release} images: 1/3 nodes")
+        event.defer.assert_called_once()
+        apply_manifests.assert_not_called()
+        prepuller.remove.assert_not_called()
+
+        assert charm._install_or_upgrade(event, config_hash=1)
+        assert apply_manifests.called
+        prepuller.remove.assert_called_once_with()
+    assert charm.stored.prepull_started is None
+    assert charm.stored.releases[controller.name] == release
+
+
+@pytest.mark.usefixtures("lk_client")
+def test_prepull_times_out(harness, caplog):
+    harness.set_leader(True)
+    harness.update_config({"image-prepull": True, "image-prepull-timeout": 10})
+    harness.begin()
+    charm = harness.charm
+    controller = charm.collector.manifests["gce-pd-csi-driver"]
+    release = controller.current_release
+    charm.stored.releases[controller.name] = "v0.0.1"
+    event = mock.MagicMock()
+    with (
+        mock.patch.object(GcpK8sStorageCharm, "_check_preflight", return_value=True),
+        mock.patch("charm.ImagePrePuller") as prepuller_cls,
+        mock.patch.object(type(controller), "apply_manifests") as apply_manifests,
+        mock.patch("charm.time") as clock,
+    ):
+        clock.time.side_effect = [1000, 1000, 1060, 1600]
+        prepuller = prepuller_cls.return_value
+        prepuller.pull.return_value = (2, 3, False)
+
+        assert not charm._install_or_upgrade(event, config_hash=1)
+        assert charm.stored.prepull_started == 1000
+        assert not charm._install_or_upgrade(event, config_hash=1)
+        assert charm.unit.status == ops.WaitingStatus(f"Pre-pulling {release} images: 2/3 nodes")
+        apply_manifests.assert_not_called()
+
+        # a node that never pulls holds the release back only until the timeout
+        assert charm._install_or_upgrade(event, config_hash=1)
+        assert apply_manifests.called
+        prepuller.remove.assert_called_once_with()
+    assert f"Pre-pulling {release} images timed out at 2/3 nodes" in caplog.text
+    assert charm.stored.prepull_started is None
+
+
+@pytest.mark.usefixtures("lk_client")
+def test_prepull_waits_for_leader(harness):
+    harness.set_leader(False)
+    harness.update_config({"image-prepull": True})
+    harness.begin()
+    charm = harness.charm
+    controller = charm.collector.manifests["gce-pd-csi-driver"]
+    release = controller.current_release
+    charm.stored.releases[controller.name] = "v0.0.1"
+    event = mock.MagicMock()
+    with (
+        mock.patch.object(GcpK8sStorageCharm, "_check_preflight", return_value=True),
+        mock.patch("charm.ImagePrePuller") as prepuller_cls,
+        mock.patch("charm.node_plugin_version") as node_plugin_version,
+        mock.patch.object(type(controller), "apply_manifests") as apply_manifests,
+    ):
+        node_plugin_version.return_value = f"{controller.name}-v0.0.1"
+        assert not charm._install_or_upgrade(event, config_hash=1)
+        assert charm.unit.status == ops.WaitingStatus(
+            f"Waiting for the leader to pre-pull {release} images"
+        )
+        apply_manifests.assert_not_called()
+
+        node_plugin_version.return_value = f"{controller.name}-{release}"
+        assert charm._install_or_upgrade(event, config_hash=1)
+        assert apply_manifests.called
+    prepuller_cls.return_value.pull.assert_not_called()
+
+
+@pytest.mark.parametrize("leader", [True, False])
+def test_update_status_labels_data_cache_nodes(harness, lk_client, leader):
+    harness.set_leader(leader)
+    harness.update_config(
+        {
+            "data-cache": True,
+            "data-cache-node-selector": "data-cache=true",
+            "data-cache-local-ssds": 2,
+        }
+    )
+    harness.begin()
+    charm = harness.charm
+    charm.stored.deployed = True
+    with (
+        mock.patch.object(GcpK8sStorageCharm, "_repair_drift"),
+        mock.patch("charm.label_nodes", return_value=["node-0"]) as label_nodes,
+    ):
+        charm.on.update_status.emit()
+        if not leader:
+            label_nodes.assert_not_called()
+            return
+        label_nodes.assert_called_once_with(lk_client, {"data-cache": "true"}, 2)
+        assert charm.stored.data_cache_labelled
+
+        # disabling the cache removes the labels once
+        harness.update_config({"data-cache": False})
+        label_nodes.reset_mock()
+        charm.on.update_status.emit()
+        label_nodes.assert_called_once_with(lk_client, {}, 2)
+        assert not charm.stored.data_cache_labelled
+        label_nodes.reset_mock()
+        charm.on.update_status.emit()
+        label_nodes.assert_not_called()
+
+
+def test_fresh_cluster_applies_snapshot_crds_first(harness, lk_client):
+    harness.update_config(
+        {
+            "snapshot-controller": True,
+            "local-ssd": True,
+            "snapshot-classes": "- name: standard",
+        }
+    )
+    harness.begin()
+    applied = []
+
+    def apply(rsc, *_, **__):
+        # the api-server doesn't serve VolumeSnapshotClasses before their CRD
+        if rsc.kind == "VolumeSnapshotClass" and "CustomResourceDefinition" not in applied:
+            raise ApiError(response=mock.MagicMock())
+        applied.append(rsc.kind)
+        return rsc
+
+    lk_client.apply.side_effect = apply
+    event = mock.MagicMock()
+    with (
+        mock.patch.object(GcpK8sStorageCharm, "_check_preflight", return_value=True),
+        mock.patch.object(GcpK8sStorageCharm, "_check_prepull", return_value=True),
+    ):
+        assert harness.charm._install_or_upgrade(event, config_hash=1)
+    event.defer.assert_not_called()
+    assert applied.index("CustomResourceDefinition") < applied.index("VolumeSnapshotClass")
@@ -0,0 +1,146 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+import unittest.mock as mock
+
+import pytest
+import yaml
+from lightkube.core.exceptions import ApiError
+from lightkube.models.meta_v1 import ObjectMeta
+from lightkube.resources.core_v1 import Node
+from ops.manifests import ManifestClientError
+
+from data_cache import DATA_CACHE_LABEL, label_nodes
+
+
+def driver_containers(manifests):
+    return {
+        obj.name: next(c for c in obj.resource.spec.template.spec.containers if "pd" in c.name)
+        for obj in manifests.resources
+        if obj.kind in ("Deployment", "DaemonSet")
+    }
+
+
+def test_data_cache_driver_args(manifests, charm_config):
+    charm_config.config["storage-release"] = "v1.16.1"
+    containers = driver_containers(manifests)
+    assert not any("--enable-data-cache" in c.args for c in containers.values())
+
+    charm_config.config["data-cache"] = True
+    charm_config.config["data-cache-node-selector"] = "data-cache=true"
+    assert charm_config.evaluate() is None
+    assert manifests.evaluate() is None
+    containers = driver_containers(manifests)
+    assert "--enable-data-cache" in containers["csi-gce-pd-controller"].args
+    node = containers["csi-gce-pd-node"]
+    assert node.args[-2:] == ["--enable-data-cache", "--node-name=$(KUBE_NODE_NAME)"]
+    assert node.env[-1].valueFrom.fieldRef.fieldPath == "spec.nodeName"
+    assert "--enable-data-cache" not in containers["csi-gce-pd-node-win"].args
+
+
+def test_data_cache_release_flag(manifests, charm_config):
+    charm_config.config["storage-release"] = "v1.17.8"
+    charm_config.config["data-cache"] = True
+    node = driver_containers(manifests)["csi-gce-pd-node"]
+    assert node.args.count("--enable-data-cache") == 1
+    assert node.args.count("--node-name=$(KUBE_NODE_NAME)") == 1
+    assert [env.name for env in node.env] == ["KUBE_NODE_NAME"]
+
+
+def test_data_cache_unsupported_release(manifests, charm_config):
+    charm_config.config["storage-release"] = "v1.15.4"
+    charm_config.config["data-cache"] = True
+    assert manifests.evaluate() == "storage-release v1.15.4 doesn't support data-cache"
+
+
+def test_data_cache_storage_class(manifests, charm_config):
+    charm_config.config["storage-classes"] = """
+    - name: cached
+      type: pd-balanced
+      data-cache-mode: writeback
+      data-cache-size: 50Gi
+    """
+    assert charm_config.evaluate() == "storage-classes cached require data-cache to be enabled"
+    charm_config.config["data-cache"] = True
+    charm_config.config["data-cache-node-selector"] = "data-cache=true"
+    assert charm_config.evaluate() is None
+    (cached,) = [obj.resource for obj in manifests.resources if obj.name == "csi-gce-pd-cached"]
+    assert cached.parameters == {
+        "type": "pd-balanced",
+        "replication-type": "none",
+        "data-cache-mode": "writeback",
+        "data-cache-size": "50Gi",
+    }
+
+
+@pytest.mark.parametrize(
+    "entry, message",
+    [
+        ({"data-cache-mode": "writeback"}, "storage-classes 0: should define both"),
+        ({"data-cache-size": "50Gi"}, "storage-classes 0: should define both"),
+        (
+            {"data-cache-mode": "lazy", "data-cache-size": "1Gi"},
+            "storage-classes 0.data-cache-mode: should be either",
+        ),
+        (
+            {"data-cache-mode": "writeback", "data-cache-size": "1T"},
+            "storage-classes 0.data-cache-size: '1T' should be a quantity",
+        ),
+    ],
+)
+def test_invalid_data_cache_classes(charm_config, entry, message):
+    charm_config.config["data-cache"] = True
+    charm_config.config["data-cache-node-selector"] = "data-cache=true"
+    charm_config.config["storage-classes"] = yaml.safe_dump(
+        [dict(name="c", type="pd-ssd", **entry)]
+    )
+    assert charm_config.evaluate().startswith(message)
+
+
+@pytest.mark.parametrize(
+    "config, message",
+    [
+        ({}, "data-cache requires data-cache-node-selector to select the nodes"),
+        (
+            {"data-cache-node-selector": "data-cache"},
+            "data-cache-node-selector 'data-cache' should be a label such as 'key=value'",
+        ),
+        (
+            {"data-cache-node-selector": "data-cache=true", "data-cache-local-ssds": 0},
+            "data-cache-local-ssds should be at least 1",
+        ),
+    ],
+)
+def test_invalid_data_cache_nodes(charm_config, config, message):
+    charm_config.config["data-cache"] = True
+    charm_config.config.update(config)
+    assert charm_config.evaluate() == message
+
+
+def node(name, **labels):
+    return Node(metadata=ObjectMeta(name=name, labels=labels))
+
+
+def test_label_nodes():
+    client = mock.MagicMock()
+    cached = {DATA_CACHE_LABEL: "2"}
+    selected = [node("node-0"), node("node-1", **cached)]
+    labelled = [node("node-1", **cached), node("node-2", **cached)]
+    client.list.side_effect = [selected, labelled]
+    assert label_nodes(client, {"data-cache": "true"}, 2) == ["node-0", "node-1"]
+    assert client.list.call_args_list[0].kwargs["labels"] == {"data-cache": "true"}
+    assert client.patch.call_args_list == [
+        mock.call(Node, "node-2", {"metadata": {"labels": {DATA_CACHE_LABEL: None}}}),
+        mock.call(Node, "node-0", {"metadata": {"labels": {DATA_CACHE_LABEL: "2"}}}),
+    ]
+
+    client.reset_mock()
+    client.list.side_effect = [labelled]
+    assert label_nodes(client, {}, 2) == []
+    assert client.patch.call_args_list == [
+        mock.call(Node, "node-1", {"metadata": {"labels": {DATA_CACHE_LABEL: None}}}),
+        mock.call(Node, "node-2", {"metadata": {"labels": {DATA_CACHE_LABEL: None}}}),
+    ]
+
+    client.list.side_effect = ApiError(response=mock.MagicMock())
+    with pytest.raises(ManifestClientError):
+        label_nodes(client, {"data-cache": "true"}, 2)
@@ -0,0 +1,65 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+from lightkube.codecs import from_dict
+from ops.manifests import HashableResource
+
+from drift import AppliedIndex
+
+
+def deployment(resource_version, generation, replicas=1, ready=0):
+    return HashableResource(
+        from_dict(
+            dict(
+                apiVersion="apps/v1",
+                kind="Deployment",
+                metadata=dict(
+                    name="csi-gce-pd-controller",
+                    namespace="gce-pd-csi-driver",
+                    resourceVersion=resource_version,
+                    generation=generation,
+                ),
+                spec=dict(replicas=replicas, selector={}, template={}),
+                status=dict(readyReplicas=ready),
+            )
+        )
+    )
+
+
+def config_map(resource_version, data):
+    return HashableResource(
+        from_dict(
+            dict(
+                apiVersion="v1",
+                kind="ConfigMap",
+                metadata=dict(name="cm", namespace="ns", resourceVersion=resource_version),
+                data=data,
+            )
+        )
+    )
+
+
+def test_drift_detection(tmp_path):
+    index = AppliedIndex(tmp_path / "applied.json")
+    applied = [deployment("1", 1), config_map("1", {"a": "b"})]
+    for obj in applied:
+        index.record(obj, obj.resource)
+    index.save()
+
+    index = AppliedIndex(tmp_path / "applied.json")
+    # status updates and identical content are not drift
+    installed = [deployment("2", 1, ready=1), config_map("2", {"a": "b"})]
+    assert index.drifted(applied, installed) == []
+
+    # spec edits and missing resources are drift
+    installed = [deployment("3", 2, replicas=3)]
+    assert index.drifted(applied, installed) == applied
+
+    # drift remains reported until it is repaired
+    assert index.drifted(applied, installed) == applied
+
+
+def test_unknown_resources_are_adopted(tmp_path):
+    index = AppliedIndex(tmp_path / "applied.json")
+    applied = [config_map("1", {"a": "b"})]
+    assert index.drifted(applied, applied) == []
+    assert index.drifted(applied, [config_map("2", {"a": "c"})]) == applied
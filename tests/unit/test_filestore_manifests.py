@@ -0,0 +1,65 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+import pytest
+
+from filestore_manifests import GCPFilestoreManifests
+
+
+@pytest.fixture
+def filestore(charm, charm_config, kube_control, integrator):
+    charm_config.config["filestore-tiers"] = "standard,premium"
+    yield GCPFilestoreManifests(charm, charm_config, kube_control, integrator)
+
+
+def test_filestore_without_releases(filestore, tmp_path):
+    filestore.base_path = tmp_path / "filestore"
+    assert filestore.evaluate() == "gcp-filestore-csi-driver manifests have no bundled releases"
+    assert not filestore.resources
+
+
+def test_filestore_resources(filestore, charm_config):
+    charm_config.config["filestore-network"] = "vpc-a"
+    assert charm_config.evaluate() is None
+    assert filestore.evaluate() is None
+    assert filestore.current_release == "v1.6.0"
+
+    resources = {(obj.kind, obj.name): obj.resource for obj in filestore.resources}
+    secret = resources[("Secret", "gcp-filestore-csi-driver-sa")]
+    assert secret.metadata.namespace == "gcp-filestore-csi-driver"
+    assert secret.data == {"gcp_filestore_csi_driver_sa.json": "abc"}
+
+    controller = resources[("Deployment", "gcp-filestore-csi-controller")].spec.template.spec
+    assert all(c.image.startswith("rocks.canonical.com/cdk/") for c in controller.containers)
+    # the controller reads the service account from the charm's secret
+    (sa_volume,) = [v for v in controller.volumes if v.secret]
+    assert sa_volume.secret.secretName == secret.metadata.name
+    (driver,) = [c for c in controller.containers if c.name == "gcp-filestore-driver"]
+    credentials = {e.name: e.value for e in driver.env}["GOOGLE_APPLICATION_CREDENTIALS"]
+    assert credentials.endswith("/gcp_filestore_csi_driver_sa.json")
+
+    classes = {name: rsc for (kind, name), rsc in resources.items() if kind == "StorageClass"}
+    assert list(classes) == ["csi-filestore-standard", "csi-filestore-premium"]
+    premium = classes["csi-filestore-premium"]
+    assert premium.provisioner == "filestore.csi.storage.gke.io"
+    assert premium.parameters == {"tier": "premium", "network": "vpc-a"}
+    assert premium.volumeBindingMode == "WaitForFirstConsumer"
+    assert ("CSIDriver", "filestore.csi.storage.gke.io") in resources
+
+
+def test_filestore_release_config(filestore, charm_config):
+    charm_config.config["filestore-release"] = "v1.6.0"
+    charm_config.config["storage-release"] = "v1.7.3"
+    assert filestore.current_release == "v1.6.0"
+    assert filestore.config["release"] == "v1.6.0"
+
+
+@pytest.mark.parametrize(
+    "value, message",
+    [
+        ("standard,basic", "filestore-tiers basic not one of"),
+        ("premium ultra", "filestore-tiers ultra not one of"),
+    ],
+)
+def test_invalid_filestore_tiers(charm_config, value, message):
+    charm_config.config["filestore-tiers"] = value
+    assert charm_config.evaluate().startswith(message)
@@ -0,0 +1,103 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+from pathlib import Path
+
+import pytest
+import yaml
+
+from local_ssd_manifests import LocalSSDManifests
+
+
+@pytest.fixture
+def manifests(charm, charm_config, kube_control, integrator):
+    integrator.is_ready = False
+    yield LocalSSDManifests(charm, charm_config, kube_control, integrator)
+
+
+def resources(manifests):
+    return {(obj.kind, obj.name): obj.resource for obj in manifests.resources}
+
+
+def test_local_ssd_resources(manifests):
+    assert manifests.evaluate() is None
+    rendered = resources(manifests)
+
+    sc = rendered[("StorageClass", "local-ssd")]
+    assert sc.provisioner == "kubernetes.io/no-provisioner"
+    assert sc.volumeBindingMode == "WaitForFirstConsumer"
+
+    config_map = rendered[("ConfigMap", "local-static-provisioner-config")]
+    classes = yaml.safe_load(config_map.data["storageClassMap"])
+    assert classes["local-ssd"]["hostDir"] == "/mnt/disks"
+
+    ds = rendered[("DaemonSet", "local-static-provisioner")]
+    (container,) = ds.spec.template.spec.containers
+    assert container.image.startswith("rocks.canonical.com/cdk/")
+    (job_image,) = [env.value for env in container.env if env.name == "JOB_CONTAINER_IMAGE"]
+    assert job_image == container.image
+
+
+def discovery_mounts(pod):
+    volumes = {v.name: v.hostPath.path for v in pod.volumes if v.hostPath}
+    (container,) = pod.containers
+    return {m.mountPath: volumes[m.name] for m in container.volumeMounts if m.name in volumes}
+
+
+def test_local_ssd_discovery_dir(manifests, charm_config):
+    charm_config.config["local-ssd-discovery-dir"] = "/mnt/nvme"
+    assert manifests.evaluate() is None
+    rendered = resources(manifests)
+
+    config_map = rendered[("ConfigMap", "local-static-provisioner-config")]
+    classes = yaml.safe_load(config_map.data["storageClassMap"])
+    assert classes["local-ssd"]["hostDir"] == classes["local-ssd"]["mountDir"] == "/mnt/nvme"
+
+    pod = rendered[("DaemonSet", "local-static-provisioner")].spec.template.spec
+    assert discovery_mounts(pod) == {"/dev": "/dev", "/mnt/nvme": "/mnt/nvme"}
+
+
+def test_invalid_discovery_dir(charm_config):
+    charm_config.config["local-ssd-discovery-dir"] = "mnt/disks"
+    assert charm_config.evaluate() == "local-ssd-discovery-dir should be an absolute path"
+
+
+def test_upstream_example_objects(manifests):
+    # the bundled release is upstream's helm/generated_examples/gke.yaml
+    rendered = resources(manifests)
+    assert ("StorageClass", "local-scsi") not in rendered
+    assert [name for kind, name in rendered if kind == "ConfigMap"] == [
+        "local-static-provisioner-config"
+    ]
+    namespaced = [rsc for rsc in rendered.values() if rsc.metadata.namespace]
+    assert {rsc.metadata.namespace for rsc in namespaced} == {"local-ssd-provisioner"}
+    (subject,) = rendered[("ClusterRoleBinding", "local-static-provisioner-node-binding")].subjects
+    assert subject.namespace == "local-ssd-provisioner"
+
+
+UPSTREAM = Path("upstream/local_ssd/manifests/v2.6.0/local-static-provisioner.yaml")
+
+
+def test_discovery_volume_by_path(manifests, charm_config, tmp_path):
+    charm_config.config["local-ssd-discovery-dir"] = "/mnt/nvme"
+    release = tmp_path / "local_ssd" / "manifests" / "v2.6.0"
+    release.mkdir(parents=True)
+    text = UPSTREAM.read_text().replace("name: local-scsi\n", "name: ssd-discovery\n")
+    (release / "local-static-provisioner.yaml").write_text(text)
+    manifests.base_path = tmp_path / "local_ssd"
+
+    assert manifests.evaluate() is None
+    pod = resources(manifests)[("DaemonSet", "local-static-provisioner")].spec.template.spec
+    assert discovery_mounts(pod)["/mnt/nvme"] == "/mnt/nvme"
+    assert "ssd-discovery" in [v.name for v in pod.volumes]
+
+
+def test_release_without_discovery_mount(manifests, tmp_path):
+    release = tmp_path / "local_ssd" / "manifests" / "v2.6.0"
+    release.mkdir(parents=True)
+    text = UPSTREAM.read_text().replace("path: /mnt/disks", "path: /mnt/local")
+    (release / "local-static-provisioner.yaml").write_text(text)
+    manifests.base_path = tmp_path / "local_ssd"
+    assert manifests.evaluate() == (
+        "local-ssd-provisioner release v2.6.0 doesn't mount local-ssd-discovery-dir"
+    )
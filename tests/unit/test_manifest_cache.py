@@ -0,0 +1,31 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+import os
+
+from manifest_cache import ManifestCache
+
+
+def test_cache_round_trip(tmp_path):
+    cache = ManifestCache(tmp_path)
+    assert cache.get("a") is None
+    cache.put("a", [{"kind": "Namespace"}])
+    assert cache.get("a") == [{"kind": "Namespace"}]
+    assert (tmp_path / "a.json").stat().st_mode & 0o077 == 0
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ManifestCache(tmp_path, max_bytes=100)
+    item = [{"data": "x" * 30}]
+    for age, key in enumerate(["a", "b"]):
+        cache.put(key, item)
+        os.utime(tmp_path / f"{key}.json", (age, age))
+    cache.get("a")  # refreshes a, leaving b as the least recently used
+    cache.put("c", item)
+    assert sorted(p.stem for p in tmp_path.glob("*.json")) == ["a", "c"]
+
+
+def test_cache_discards_corrupt_entries(tmp_path):
+    cache = ManifestCache(tmp_path)
+    (tmp_path / "a.json").write_text("{not json")
+    assert cache.get("a") is None
+    assert not (tmp_path / "a.json").exists()
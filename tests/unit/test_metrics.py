@@ -0,0 +1,41 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+from metrics import ReconcileMetrics
+
+
+def test_metrics_persist_between_hooks(tmp_path):
+    metrics = ReconcileMetrics(tmp_path / "metrics.json")
+    metrics.inc("reconciles_total", "gce-pd-csi-driver")
+    metrics.observe_apply("gce-pd-csi-driver", 10, 1.5)
+    metrics.save()
+
+    metrics = ReconcileMetrics(tmp_path / "metrics.json")
+    metrics.inc("reconciles_total", "gce-pd-csi-driver")
+    metrics.inc("api_errors_total", "local-ssd-provisioner")
+    metrics.observe_apply("gce-pd-csi-driver", 5, 0.5)
+    assert metrics.values["reconciles_total"] == {"gce-pd-csi-driver": 2}
+    assert metrics.values["objects_applied_total"] == {"gce-pd-csi-driver": 15}
+    assert metrics.values["apply_duration_seconds_total"] == {"gce-pd-csi-driver": 2.0}
+    assert metrics.values["last_apply_duration_seconds"] == {"gce-pd-csi-driver": 0.5}
+
+
+def test_metrics_textfile(tmp_path):
+    textfile_dir = tmp_path / "node-exporter"
+    metrics = ReconcileMetrics(tmp_path / "metrics.json")
+    metrics.inc("reconciles_total", "gce-pd-csi-driver")
+    metrics.inc("api_errors_total", "gce-pd-csi-driver", 2)
+
+    metrics.save(textfile_dir)
+    assert not textfile_dir.exists()
+
+    textfile_dir.mkdir()
+    metrics.save(textfile_dir)
+    assert [p.name for p in textfile_dir.iterdir()] == ["gcp_k8s_storage.prom"]
+    assert (textfile_dir / "gcp_k8s_storage.prom").read_text().splitlines() == [
+        "# HELP gcp_k8s_storage_reconciles_total Manifest reconciles performed by the charm.",
+        "# TYPE gcp_k8s_storage_reconciles_total counter",
+        'gcp_k8s_storage_reconciles_total{manifest="gce-pd-csi-driver"} 1',
+        "# HELP gcp_k8s_storage_api_errors_total Kubernetes API errors encountered by the charm.",
+        "# TYPE gcp_k8s_storage_api_errors_total counter",
+        'gcp_k8s_storage_api_errors_total{manifest="gce-pd-csi-driver"} 2',
+    ]
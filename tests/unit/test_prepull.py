@@ -0,0 +1,91 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+import unittest.mock as mock
+
+import pytest
+from lightkube.core.exceptions import ApiError
+from lightkube.models.apps_v1 import DaemonSetStatus
+from lightkube.models.core_v1 import ContainerStatus, PodStatus
+from lightkube.resources.core_v1 import Pod
+from ops.manifests import ManifestClientError
+
+from prepull import ImagePrePuller, manifest_images, node_plugin_version
+
+NAMESPACE = "gce-pd-csi-driver"
+
+
+def pod(*image_ids):
+    statuses = [
+        ContainerStatus(
+            name=f"image-{i}", image="img", imageID=image_id, ready=False, restartCount=0
+        )
+        for i, image_id in enumerate(image_ids)
+    ]
+    return Pod(status=PodStatus(initContainerStatuses=statuses))
+
+
+def test_manifest_images(manifests, charm_config):
+    charm_config.config["image-registry"] = "registry.example.com"
+    assert manifest_images(manifests.resources) == [
+        "registry.example.com/sig-storage/csi-provisioner:v5.1.0",
+        "registry.example.com/sig-storage/csi-attacher:v4.4.3",
+        "registry.example.com/sig-storage/csi-resizer:v1.12.0",
+        "registry.example.com/sig-storage/csi-snapshotter:v7.0.2",
+        "registry.example.com/cloud-provider-gcp/gcp-compute-persistent-disk-csi-driver:v1.15.0",
+        "registry.example.com/sig-storage/csi-node-driver-registrar:v2.9.3",
+    ]
+
+
+def test_prepull_progress():
+    client = mock.MagicMock()
+    client.apply.side_effect = lambda ds, **_: ds
+    client.list.return_value = [pod("sha256:a", "sha256:b"), pod("sha256:a", ""), pod()]
+    prepuller = ImagePrePuller(client, NAMESPACE, "registry.example.com")
+    images = ["registry.example.com/a:v1", "registry.example.com/b:v1"]
+
+    assert prepuller.pull("v1.16.1", images, 0.5) == (1, 0, False)
+    (ds,) = client.apply.call_args.args
+    assert [c.image for c in ds.spec.template.spec.initContainers] == images
+    assert [c.image for c in ds.spec.template.spec.containers] == [
+        "registry.example.com/pause:3.10"
+    ]
+    assert ds.spec.template.spec.nodeSelector == {"kubernetes.io/os": "linux"}
+
+    client.apply.side_effect = None
+    client.apply.return_value.status = DaemonSetStatus(
+        currentNumberScheduled=3,
+        desiredNumberScheduled=3,
+        numberMisscheduled=0,
+        numberReady=0,
+    )
+    assert prepuller.pull("v1.16.1", images, 0.5) == (1, 3, False)
+    assert prepuller.pull("v1.16.1", images, 0.3) == (1, 3, True)
+
+
+def test_prepull_remove():
+    client = mock.MagicMock()
+    not_found = ApiError(response=mock.MagicMock())
+    not_found.status.code = 404
+    client.delete.side_effect = not_found
+    ImagePrePuller(client, NAMESPACE).remove()
+
+    client.delete.side_effect = ApiError(response=mock.MagicMock())
+    with pytest.raises(ManifestClientError):
+        ImagePrePuller(client, NAMESPACE).remove()
+
+
+def test_node_plugin_version():
+    client = mock.MagicMock()
+    client.get.return_value.metadata.labels = {
+        "juju.io/manifest-version": "gce-pd-csi-driver-v1.15.0"
+    }
+    assert node_plugin_version(client, NAMESPACE) == "gce-pd-csi-driver-v1.15.0"
+
+    not_found = ApiError(response=mock.MagicMock())
+    not_found.status.code = 404
+    client.get.side_effect = not_found
+    assert node_plugin_version(client, NAMESPACE) is None
+
+    client.get.side_effect = ApiError(response=mock.MagicMock())
+    with pytest.raises(ManifestClientError):
+        node_plugin_version(client, NAMESPACE)
@@ -0,0 +1,54 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+import pytest
+from ops.charm import CharmBase
+from ops.testing import Harness
+
+from requires_integrator import GCPIntegratorRequires
+
+FEATURES = ("enable-block-storage-management", "enable-instance-inspection")
+
+
+class IntegratorCharm(CharmBase):
+    """Minimal charm requiring the gcp-integration relation."""
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.integrator = GCPIntegratorRequires(self)
+
+
+@pytest.fixture
+def harness():
+    meta = "{name: test, requires: {gcp-integration: {interface: gcp-integration}}}"
+    harness = Harness(IntegratorCharm, meta=meta)
+    harness.begin()
+    yield harness
+    harness.cleanup()
+
+
+def test_request_features_once(harness):
+    rel_id = harness.add_relation("gcp-integration", "gcp-integrator")
+    integrator = harness.charm.integrator
+    integrator.request_features(FEATURES)
+    data = harness.get_relation_data(rel_id, harness.charm.unit.name)
+    assert data["enable-block-storage-management"] == "true"
+    assert data["enable-instance-inspection"] == "true"
+    nonce = data["requested"]
+
+    integrator.request_features(reversed(FEATURES))
+    assert data["requested"] == nonce
+
+    integrator.request_features([*FEATURES, "enable-object-storage-access"])
+    assert data["enable-object-storage-access"] == "true"
+    assert data["requested"] != nonce
+
+
+def test_request_features_new_relation(harness):
+    rel_id = harness.add_relation("gcp-integration", "gcp-integrator")
+    harness.charm.integrator.request_features(FEATURES)
+    harness.remove_relation(rel_id)
+
+    rel_id = harness.add_relation("gcp-integration", "gcp-integrator")
+    del harness.charm.integrator.relation  # cached per hook
+    harness.charm.integrator.request_features(FEATURES)
+    assert "requested" in harness.get_relation_data(rel_id, harness.charm.unit.name)
@@ -0,0 +1,167 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+import unittest.mock as mock
+
+import pytest
+from lightkube.core.exceptions import ApiError
+from lightkube.models.core_v1 import PodCondition, PodSpec, PodStatus
+from lightkube.models.meta_v1 import ObjectMeta, OwnerReference
+from lightkube.resources.apps_v1 import ControllerRevision
+from lightkube.resources.core_v1 import Node, Pod
+from ops.manifests import ManifestClientError
+
+from rollout import NodePluginRollout, roll_node_plugins
+
+NAMESPACE = "gce-pd-csi-driver"
+DAEMONSET = "csi-gce-pd-node"
+
+
+def owner(name=DAEMONSET):
+    return [OwnerReference(apiVersion="apps/v1", kind="DaemonSet", name=name, uid="1")]
+
+
+def revision(number, hash, name=DAEMONSET):
+    return ControllerRevision(
+        metadata=ObjectMeta(
+            name=f"{name}-{hash}",
+            labels={"controller-revision-hash": hash},
+            ownerReferences=owner(name),
+        ),
+        revision=number,
+        data={},
+    )
+
+
+def pod(node, hash, ready=True, name=DAEMONSET):
+    condition = PodCondition(type="Ready", status=str(ready))
+    return Pod(
+        metadata=ObjectMeta(
+            name=f"{name}-{node}",
+            labels={"controller-revision-hash": hash},
+            ownerReferences=owner(name),
+        ),
+        spec=PodSpec(containers=[], nodeName=node),
+        status=PodStatus(conditions=[condition]),
+    )
+
+
+@pytest.fixture
+def cluster():
+    client = mock.MagicMock()
+    state = dict(
+        revisions=[revision(1, "old"), revision(2, "new"), revision(3, "win", "other")],
+        pods=[pod(f"node-{i}", "old") for i in range(5)],
+        canaries=[Node(metadata=ObjectMeta(name="node-3"))],
+    )
+
+    def list(kind, **_):
+        return {
+            ControllerRevision: state["revisions"],
+            Pod: state["pods"],
+            Node: state["canaries"],
+        }[kind]
+
+    client.list.side_effect = list
+    client.state = state
+    yield client
+
+
+def daemonsets(manifests):
+    return {obj.name: obj.resource for obj in manifests.resources if obj.kind == "DaemonSet"}
+
+
+def test_rolling_update_strategy(manifests, charm_config):
+    charm_config.config["node-max-unavailable"] = "10%"
+    charm_config.config["node-max-surge"] = "0"
+    for ds in daemonsets(manifests).values():
+        assert ds.spec.updateStrategy.type == "RollingUpdate"
+        assert ds.spec.updateStrategy.rollingUpdate.maxUnavailable == "10%"
+        assert ds.spec.updateStrategy.rollingUpdate.maxSurge == 0
+
+    charm_config.config["node-canary-labels"] = "storage-canary=true"
+    for ds in daemonsets(manifests).values():
+        assert ds.spec.updateStrategy.type == "OnDelete"
+        assert ds.spec.updateStrategy.rollingUpdate is None
+
+
+@pytest.mark.parametrize(
+    "config, message",
+    [
+        ({"node-max-unavailable": "ten"}, "node-max-unavailable should be a number"),
+        ({"node-max-surge": "-1"}, "node-max-surge should be a number"),
+        ({"node-max-unavailable": "0%"}, "node-max-unavailable and node-max-surge cannot"),
+        ({"node-canary-labels": "canary"}, "node-canary-labels 'canary' should be a label"),
+        (
+            {"node-canary-labels": "storage-canary=true", "node-max-surge": "1"},
+            "node-max-surge cannot be set with node-canary-labels",
+        ),
+    ],
+)
+def test_invalid_rollout_config(charm_config, config, message):
+    charm_config.config.update(config)
+    assert charm_config.evaluate().startswith(message)
+
+
+def test_canary_rollout(cluster):
+    rollout = NodePluginRollout(cluster, NAMESPACE, {"storage-canary": "true"})
+    assert rollout.step(DAEMONSET, "2") == f"{DAEMONSET} canary: replacing 1 pods"
+    cluster.delete.assert_called_once_with(Pod, f"{DAEMONSET}-node-3", namespace=NAMESPACE)
+
+    # the canary waits until its replacement is ready
+    cluster.delete.reset_mock()
+    cluster.state["pods"][3] = pod("node-3", "new", ready=False)
+    assert rollout.step(DAEMONSET, "2") == f"{DAEMONSET} canary: 0/1 pods ready"
+    cluster.delete.assert_not_called()
+
+    # then replaces the remaining pods in batches of max-unavailable
+    cluster.state["pods"][3] = pod("node-3", "new")
+    assert rollout.step(DAEMONSET, "2") == f"{DAEMONSET} rollout: 1/5 pods updated"
+    deleted = [c.args[1] for c in cluster.delete.call_args_list]
+    assert deleted == [f"{DAEMONSET}-node-0", f"{DAEMONSET}-node-1"]
+
+    # without exceeding max-unavailable while replacements start
+    cluster.delete.reset_mock()
+    cluster.state["pods"][0] = pod("node-0", "new", ready=False)
+    cluster.state["pods"][1] = pod("node-1", "new")
+    assert rollout.step(DAEMONSET, "40%") == f"{DAEMONSET} rollout: 3/5 pods updated"
+    cluster.delete.assert_called_once_with(Pod, f"{DAEMONSET}-node-2", namespace=NAMESPACE)
+
+    cluster.state["pods"] = [pod(f"node-{i}", "new") for i in range(5)]
+    assert rollout.step(DAEMONSET, "2") is None
+
+
+def test_roll_node_plugins_complete(cluster):
+    cluster.state["pods"] = [pod(f"node-{i}", "new") for i in range(5)]
+    assert roll_node_plugins(cluster, NAMESPACE, {"storage-canary": "true"}, "1") is None
+    cluster.delete.assert_not_called()
+
+
+@mock.patch("rollout.time")
+def test_roll_node_plugins_within_deadline(mock_time, cluster):
+    clock = iter(range(0, 1000, 5))
+    mock_time.monotonic.side_effect = lambda: next(clock)
+    pods = cluster.state["pods"]
+
+    def replace(kind, name, namespace):
+        # the daemonset controller starts the replacement, ready by the next poll
+        i = next(i for i, p in enumerate(pods) if p.metadata.name == name)
+        pods[i] = pod(pods[i].spec.nodeName, "new")
+
+    cluster.delete.side_effect = replace
+    assert roll_node_plugins(cluster, NAMESPACE, {"storage-canary": "true"}, "2") is None
+    assert cluster.delete.call_count == 5
+    assert mock_time.sleep.call_count == 3
+
+    # a rollout stuck on an unready canary stops at the deadline
+    mock_time.reset_mock()
+    pods[3] = pod("node-3", "new", ready=False)
+    pods[0] = pod("node-0", "old")
+    progress = roll_node_plugins(cluster, NAMESPACE, {"storage-canary": "true"}, "2", deadline=60)
+    assert progress == f"{DAEMONSET} canary: 0/1 pods ready"
+    assert mock_time.sleep.call_count == 11
+
+
+def test_rollout_api_error(cluster):
+    cluster.list.side_effect = ApiError(response=mock.MagicMock())
+    with pytest.raises(ManifestClientError):
+        roll_node_plugins(cluster, NAMESPACE, {"storage-canary": "true"}, "1")
@@ -0,0 +1,81 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+import unittest.mock as mock
+
+import pytest
+from lightkube.core.exceptions import ApiError
+from lightkube.models.apiextensions_v1 import (
+    CustomResourceDefinitionNames,
+    CustomResourceDefinitionSpec,
+)
+from lightkube.models.meta_v1 import ObjectMeta
+from lightkube.resources.apiextensions_v1 import CustomResourceDefinition
+
+from snapshot_manifests import SnapshotControllerManifests
+
+CRDS = {
+    "CustomResourceDefinition/volumesnapshotclasses.snapshot.storage.k8s.io",
+    "CustomResourceDefinition/volumesnapshotcontents.snapshot.storage.k8s.io",
+    "CustomResourceDefinition/volumesnapshots.snapshot.storage.k8s.io",
+}
+
+
+def crd(plural, group="snapshot.storage.k8s.io", labels=None):
+    return CustomResourceDefinition(
+        metadata=ObjectMeta(name=f"{plural}.{group}", labels=labels),
+        spec=CustomResourceDefinitionSpec(
+            group=group,
+            names=CustomResourceDefinitionNames(kind=plural, plural=plural),
+            scope="Cluster",
+            versions=[],
+        ),
+    )
+
+
+@pytest.fixture
+def manifests(charm, charm_config, kube_control, integrator, lk_client):
+    integrator.is_ready = False
+    lk_client.list.return_value = []
+    yield SnapshotControllerManifests(charm, charm_config, kube_control, integrator)
+
+
+def test_snapshot_controller(manifests):
+    assert manifests.evaluate() is None
+    assert manifests.current_release == "v8.0.1"
+    resources = {str(obj): obj.resource for obj in manifests.resources}
+    assert CRDS | {"Deployment/kube-system/snapshot-controller"} <= set(resources)
+
+    controller = resources["Deployment/kube-system/snapshot-controller"]
+    (container,) = controller.spec.template.spec.containers
+    assert container.image == "rocks.canonical.com/cdk/sig-storage/snapshot-controller:v8.0.1"
+    assert controller.metadata.labels["juju.io/application"] == "gcp-k8s-storage"
+
+    # the rendered custom resources survive the cache round trip
+    manifests._rendered.clear()
+    assert {str(obj) for obj in manifests.resources} == set(resources)
+
+
+def test_skips_foreign_crds(manifests, lk_client):
+    lk_client.list.return_value = [
+        crd("volumesnapshots"),
+        crd("volumesnapshotclasses", labels={"juju.io/application": "gcp-k8s-storage"}),
+        crd("volumesnapshotcontents", group="example.com"),
+    ]
+    rendered = {str(obj) for obj in manifests.resources}
+    assert rendered & CRDS == CRDS - {
+        "CustomResourceDefinition/volumesnapshots.snapshot.storage.k8s.io"
+    }
+
+
+def test_foreign_crds_unavailable(manifests, lk_client):
+    lk_client.list.side_effect = ApiError(response=mock.MagicMock())
+    assert manifests.foreign_crds == []
+    assert CRDS <= {str(obj) for obj in manifests.resources}
+
+
+def test_cleanup_keeps_crds(manifests):
+    crd = next(obj for obj in manifests.resources if obj.kind == "CustomResourceDefinition")
+    with mock.patch.object(manifests, "labelled_resources", return_value=[crd]):
+        with mock.patch.object(manifests, "delete_resources") as delete_resources:
+            manifests.delete_manifests(ignore_unauthorized=True)
+    delete_resources.assert_called_once_with(ignore_unauthorized=True)
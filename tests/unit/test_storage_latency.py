@@ -0,0 +1,158 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+import unittest.mock as mock
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from lightkube.core.exceptions import ApiError
+from lightkube.models.core_v1 import (
+    CSIPersistentVolumeSource,
+    ObjectReference,
+    PersistentVolumeClaimSpec,
+    PersistentVolumeSpec,
+)
+from lightkube.models.meta_v1 import ObjectMeta
+from lightkube.models.storage_v1 import VolumeAttachmentSource, VolumeAttachmentSpec
+from lightkube.resources.core_v1 import Event, PersistentVolume, PersistentVolumeClaim
+from lightkube.resources.storage_v1 import StorageClass, VolumeAttachment
+from ops.manifests import ManifestClientError
+
+from storage_latency import storage_latency
+
+DRIVER = "pd.csi.storage.gke.io"
+NOW = datetime(2025, 6, 1, 12, tzinfo=timezone.utc)
+
+
+def ago(minutes, seconds=0):
+    return NOW - timedelta(minutes=minutes) + timedelta(seconds=seconds)
+
+
+def claim(name, created, storage_class="csi-gce-pd-default"):
+    return PersistentVolumeClaim(
+        metadata=ObjectMeta(name=name, namespace="default", creationTimestamp=created),
+        spec=PersistentVolumeClaimSpec(storageClassName=storage_class, volumeName=f"pv-{name}"),
+    )
+
+
+def volume(name, location, storage_class="csi-gce-pd-default"):
+    handle = f"projects/my-project/{location}/disks/pv-{name}"
+    return PersistentVolume(
+        metadata=ObjectMeta(name=f"pv-{name}"),
+        spec=PersistentVolumeSpec(
+            storageClassName=storage_class,
+            csi=CSIPersistentVolumeSource(driver=DRIVER, volumeHandle=handle),
+        ),
+    )
+
+
+def attachment(name, created, attacher=DRIVER):
+    return VolumeAttachment(
+        metadata=ObjectMeta(name=f"csi-{name}", creationTimestamp=created),
+        spec=VolumeAttachmentSpec(
+            attacher=attacher,
+            nodeName="node-0",
+            source=VolumeAttachmentSource(persistentVolumeName=f"pv-{name}"),
+        ),
+    )
+
+
+def provisioned(name, when):
+    obj = ObjectReference(kind="PersistentVolumeClaim", namespace="default", name=name)
+    return Event(
+        metadata=ObjectMeta(),
+        involvedObject=obj,
+        reason="ProvisioningSucceeded",
+        firstTimestamp=when,
+    )
+
+
+def attached(name, when):
+    return Event(
+        metadata=ObjectMeta(),
+        involvedObject=ObjectReference(kind="Pod", namespace="default", name="pod"),
+        reason="SuccessfulAttachVolume",
+        message=f'AttachVolume.Attach succeeded for volume "pv-{name}" ',
+        firstTimestamp=when,
+    )
+
+
+@pytest.fixture
+def client():
+    client = mock.MagicMock()
+    resources = {
+        StorageClass: [
+            StorageClass(metadata=ObjectMeta(name="csi-gce-pd-default"), provisioner=DRIVER),
+            StorageClass(metadata=ObjectMeta(name="other"), provisioner="other.csi.k8s.io"),
+        ],
+        PersistentVolumeClaim: [
+            claim("a", ago(30)),
+            claim("b", ago(20)),
+            claim("c", ago(10)),
+            claim("old", ago(120)),
+            claim("other", ago(10), storage_class="other"),
+        ],
+        PersistentVolume: [
+            volume("a", "zones/us-east1-b"),
+            volume("b", "zones/us-east1-b"),
+            volume("c", "regions/us-east1"),
+        ],
+        VolumeAttachment: [attachment("a", ago(29)), attachment("b", ago(19), attacher="x")],
+        Event: [
+            provisioned("a", ago(30, 4)),
+            provisioned("b", ago(20, 12)),
+            provisioned("c", ago(10, 3)),
+            provisioned("old", ago(119)),
+            provisioned("other", ago(10, 1)),
+            attached("a", ago(29, 7)),
+            attached("b", ago(19, 2)),
+        ],
+    }
+
+    def list_resources(kind, fields=None, **_):
+        reason = (fields or {}).get("reason")
+        return [rsc for rsc in resources[kind] if not reason or rsc.reason == reason]
+
+    client.list.side_effect = list_resources
+    yield client
+
+
+def test_storage_latency(client):
+    report = storage_latency(client, DRIVER, timedelta(hours=1), now=NOW)
+    regional, zonal = report["provisioning"]
+    assert regional["zone"] == "us-east1"
+    assert (regional["count"], regional["max"]) == (1, 3.0)
+    assert zonal == {
+        "storage-class": "csi-gce-pd-default",
+        "zone": "us-east1-b",
+        "count": 2,
+        "p50": 4.0,
+        "p90": 12.0,
+        "p99": 12.0,
+        "max": 12.0,
+        "histogram": {
+            "le-1s": 0,
+            "le-2s": 0,
+            "le-5s": 1,
+            "le-10s": 1,
+            "le-30s": 2,
+            "le-60s": 2,
+            "le-120s": 2,
+            "le-300s": 2,
+            "le-600s": 2,
+            "le-inf": 2,
+        },
+    }
+    (attach,) = report["attach"]
+    assert (attach["zone"], attach["count"], attach["p50"]) == ("us-east1-b", 1, 7.0)
+    assert client.list.call_count == 6
+    event_selectors = [c.kwargs.get("fields") for c in client.list.call_args_list[-2:]]
+    assert event_selectors == [
+        {"reason": "ProvisioningSucceeded"},
+        {"reason": "SuccessfulAttachVolume"},
+    ]
+
+
+def test_storage_latency_api_error(client):
+    client.list.side_effect = ApiError(response=mock.MagicMock())
+    with pytest.raises(ManifestClientError):
+        storage_latency(client, DRIVER, timedelta(hours=1), now=NOW)
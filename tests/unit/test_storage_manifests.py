@@ -0,0 +1,499 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+import unittest.mock as mock
+
+import pytest
+from lightkube.core.exceptions import ApiError
+from lightkube.models.core_v1 import PodStatus
+from lightkube.models.meta_v1 import ObjectMeta
+from lightkube.resources.core_v1 import Node, Pod
+from lightkube.resources.storage_v1 import StorageClass
+from ops.manifests import ManifestClientError
+
+from snapshot_manifests import SnapshotControllerManifests
+from storage_manifests import ExposeSidecarMetrics
+
+
+def storage_classes(manifests):
+    return {obj.name: obj.resource for obj in manifests.resources if obj.kind == "StorageClass"}
+
+
+def test_default_storage_class(manifests):
+    classes = storage_classes(manifests)
+    assert list(classes) == ["csi-gce-pd-default"]
+    assert classes["csi-gce-pd-default"].parameters is None
+
+
+def node(name, zone, label="topology.kubernetes.io/zone"):
+    return Node(metadata=ObjectMeta(name=name, labels={label: zone}))
+
+
+def list_nodes(lk_client, *nodes):
+    lk_client.list.side_effect = lambda kind, **_: list(nodes) if kind is Node else []
+
+
+def test_topology_aware_classes(manifests, charm_config, lk_client):
+    zones = ["us-east1-b", "us-east1-c", "us-east1-d", "us-west1-a"]
+    list_nodes(
+        lk_client,
+        node("node-0", "us-east1-b"),
+        node("node-1", "us-east1-b"),
+        node("node-2", "us-east1-c", label="topology.gke.io/zone"),
+        node("node-3", "us-east1-d"),
+        node("node-4", "us-west1-a"),
+        Node(metadata=ObjectMeta(name="unlabelled")),
+    )
+    charm_config.config["storage-classes"] = """
+    - name: ha
+      type: pd-balanced
+      replication-type: regional-pd
+    """
+    classes = storage_classes(manifests)
+    assert list(classes) == ["csi-gce-pd-default", "csi-gce-pd-ha"]
+
+    charm_config.config["topology-aware-classes"] = True
+    classes = storage_classes(manifests)
+    assert set(classes) == {"csi-gce-pd-default", "csi-gce-pd-ha", "csi-gce-pd-regional"}
+    (default,) = classes["csi-gce-pd-default"].allowedTopologies
+    assert default.matchLabelExpressions[0].key == "topology.gke.io/zone"
+    assert default.matchLabelExpressions[0].values == zones
+    pairs = [
+        t.matchLabelExpressions[0].values for t in classes["csi-gce-pd-regional"].allowedTopologies
+    ]
+    assert pairs == [
+        ["us-east1-b", "us-east1-c"],
+        ["us-east1-b", "us-east1-d"],
+        ["us-east1-c", "us-east1-d"],
+    ]
+    assert classes["csi-gce-pd-regional"].parameters["replication-type"] == "regional-pd"
+    assert (
+        classes["csi-gce-pd-ha"].allowedTopologies
+        == classes["csi-gce-pd-regional"].allowedTopologies
+    )
+
+
+def test_topology_aware_classes_single_zone(manifests, charm_config, lk_client):
+    list_nodes(lk_client, node("node-0", "us-east1-b"))
+    charm_config.config["topology-aware-classes"] = True
+    classes = storage_classes(manifests)
+    assert list(classes) == ["csi-gce-pd-default"]
+    assert len(classes["csi-gce-pd-default"].allowedTopologies) == 1
+
+
+def test_topology_aware_classes_without_nodes(manifests, charm_config, lk_client):
+    charm_config.config["topology-aware-classes"] = True
+    lk_client.list.side_effect = ApiError(response=mock.MagicMock())
+    assert manifests.evaluate() == "Waiting for the zones of the cluster's nodes"
+
+
+def test_configured_storage_classes(manifests, charm_config):
+    charm_config.config["storage-classes"] = """
+    - name: ssd
+      type: pd-ssd
+      default: true
+    - name: hyperdisk
+      type: hyperdisk-balanced
+      provisioned-iops-on-create: 10000
+      provisioned-throughput-on-create: 250Mi
+      reclaim-policy: Retain
+    """
+    assert charm_config.evaluate() is None
+    classes = storage_classes(manifests)
+    assert set(classes) == {"csi-gce-pd-default", "csi-gce-pd-ssd", "csi-gce-pd-hyperdisk"}
+
+    ssd = classes["csi-gce-pd-ssd"]
+    assert ssd.metadata.annotations == {"storageclass.kubernetes.io/is-default-class": "true"}
+    assert ssd.parameters == {"type": "pd-ssd", "replication-type": "none"}
+    assert ssd.reclaimPolicy == "Delete"
+
+    hyperdisk = classes["csi-gce-pd-hyperdisk"]
+    assert hyperdisk.metadata.annotations is None
+    assert hyperdisk.parameters == {
+        "type": "hyperdisk-balanced",
+        "replication-type": "none",
+        "provisioned-iops-on-create": "10000",
+        "provisioned-throughput-on-create": "250Mi",
+    }
+    assert hyperdisk.reclaimPolicy == "Retain"
+
+
+@pytest.mark.parametrize(
+    "value, message",
+    [
+        ("- name: ssd", "storage-classes 0.type: field required"),
+        ("- {name: ssd, type: pd-fast}", "storage-classes 0.type: 'pd-fast' is not one of"),
+        (
+            "- {name: ssd, type: pd-ssd, provisioned-iops-on-create: 5}",
+            "storage-classes 0.provisioned-iops-on-create: only supported by",
+        ),
+        (
+            "[{name: a, type: pd-ssd, default: true}, {name: b, type: pd-ssd, default: true}]",
+            "storage-classes may only define one default class",
+        ),
+        ("- {name: default, type: pd-ssd}", "storage-classes 0.name: 'default' is reserved"),
+    ],
+)
+def test_invalid_storage_classes(charm_config, value, message):
+    charm_config.config["storage-classes"] = value
+    assert charm_config.evaluate().startswith(message)
+
+
+def controller(manifests):
+    return next(
+        obj.resource
+        for obj in manifests.resources
+        if obj.kind == "Deployment" and obj.name == "csi-gce-pd-controller"
+    )
+
+
+def test_controller_sidecar_tuning(manifests, charm_config):
+    charm_config.config["controller-replicas"] = 2
+    charm_config.config["csi-sidecar-tuning"] = """
+    all:
+      kube-api-qps: 50
+      worker-threads: 20
+    csi-resizer:
+      timeout: 120s
+    csi-provisioner:
+      worker-threads: 100
+      resources:
+        requests: {cpu: 50m, memory: 64Mi}
+    """
+    assert charm_config.evaluate() is None
+    deployment = controller(manifests)
+    assert deployment.spec.replicas == 2
+
+    containers = {c.name: c for c in deployment.spec.template.spec.containers}
+    provisioner = containers["csi-provisioner"]
+    assert "--worker-threads=100" in provisioner.args
+    assert "--kube-api-qps=50.0" in provisioner.args
+    assert "--timeout=250s" in provisioner.args
+    assert provisioner.resources.requests == {"cpu": "50m", "memory": "64Mi"}
+
+    resizer = containers["csi-resizer"]
+    assert "--workers=20" in resizer.args
+    assert "--timeout=120s" in resizer.args
+    assert resizer.resources is None
+    assert containers["gce-pd-driver"].args == [
+        "--v=5",
+        "--endpoint=unix:/csi/csi.sock",
+        "--supports-dynamic-iops-provisioning=hyperdisk-balanced,hyperdisk-extreme",
+        "--supports-dynamic-throughput-provisioning=hyperdisk-balanced,hyperdisk-throughput,hyperdisk-ml",
+        "--enable-data-cache",
+    ]
+
+
+def test_sidecar_metrics_endpoints(manifests, lk_client):
+    deployment = controller(manifests)
+    containers = {c.name: c for c in deployment.spec.template.spec.containers}
+    assert [p.containerPort for p in containers["csi-provisioner"].ports] == [22011]
+    assert [p.containerPort for p in containers["csi-snapshotter"].ports] == [22014]
+
+    # sidecars without an endpoint are given one
+    snapshotter = containers["csi-snapshotter"]
+    snapshotter.args.remove("--metrics-address=:22014")
+    snapshotter.ports = None
+    ExposeSidecarMetrics(manifests)(deployment)
+    assert "--http-endpoint=:22014" in snapshotter.args
+    assert [p.containerPort for p in snapshotter.ports] == [22014]
+
+    manifests.client  # loads the in-cluster CRDs with the default list result
+    lk_client.list.return_value = [
+        Pod(status=PodStatus(podIP="10.0.0.2")),
+        Pod(status=PodStatus(podIP="10.0.0.1")),
+        Pod(status=PodStatus()),
+    ]
+    endpoints = manifests.sidecar_metrics_endpoints()
+    assert endpoints["csi-provisioner"] == ["10.0.0.1:22011", "10.0.0.2:22011"]
+    assert endpoints["csi-attacher"] == ["10.0.0.1:22012", "10.0.0.2:22012"]
+    lk_client.list.assert_called_with(
+        Pod,
+        namespace="gce-pd-csi-driver",
+        labels={"app": "gcp-compute-persistent-disk-csi-driver"},
+    )
+
+
+@pytest.mark.parametrize(
+    "value, message",
+    [
+        ("csi-driver: {}", "csi-sidecar-tuning has unknown sidecars csi-driver"),
+        ("all: {worker-threads: 0}", "csi-sidecar-tuning all.worker-threads:"),
+        ("all: {timeout: forever}", "csi-sidecar-tuning all.timeout: 'forever' should be"),
+    ],
+)
+def test_invalid_sidecar_tuning(charm_config, value, message):
+    charm_config.config["csi-sidecar-tuning"] = value
+    assert charm_config.evaluate().startswith(message)
+
+
+def test_resources_rendered_from_cache(manifests, charm_config):
+    charm_config.config["storage-classes"] = "- {name: ssd, type: pd-ssd}"
+    rendered = manifests.resources
+    assert list(manifests.cache.path.glob("*.json")) == [
+        manifests.cache.path / f"{manifests.cache_key}.json"
+    ]
+
+    manifests._rendered.clear()
+    with mock.patch("ops.manifests.Manifests.resources", new_callable=mock.PropertyMock) as mocked:
+        cached = manifests.resources
+    mocked.assert_not_called()
+    assert [str(_) for _ in cached] == [str(_) for _ in rendered]
+    assert [_.resource.to_dict() for _ in cached] == [_.resource.to_dict() for _ in rendered]
+
+    charm_config.config["storage-classes"] = "- {name: ssd, type: pd-balanced}"
+    assert manifests.resources is not cached
+
+
+def test_apply_records_drift_index(manifests, lk_client):
+    lk_client.list.return_value = []
+    manifests.apply_manifests()
+    assert manifests.applied.path.exists()
+    assert manifests.drifted_resources() == list(manifests.resources)
+
+
+def test_apply_replaces_immutable_storage_classes(manifests, charm_config, lk_client):
+    charm_config.config["storage-classes"] = "- {name: ssd, type: pd-ssd}"
+    ssd = next(obj for obj in manifests.resources if obj.name == "csi-gce-pd-ssd")
+    installed = StorageClass(
+        metadata=ObjectMeta(name="csi-gce-pd-ssd"),
+        provisioner="pd.csi.storage.gke.io",
+        parameters={"type": "pd-balanced", "replication-type": "none"},
+        reclaimPolicy="Delete",
+        volumeBindingMode="WaitForFirstConsumer",
+    )
+    lk_client.get.return_value = installed
+    invalid = ApiError(response=mock.MagicMock())
+    invalid.status.code = 422
+    lk_client.apply.side_effect = [invalid, ssd.resource]
+    manifests.apply_resources(ssd)
+    lk_client.delete.assert_called_once_with(StorageClass, "csi-gce-pd-ssd", namespace=None)
+    assert lk_client.apply.call_count == 2
+
+    # other invalid changes aren't resolved by replacing the class
+    installed.parameters = ssd.resource.parameters
+    lk_client.apply.side_effect = [invalid]
+    with pytest.raises(ManifestClientError):
+        manifests.apply_resources(ssd)
+    lk_client.delete.assert_called_once()
+
+
+def api_error(code, message=""):
+    error = ApiError(response=mock.MagicMock())
+    error.status.code, error.status.message = code, message
+    return error
+
+
+def test_preflight(manifests, charm, charm_config, kube_control, integrator, lk_client):
+    charm_config.config["snapshot-classes"] = "- name: standard"
+
+    def dry_run(rsc, **_):
+        if rsc.kind == "StorageClass":
+            raise api_error(400, "denied by the webhook")
+        if rsc.kind == "VolumeSnapshotClass" or rsc.metadata.namespace:
+            # the namespace and CRDs don't exist until the manifests are applied
+            raise api_error(404)
+        return rsc
+
+    lk_client.apply.side_effect = dry_run
+    lk_client.list.return_value = []
+    rejected = ["StorageClass/csi-gce-pd-default: denied by the webhook"]
+    with pytest.raises(ManifestClientError):
+        # an unknown kind isn't a rejection of the object
+        manifests.preflight()
+    lk_client.apply.reset_mock()
+
+    # the snapshot CRDs are created alongside by the snapshot-controller manifests
+    alongside = SnapshotControllerManifests(charm, charm_config, kube_control, integrator)
+    alongside = alongside.resources
+    assert manifests.preflight(alongside) == rejected
+    assert lk_client.apply.call_count == len(manifests.resources)
+    assert all(c.kwargs["dry_run"] for c in lk_client.apply.call_args_list)
+    assert not manifests.applied.path.exists()
+
+
+@pytest.mark.parametrize(
+    "code, message, rejected",
+    [
+        (403, "forbidden by policy", True),
+        (409, "conflict", True),
+        (422, "spec.replicas: Invalid value", True),
+        (500, 'admission webhook "policy.example.com" denied the request', True),
+        (500, 'failed calling webhook "policy.example.com": connection refused', False),
+        (503, "service unavailable", False),
+        (429, "too many requests", False),
+        (504, "timeout", False),
+    ],
+)
+def test_preflight_classifies_errors(manifests, lk_client, code, message, rejected):
+    def dry_run(rsc, **_):
+        if rsc.kind == "StorageClass":
+            raise api_error(code, message)
+        return rsc
+
+    lk_client.apply.side_effect = dry_run
+    lk_client.get.side_effect = api_error(404)  # not installed yet
+    if rejected:
+        assert manifests.preflight() == [f"StorageClass/csi-gce-pd-default: {message}"]
+    else:
+        with pytest.raises(ManifestClientError):
+            manifests.preflight()
+
+
+def test_without_bundled_releases(manifests, tmp_path):
+    manifests.base_path = tmp_path / "unbundled"
+    assert manifests.releases == []
+    assert manifests.latest_release == ""
+    assert manifests.current_release == ""
+    assert list(manifests.resources) == []
+    assert manifests.evaluate() == "gce-pd-csi-driver manifests have no bundled releases"
+
+
+def test_upgrade_leftovers(manifests, charm_config):
+    charm_config.config["storage-release"] = "v1.7.0"
+    # PodSecurityPolicies are no longer known to the kubernetes api
+    assert manifests.upgrade_leftovers("v1.6.0") == []
+
+    manifests.upgrade_plans.plans[5]["removed"].append(
+        dict(apiVersion="v1", kind="ConfigMap", namespace="ns", name="leftover")
+    )
+    assert [str(_) for _ in manifests.upgrade_leftovers("v1.3.0")] == ["ConfigMap/ns/leftover"]
+    assert manifests.upgrade_leftovers("v0.0.1") == []
+
+
+def test_snapshot_classes(manifests, charm_config):
+    kinds = {obj.kind for obj in manifests.resources}
+    assert "VolumeSnapshotClass" not in kinds
+
+    charm_config.config["snapshot-classes"] = """
+    - name: standard
+      default: true
+    - name: images
+      snapshot-type: images
+      deletion-policy: Retain
+    """
+    assert charm_config.evaluate() is None
+    resources = {str(obj): obj.resource for obj in manifests.resources}
+    assert "CustomResourceDefinition" not in {obj.kind for obj in manifests.resources}
+
+    standard = resources["VolumeSnapshotClass/csi-gce-pd-snapshot-standard"]
+    assert standard.driver == "pd.csi.storage.gke.io"
+    assert standard.deletionPolicy == "Delete"
+    assert standard.parameters == {"snapshot-type": "snapshots"}
+    assert standard.metadata.annotations == {
+        "snapshot.storage.kubernetes.io/is-default-class": "true"
+    }
+    assert standard.metadata.labels["juju.io/application"] == "gcp-k8s-storage"
+    images = resources["VolumeSnapshotClass/csi-gce-pd-snapshot-images"]
+    assert images.deletionPolicy == "Retain"
+    assert images.parameters == {"snapshot-type": "images"}
+
+    # the rendered custom resources survive the cache round trip
+    manifests._rendered.clear()
+    assert {str(obj) for obj in manifests.resources} == set(resources)
+
+
+def test_snapshot_classes_without_crds(manifests, charm_config, lk_client):
+    charm_config.config["snapshot-classes"] = "- name: standard"
+    lk_client.get.side_effect = api_error(404)
+    assert manifests.evaluate() == (
+        "snapshot-classes require snapshot-controller or the snapshot CRDs installed"
+    )
+
+    charm_config.config["snapshot-controller"] = True
+    assert manifests.evaluate() is None
+
+    # the charm keeps waiting on the api-server if the CRD cannot be probed
+    del charm_config.config["snapshot-controller"]
+    manifests.__dict__.pop("snapshot_class_crd")
+    lk_client.get.side_effect = api_error(500)
+    assert manifests.evaluate() is None
+
+
+def volume_attributes_classes(manifests):
+    return {
+        obj.name: obj.resource
+        for obj in manifests.resources
+        if obj.kind == "VolumeAttributesClass"
+    }
+
+
+def test_volume_attributes_classes(manifests, charm_config, lk_client):
+    charm_config.config["volume-attributes-classes"] = """
+    - name: batch
+      iops: 20000
+      throughput: 600Mi
+    - name: burst
+      iops: 50000
+    """
+    assert charm_config.evaluate() is None
+    classes = volume_attributes_classes(manifests)
+    assert list(classes) == ["csi-gce-pd-batch", "csi-gce-pd-burst"]
+    batch = classes["csi-gce-pd-batch"]
+    assert batch.apiVersion == "storage.k8s.io/v1"
+    assert batch.driverName == "pd.csi.storage.gke.io"
+    assert batch.parameters == {"iops": "20000", "throughput": "600Mi"}
+    assert classes["csi-gce-pd-burst"].parameters == {"iops": "50000"}
+
+    # releases before the sidecars enabled the feature render no classes
+    charm_config.config["storage-release"] = "v1.8.0"
+    assert volume_attributes_classes(manifests) == {}
+
+
+def test_volume_attributes_classes_renamed_not_replaced(manifests, charm_config, lk_client):
+    charm_config.config["volume-attributes-classes"] = "- {name: batch, iops: 20000}"
+    (batch,) = [obj for obj in manifests.resources if obj.kind == "VolumeAttributesClass"]
+    installed = batch.resource.__class__.from_dict(batch.resource.to_dict())
+    installed.parameters = {"iops": "10000"}
+    lk_client.get.return_value = installed
+
+    def dry_run(rsc, **_):
+        if rsc.kind == "VolumeAttributesClass":
+            raise api_error(422, "parameters: field is immutable")
+        return rsc
+
+    lk_client.apply.side_effect = dry_run
+    assert manifests.preflight(manifests.resources) == [
+        "VolumeAttributesClass/csi-gce-pd-batch: cannot change in place, "
+        "add it to volume-attributes-classes with a new name"
+    ]
+
+    # the class in use by volumes is never deleted to apply the edit
+    with pytest.raises(ManifestClientError):
+        manifests.apply_resources(batch)
+    lk_client.delete.assert_not_called()
+
+
+def test_volume_attributes_classes_beta_api(manifests, charm_config, lk_client):
+    charm_config.config["volume-attributes-classes"] = "- {name: batch, iops: 20000}"
+    manifests.client  # loads the in-cluster CRDs with the default list result
+    not_found = ApiError(response=mock.MagicMock())
+    not_found.status.code = 404
+    lk_client.list.side_effect = [not_found, iter([])]
+    (batch,) = volume_attributes_classes(manifests).values()
+    assert batch.apiVersion == "storage.k8s.io/v1beta1"
+
+
+def test_volume_attributes_classes_unsupported_cluster(manifests, charm_config, lk_client):
+    charm_config.config["volume-attributes-classes"] = "- {name: batch, iops: 20000}"
+    manifests.client  # loads the in-cluster CRDs with the default list result
+    not_found = ApiError(response=mock.MagicMock())
+    not_found.status.code = 404
+    lk_client.list.side_effect = not_found
+    assert volume_attributes_classes(manifests) == {}
+
+
+@pytest.mark.parametrize(
+    "value, message",
+    [
+        ("- name: batch", "volume-attributes-classes 0: should define iops, throughput or both"),
+        ("- {name: batch, iops: 0}", "volume-attributes-classes 0.iops: ensure this value"),
+        ("- {name: b, throughput: 1T}", "volume-attributes-classes 0.throughput: '1T' should"),
+        (
+            "[{name: b, iops: 1}, {name: b, iops: 2}]",
+            "volume-attributes-classes names must be unique",
+        ),
+    ],
+)
+def test_invalid_volume_attributes_classes(charm_config, value, message):
+    charm_config.config["volume-attributes-classes"] = value
+    assert charm_config.evaluate().startswith(message)
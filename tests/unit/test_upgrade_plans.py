@@ -0,0 +1,50 @@
+# Copyright 2025 Canonical Ltd.
+# See LICENSE file for licensing details.
+from pathlib import Path
+
+import pytest
+import yaml
+
+from upgrade_plans import UpgradePlans
+
+
+def ref(name, kind="ConfigMap"):
+    return dict(apiVersion="v1", kind=kind, namespace="ns", name=name)
+
+
+@pytest.fixture
+def plans(tmp_path):
+    path = tmp_path / "upgrade-plans.yaml"
+    plans = [
+        {"from": "v1.0.0", "to": "v1.1.0", "added": [ref("b")], "removed": [ref("a")]},
+        {"from": "v1.1.0", "to": "v1.2.0", "added": [ref("a")], "removed": [ref("c")]},
+        {"from": "v1.2.0", "to": "v1.3.0", "added": [], "removed": [ref("b")]},
+    ]
+    path.write_text(yaml.safe_dump(plans))
+    yield UpgradePlans(path)
+
+
+def test_adjacent_upgrade(plans):
+    assert plans.removed("v1.0.0", "v1.1.0") == [ref("a")]
+    assert plans.removed("v1.1.0", "v1.1.0") == []
+
+
+def test_chained_upgrade(plans):
+    # a is removed then returned, b is added then removed
+    assert plans.removed("v1.0.0", "v1.3.0") == [ref("c"), ref("b")]
+
+
+def test_downgrade(plans):
+    assert plans.removed("v1.3.0", "v1.1.0") == [ref("a")]
+    assert plans.removed("v1.2.0", "v1.0.0") == [ref("b")]
+
+
+def test_unknown_release(plans):
+    with pytest.raises(ValueError):
+        plans.removed("v0.9.0", "v1.3.0")
+
+
+def test_bundled_plans_cover_each_release():
+    base = Path("upstream/cloud_storage")
+    releases = sorted(p.name for p in (base / "manifests").iterdir())
+    assert sorted(UpgradePlans(base / "upgrade-plans.yaml").releases) == releases
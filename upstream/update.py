@@ -16,7 +16,7 @@ from dataclasses import dataclass
 from itertools import accumulate
 from pathlib import Path
 from tempfile import NamedTemporaryFile
-from typing import Generator, List, Optional, Set, Tuple, TypedDict
+from typing import Dict, Generator, List, Optional, Set, Tuple, TypedDict
 
 import yaml
 from kustomize.commands.build import build as kustomize_build
@@ -29,6 +29,7 @@ GH_TAGS = "https://api.github.com/repos/{repo}/tags"
 GH_BRANCH = "https://api.github.com/repos/{repo}/branches/{branch}"
 GH_COMMIT = "https://api.github.com/repos/{repo}/commits/{sha}"
 GH_PATH = "https://github.com/{repo}/{path}/?ref={branch}"
+GH_RAW = "https://raw.githubusercontent.com/{repo}/{branch}/{path}"
 
 SOURCES = dict(
     cloud_storage=dict(
@@ -40,8 +41,38 @@ SOURCES = dict(
         minimum="v1.3.0",
         maximum="v999.0.0",
     ),
+    filestore=dict(
+        repo="kubernetes-sigs/gcp-filestore-csi-driver",
+        assembled="kustomized.yaml",
+        release_tags=True,
+        path="deploy/kubernetes/overlays/stable-master",
+        version_parser=VersionInfo.parse,
+        minimum="v1.6.0",
+        maximum="v999.0.0",
+    ),
+    local_ssd=dict(
+        repo="kubernetes-sigs/sig-storage-local-static-provisioner",
+        assembled="local-static-provisioner.yaml",
+        release_tags=True,
+        path="helm/generated_examples/gke.yaml",
+        raw_file=True,
+        version_parser=VersionInfo.parse,
+        minimum="v2.6.0",
+        maximum="v999.0.0",
+    ),
+    snapshot_controller=dict(
+        repo="kubernetes-csi/external-snapshotter",
+        assembled="kustomized.yaml",
+        release_tags=True,
+        path="client/config/crd",
+        extra_paths=["deploy/kubernetes/snapshot-controller"],
+        version_parser=VersionInfo.parse,
+        minimum="v8.0.0",
+        maximum="v999.0.0",
+    ),
 )
 FILEDIR = Path(__file__).parent
+UPGRADE_PLANS = "upgrade-plans.yaml"
 VERSION_RE = re.compile(r"^v\d+\.\d+")
 IMG_RE = re.compile(r"^\s+image:\s+(\S+)")
 
@@ -90,6 +121,9 @@ class Release:
 
 
 SyncAsset = TypedDict("SyncAsset", {"source": str, "target": str, "type": str})
+ObjectRef = TypedDict(
+    "ObjectRef", {"apiVersion": str, "kind": str, "namespace": Optional[str], "name": str}
+)
 SyncCreds = TypedDict("SyncCreds", {"registry": str, "user": str, "pass": str})
 
 
@@ -116,6 +150,7 @@ def main(source: str, registry: Optional[Registry]):
     for release in new_releases:
         local_releases.add(download(source, release))
     unique_releases = list(dict.fromkeys(accumulate((sorted(local_releases)), dedupe)))
+    write_upgrade_plans(source, unique_releases)
     all_images = {image for release in unique_releases for image in images(release)}
     if registry:
         mirror_image(list(all_images), registry)
@@ -176,9 +211,19 @@ def download(source: str, release: Release) -> Release:
     manifest = release.path
     assembled = SOURCES[source]["assembled"]
     dest = FILEDIR / source / "manifests" / release.name / assembled
-    dest.parent.mkdir(exist_ok=True)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    if SOURCES[source].get("raw_file"):
+        # a pre-rendered manifest rather than a kustomization
+        url = GH_RAW.format(branch=release.name, **SOURCES[source])
+        with urllib.request.urlopen(url) as resp:
+            dest.write_bytes(resp.read())
+        return Release(release.name, dest)
     with captured_io(dest):
         kustomize_build([manifest], False)
+        for path in SOURCES[source].get("extra_paths", []):
+            print("---\n# ", end="")  # comments out the first line of the next build
+            extra = GH_PATH.format(repo=SOURCES[source]["repo"], path=path, branch=release.name)
+            kustomize_build([extra], False)
     return Release(release.name, dest)
 
 
@@ -211,6 +256,55 @@ def images(release: Release) -> Generator[str, None, None]:
                 yield m.groups()[0]
 
 
+def release_objects(release: Release) -> Dict[Tuple, Dict]:
+    """Map each object of a release by its kind, namespace and name."""
+    return {
+        (obj["kind"], obj["metadata"].get("namespace"), obj["metadata"]["name"]): obj
+        for obj in yaml.safe_load_all(Path(release.path).read_text())
+        if obj
+    }
+
+
+def object_ref(obj: Dict) -> ObjectRef:
+    """Create a reference to an object by its apiVersion, kind, namespace and name."""
+    return ObjectRef(
+        apiVersion=obj["apiVersion"],
+        kind=obj["kind"],
+        namespace=obj["metadata"].get("namespace"),
+        name=obj["metadata"]["name"],
+    )
+
+
+def upgrade_plan(this: Release, next: Release) -> Dict:
+    """Determine the objects added, removed and changed upgrading between releases."""
+    before, after = release_objects(this), release_objects(next)
+    return {
+        "from": this.name,
+        "to": next.name,
+        "added": [object_ref(after[k]) for k in after.keys() - before.keys()],
+        "removed": [object_ref(before[k]) for k in before.keys() - after.keys()],
+        "changed": [
+            object_ref(after[k]) for k in after.keys() & before.keys() if after[k] != before[k]
+        ],
+    }
+
+
+def write_upgrade_plans(source: str, releases: List[Release]):
+    """Precompute the upgrade plan between each pair of adjacent releases."""
+    ordered = sorted(releases)
+    plans = [upgrade_plan(this, next) for this, next in zip(ordered, ordered[1:])]
+    for plan in plans:
+        for key in ("added", "removed", "changed"):
+            plan[key] = sorted(
+                plan[key], key=lambda r: (r["kind"], r["namespace"] or "", r["name"])
+            )
+    dest = FILEDIR / source / UPGRADE_PLANS
+    log.info(f"Writing {len(plans)} upgrade plans to {dest}")
+    with dest.open("w") as fp:
+        fp.write("# Generated by upstream/update.py, do not edit\n")
+        yaml.safe_dump(plans, fp, sort_keys=False)
+
+
 def mirror_image(images: List[str], registry: Registry):
     """Synchronize all source images to target registry, only pushing changed layers."""
     sync_config = SyncConfig(